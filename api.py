@@ -0,0 +1,213 @@
+import gzip
+import json
+from operator import attrgetter
+
+from flask import Response, request
+
+from datamanager.pagination import clamp_limit, decode_cursor, encode_cursor
+
+try:
+    import orjson
+except ImportError:  # the standard library encoder, slower on large pages
+    orjson = None
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Versioned JSON API over the data manager's read methods, at /api/v1.
+#
+# Collections answer {"data": [...], "next_cursor": ...}, single resources {"data": {...}}
+# and errors {"error": "..."}. ?fields=id,name picks the fields of each item; list
+# endpoints take ?limit= and ?after=<next_cursor>. Responses carry a weak ETag made
+# from the version of the data behind them (see SQliteDataManager.data_version, the
+# same in every worker), so a conditional request is answered with 304 before any
+# query runs, and bodies of at
+# least MIN_COMPRESS_SIZE bytes are compressed with brotli or gzip as the client accepts.
+
+PREFIX = "/api/v1"
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _stats(movie) -> dict | None:
+    stats = movie.stats
+    if stats is None:
+        return None
+    return {"user_count": stats.user_count, "rating_count": stats.rating_count,
+            "average_rating": stats.average_rating}
+
+
+def _getters(*names) -> dict:
+    return {name: attrgetter(name) for name in names}
+
+
+# The fields of each resource and how to read them from a record or model instance.
+USER_FIELDS = _getters("id", "name")
+MOVIE_FIELDS = {**_getters("id", "name", "director", "year", "poster", "rating"),
+                "stats": _stats}
+USER_MOVIE_FIELDS = _getters("id", "name", "director", "year", "poster", "rating")
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def select_fields(available: dict) -> dict:
+    """
+    The getters of the fields named by ?fields= (all by default).
+    Raises ValueError for an unknown field.
+    """
+    names = [name for name in request.args.get("fields", "").split(",") if name]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown field {unknown[0]!r}, choose from {list(available)}")
+    return {name: available[name] for name in names} if names else available
+
+
+def int_arg(name: str) -> int | None:
+    value = request.args.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+
+def project(items, fields: dict) -> list:
+    return [{name: get(item) for name, get in fields.items()} for item in items]
+
+
+def slice_page(items: list, limit: int | None, after: str | None) -> tuple[list, str | None]:
+    """
+    A page of an in-memory list of records with ids, and the cursor of the next one.
+    """
+    start = 0
+    if after:
+        _, last_id = decode_cursor(after)
+        ids = [item.id for item in items]
+        if last_id not in ids:
+            raise ValueError(f"Invalid cursor: {after!r}")
+        start = ids.index(last_id) + 1
+    end = start + clamp_limit(limit)
+    next_cursor = encode_cursor(None, items[end - 1].id) if end < len(items) else None
+    return items[start:end], next_cursor
+
+
+def error(status: int, message: str) -> Response:
+    return Response(dumps({"error": message}), status=status, mimetype="application/json")
+
+
+def compress(response: Response) -> Response:
+    """
+    Encode the body with the best of brotli and gzip the client accepts.
+    """
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+    encoding = request.accept_encodings.best_match(["br", "gzip"] if brotli else ["gzip"])
+    if encoding == "br":
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+    elif encoding == "gzip":
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+    else:
+        return response
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+class JsonApi:
+    """
+    The /api/v1 endpoints for users, movies and users' lists, served from data_manager.
+    """
+
+    def __init__(self, data_manager, app=None):
+        self.data_manager = data_manager
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        for rule, endpoint, view in [
+            ("/users", "users", self.list_users),
+            ("/users/<int:user_id>", "user", self.get_user),
+            ("/users/<int:user_id>/movies", "user_movies", self.get_user_movies),
+            ("/movies", "movies", self.list_movies),
+            ("/movies/<int:movie_id>", "movie", self.get_movie),
+        ]:
+            app.add_url_rule(PREFIX + rule, f"api_v1_{endpoint}", view)
+
+    def respond(self, tags, build) -> Response:
+        """
+        The JSON response of build(), or 304 if the client's copy of the data behind
+        tags is current. build() returns the payload, or None for a 404.
+        """
+        # Read before the data: a write in between only makes the ETag older.
+        etag = self.data_manager.data_version(tags)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            try:
+                payload = build()
+            except ValueError as e:
+                return error(400, str(e))
+            if payload is None:
+                return error(404, "Not found")
+            response = compress(Response(dumps(payload), mimetype="application/json"))
+        response.set_etag(etag, weak=True)
+        response.cache_control.no_cache = True
+        response.vary.add("Accept-Encoding")
+        return response
+
+    def list_users(self) -> Response:
+        def build():
+            fields = select_fields(USER_FIELDS)
+            page = self.data_manager.list_users(limit=int_arg("limit"),
+                                                after=request.args.get("after"),
+                                                sort=request.args.get("sort", "name"))
+            return {"data": project(page.items, fields), "next_cursor": page.next_cursor}
+        return self.respond(["users"], build)
+
+    def get_user(self, user_id: int) -> Response:
+        def build():
+            fields = select_fields(
+                {**USER_FIELDS, "stats": lambda user: self.data_manager.get_user_stats(user.id)})
+            user = self.data_manager.get_user(user_id)
+            if user is None:
+                return None
+            return {"data": project([user], fields)[0]}
+        return self.respond([f"user:{user_id}", f"user_movies:{user_id}"], build)
+
+    def get_user_movies(self, user_id: int) -> Response:
+        def build():
+            fields = select_fields(USER_MOVIE_FIELDS)
+            if self.data_manager.get_user(user_id) is None:
+                return None
+            items, next_cursor = slice_page(self.data_manager.get_user_movies(user_id),
+                                            int_arg("limit"), request.args.get("after"))
+            return {"data": project(items, fields), "next_cursor": next_cursor}
+        return self.respond([f"user:{user_id}", f"user_movies:{user_id}"], build)
+
+    def list_movies(self) -> Response:
+        def build():
+            fields = select_fields(MOVIE_FIELDS)
+            page = self.data_manager.list_movies(limit=int_arg("limit"),
+                                                 after=request.args.get("after"),
+                                                 sort=request.args.get("sort", "name"),
+                                                 director=request.args.get("director"),
+                                                 year_min=int_arg("year_min"),
+                                                 year_max=int_arg("year_max"))
+            return {"data": project(page.items, fields), "next_cursor": page.next_cursor}
+        return self.respond(["movies"], build)
+
+    def get_movie(self, movie_id: int) -> Response:
+        def build():
+            fields = select_fields(MOVIE_FIELDS)
+            movie = self.data_manager.get_movie(movie_id)
+            if movie is None:
+                return None
+            return {"data": project([movie], fields)[0]}
+        return self.respond(["movies"], build)
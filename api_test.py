@@ -0,0 +1,89 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask
+
+from api import JsonApi
+from data_models import Movie, User
+from datamanager.sqlite_data_manager import SQliteDataManager
+
+
+@pytest.fixture
+def data_manager():
+    data_manager = SQliteDataManager("sqlite:///:memory:")
+    with data_manager.get_db() as db:
+        db.add_all([User(id=1, name="Ann"), User(id=2, name="Bob")] +
+                   [Movie(id=i, name=f"Movie {i:03}", director="Michael Mann", year=1990 + i,
+                          rating=5.0 + i / 100) for i in range(1, 101)])
+    data_manager.set_user_movies_many([(1, i, 7.0, 8.0) for i in (3, 1, 2)])
+    return data_manager
+
+
+@pytest.fixture
+def client(data_manager):
+    """
+    Fixture for a test client of an app serving only the JSON API.
+    """
+    app = Flask(__name__)
+    JsonApi(data_manager, app)
+    return app.test_client()
+
+
+def test_fields_and_pagination(client):
+    """Test sparse fields and following cursors through a collection."""
+    page = client.get("/api/v1/movies?fields=id,name,stats&limit=40").get_json()
+    assert page["data"][0] == {"id": 1, "name": "Movie 001", "stats": {
+        "user_count": 1, "rating_count": 1, "average_rating": 8.0}}
+    names = [movie["name"] for movie in page["data"]]
+    while page["next_cursor"]:
+        page = client.get(f"/api/v1/movies?fields=name&limit=40&after={page['next_cursor']}") \
+            .get_json()
+        names += [movie["name"] for movie in page["data"]]
+    assert names == [f"Movie {i:03}" for i in range(1, 101)]
+
+    first = client.get("/api/v1/users/1/movies?fields=id&limit=2").get_json()
+    assert first["data"] == [{"id": 3}, {"id": 1}]
+    rest = client.get(f"/api/v1/users/1/movies?fields=id&after={first['next_cursor']}").get_json()
+    assert rest == {"data": [{"id": 2}], "next_cursor": None}
+
+    assert client.get("/api/v1/users/1?fields=name,stats").get_json()["data"] == {
+        "name": "Ann", "stats": {"movie_count": 3, "rating_count": 3, "average_rating": 8.0,
+                                 "top_director": "Michael Mann"}}
+    assert client.get("/api/v1/movies/2?fields=year").get_json() == {"data": {"year": 1992}}
+
+
+def test_errors(client):
+    """Test that bad parameters and missing resources answer with JSON errors."""
+    response = client.get("/api/v1/users?fields=password")
+    assert response.status_code == 400
+    assert "password" in response.get_json()["error"]
+    assert client.get("/api/v1/movies?limit=many").status_code == 400
+    assert client.get("/api/v1/users/1/movies?after=garbage").status_code == 400
+    assert client.get("/api/v1/users/99").status_code == 404
+    assert client.get("/api/v1/users/99/movies").get_json() == {"error": "Not found"}
+
+
+def test_conditional_requests(client, data_manager):
+    """Test that ETags follow writes to the data behind a resource, not to other data."""
+    response = client.get("/api/v1/users/1/movies")
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert client.get("/api/v1/users/1/movies", headers={"If-None-Match": etag}).status_code == 304
+    data_manager.set_user_movies(2, 5, 6.0)
+    assert client.get("/api/v1/users/1/movies", headers={"If-None-Match": etag}).status_code == 304
+    data_manager.set_user_movies(1, 5, 6.0)
+    response = client.get("/api/v1/users/1/movies", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.get_json()["data"]) == 4
+
+
+def test_compression(client):
+    """Test that large bodies are gzipped for clients that accept it, small ones are not."""
+    response = client.get("/api/v1/movies?limit=100", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert len(json.loads(gzip.decompress(response.data))["data"]) == 100
+    assert "Content-Encoding" not in client.get("/api/v1/movies?limit=100").headers
+    small = client.get("/api/v1/users", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
@@ -1,84 +1,345 @@
 
 
-from flask import Flask, render_template, request
+import dataclasses
+import hashlib
+import logging
+import os
+import uuid
+from functools import wraps
+
+import dotenv
+from flask import (Flask, render_template, request, abort, make_response, redirect, send_file,
+                   jsonify, Response, stream_with_context)
+from api import JsonApi
+from datamanager.bulk_import import read_titles
+from datamanager.cache import ResultCache, MISS
+from datamanager.engine_profiles import read_only_url
+from datamanager.jobs import JobQueue, Worker
 from datamanager.sqlite_data_manager import SQliteDataManager
-from data_models import User, Movie, UserMovie
+from data_models import User
+from instrumentation import Instrumentation
+from posters import PosterCache, PosterError, is_poster_url, DEFAULT_SIZE
+
+DB_URL = "sqlite:///movie_app.db"
+POSTER_MAX_AGE = 7 * 24 * 3600
+
+# Set up by create_app(); the views below use them. One app per process.
+data_manager: SQliteDataManager | None = None
+instrumentation: Instrumentation | None = None
+page_cache: ResultCache | None = None
+job_queue: JobQueue | None = None
+job_worker: Worker | None = None
+poster_cache: PosterCache | None = None
+
+# (rule, view, options) of every view, registered on the app by create_app().
+_routes = []
+
+
+def route(rule: str, **options):
+    def decorator(view):
+        _routes.append((rule, view, options))
+        return view
+    return decorator
+
+
+def create_app(db_url: str = DB_URL) -> Flask:
+    """
+    Build the app and everything it serves from. Importing this module does none of
+    it, so a pre-forking server can import once and call create_app() in each worker
+    (e.g. gunicorn 'app:create_app()'), and every worker opens its own connections.
+    Each worker caches reads and pages; the writes of other workers and of job
+    processes reach it through the database's change log, read at the start of a
+    request at most every CHANGE_SYNC_INTERVAL seconds (see
+    SQliteDataManager.sync_changes), so that is how stale a cached page can be.
+    """
+    global data_manager, instrumentation, page_cache, job_queue, job_worker, poster_cache
+    dotenv.load_dotenv()
+    app = Flask(__name__)
+
+    # Reads use a pool of read-only connections (READER_DB_URL, or the same file opened
+    # with mode=ro); writes, and reads following a write in the same request, the writer.
+    data_manager = SQliteDataManager(db_url, profile=os.getenv("SQLITE_PROFILE", "wal"),
+                                     reader_url=os.getenv("READER_DB_URL") or read_only_url(db_url))
+    # Also drops what this worker cached of other processes' writes.
+    app.before_request(data_manager.start_request)
+
+    # Server-Timing headers, a log line per request and /metrics for Prometheus.
+    instrumentation = Instrumentation(app)
+    instrumentation.instrument_engine(data_manager.engine)
+    if data_manager.read_engine is not data_manager.engine:
+        instrumentation.instrument_engine(data_manager.read_engine)
+
+    # Rendered pages, keyed by path and query string, dropped when the data behind them changes.
+    page_cache = ResultCache(max_entries=512, max_size=32 * 1024 * 1024)
+    data_manager.add_listener(page_cache.invalidate)
+
+    # Slow work is queued in the database (see datamanager.jobs). JOB_WORKER=inline (the
+    # default) runs it in threads of this process, started on first use; with
+    # JOB_WORKER=external, `python -m datamanager.jobs` runs it in a pool of processes.
+    job_queue = JobQueue(data_manager.engine)
+    job_worker = (Worker.in_threads(data_manager, threads=int(os.getenv("JOB_THREADS", "4")))
+                  if os.getenv("JOB_WORKER", "inline") == "inline" else None)
+
+    # Local copies of the OMDb posters, fetched as soon as a movie is stored.
+    poster_cache = PosterCache()
+    data_manager.add_movie_listener(lambda movie: poster_cache.prefetch(movie.get("poster")))
+
+    for rule, view, options in _routes:
+        app.add_url_rule(rule, view_func=view, **options)
+    # The same data as JSON for other clients, at /api/v1 (see api.py).
+    JsonApi(data_manager, app)
+    return app
+
+
+_app = None
+
+
+def __getattr__(name):
+    # `app.app`, for `flask run` and code written before create_app(): built on first use.
+    global _app
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _app is None:
+        _app = create_app()
+    return _app
+
+
+def enqueue(kind: str, payload: dict, **kwargs) -> int:
+    if job_worker is not None:
+        job_worker.start()
+    return job_queue.enqueue(kind, payload, **kwargs)
 
-app = Flask(__name__)
-data_manager = SQliteDataManager("sqlite:///movie_app.db")
 
-@app.route('/')
+def cached_page(tags):
+    """
+    Serve GET requests of a view from page_cache. tags(**view_args) names the data the
+    page is built from (see SQliteDataManager.add_listener). Responses carry an ETag and
+    Last-Modified and must be revalidated, so browsers get a 304 while nothing changed.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            if request.method != "GET":
+                return view(**view_args)
+            page_tags = tags(**view_args)
+            key = request.full_path
+            entry = page_cache.get(key)
+            if entry is MISS:
+                generation = page_cache.generation
+                body = view(**view_args).encode()
+                entry = (body, hashlib.sha1(body).hexdigest())
+                page_cache.set(key, entry, page_tags, size=len(body), generation=generation)
+            body, etag = entry
+            response = make_response(body)
+            response.set_etag(etag)
+            response.last_modified = page_cache.last_modified(page_tags)
+            response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+@route('/')
 def home():
     return render_template("home.html")
 
 
-@app.route('/users')
+def optional_int(name: str) -> int | None:
+    """
+    Read an optional integer query parameter, rejecting garbage with a 400.
+    """
+    value = request.args.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        abort(400, f"{name} must be an integer")
+
+
+@route('/users')
+@cached_page(lambda: ["users"])
 def list_users():
-    users = data_manager.users
+    try:
+        page = data_manager.list_users(limit=optional_int("limit"),
+                                       after=request.args.get("after"),
+                                       sort=request.args.get("sort", "name"))
+    except ValueError as e:
+        abort(400, str(e))
 
-    return render_template("users.html",users=users)
+    return render_template("users.html", users=page.items, next_cursor=page.next_cursor)
 
-@app.route('/users/<user_id>', methods=["GET", "POST"])
+@route('/users/<int:user_id>', methods=["GET", "POST"])
+@cached_page(lambda user_id: [f"user:{user_id}", f"user_movies:{user_id}"])
 def user_movies(user_id):
     if request.method == "GET":
         chosen_user = data_manager.get_user(user_id)
         user_movies_list = data_manager.get_user_movies(user_id)
         return render_template("user_movies.html", user_movies=user_movies_list,
-                    user=chosen_user)
+                    user=chosen_user, stats=data_manager.get_user_stats(user_id))
     elif request.method == "POST":
         chosen_user = data_manager.get_user(user_id)
         movie_title = request.form["movie_title"]
-        with data_manager.SessionFactory() as session:
-            movie = session.query(Movie).filter_by(name=movie_title).first()
+        movie = data_manager.find_movie(movie_title)
 
-        data_manager.set_user_movies(user_id, movie.id, movie.rating, movie.user_rating)
-        success = True
+        try:
+            if movie is None:
+                raise ValueError("Movie not found")
+            data_manager.set_user_movies(user_id, movie.id, movie.rating)
+            success = True
+        except ValueError:
+            success = False
         user_movies_list = data_manager.get_user_movies(user_id)
         return render_template("user_movies.html", user_movies=user_movies_list,
-                    user=chosen_user, success=success)
+                    user=chosen_user, success=success, stats=data_manager.get_user_stats(user_id))
+
+@route('/users/<int:user_id>/movies', methods=["POST"])
+def add_user_movies(user_id):
+    """
+    Add many movies to a user's list in one request: a JSON body
+    {"titles": [...], "movie_ids": [...], "fetch": true}, or a plain text watchlist
+    with one title per line. Titles not stored yet are fetched from OMDb unless
+    fetch is false. Answers with the diff of the list (see UserMoviesDiff).
+    """
+    if data_manager.get_user(user_id) is None:
+        abort(404)
+    if request.mimetype == "text/plain":
+        titles = list(read_titles(request.get_data(as_text=True).splitlines()))
+        movie_ids, fetch = [], True
+    else:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            abort(400, "Send a JSON object or a text/plain list of titles")
+        titles, movie_ids = body.get("titles", []), body.get("movie_ids", [])
+        fetch = body.get("fetch", True)
+        if not (isinstance(titles, list) and all(isinstance(title, str) for title in titles)
+                and isinstance(movie_ids, list)
+                and all(isinstance(movie_id, int) for movie_id in movie_ids)):
+            abort(400, "titles must be a list of strings and movie_ids a list of integers")
+    try:
+        diff = data_manager.add_user_movies(user_id, titles, movie_ids, fetch=bool(fetch))
+    except ValueError as e:
+        abort(400, str(e))
+    return jsonify(dataclasses.asdict(diff))
 
-@app.route('/users/new', methods=["GET", "POST"])
+@route('/users/new', methods=["GET", "POST"])
 def new_user():
     if request.method == "GET":
         return render_template("new_user.html")
     elif request.method == "POST":
         name = request.form["name"]
         user = User(name=name)
-        with data_manager.SessionFactory() as session:
-            try:
-                session.add(user)
-                session.commit()
-                success = True
-            except Exception():
-                session.rollback()
-                success = False
+        try:
+            data_manager.add_user(user)
+            success = True
+        except Exception:
+            success = False
         return render_template("new_user.html", success=success)
 
-@app.route('/movies/new', methods=["GET", "POST"])
+@route('/movies/new', methods=["GET", "POST"])
 def new_movie():
     if request.method == "GET":
         return render_template("new_movie.html")
     elif request.method == "POST":
         title = request.form["name"]
-        movie = data_manager.set_movie(title)
-        if movie:
-            success = True
-        else:
-            success = False
-        return render_template("new_movie.html", movie=movie, success=success)
+        movie = data_manager.add_pending_movie(title)
+        # Movie ids are reused after deletes, so the key names this insert, not the id.
+        job_id = enqueue("enrich_movie", {"movie_id": movie.id, "title": title},
+                         idempotency_key=f"enrich_movie:{movie.id}:{uuid.uuid4().hex}")
+        return render_template("new_movie.html", movie=movie, success=True, pending=True,
+                               job_id=job_id)
+
+def movies_page():
+    """
+    The page of movies selected by the query parameters
+    (limit, after, sort, director, year_min, year_max).
+    """
+    try:
+        return data_manager.list_movies(limit=optional_int("limit"),
+                                        after=request.args.get("after"),
+                                        sort=request.args.get("sort", "name"),
+                                        director=request.args.get("director"),
+                                        year_min=optional_int("year_min"),
+                                        year_max=optional_int("year_max"))
+    except ValueError as e:
+        abort(400, str(e))
+
 
-@app.route('/movies', methods=["GET", "POST"])
+@route('/movies', methods=["GET", "POST"])
+@cached_page(lambda: ["movies"])
 def list_movies():
     if request.method == "GET":
-        movies = data_manager.movies
-        return render_template("movies.html",movies=movies)
+        page = movies_page()
+        return render_template("movies.html", movies=page.items, next_cursor=page.next_cursor)
     elif request.method == "POST":
-        movie_id = request.form["movie_id"]
+        try:
+            movie_id = int(request.form["movie_id"])
+        except ValueError:
+            abort(400, "movie_id must be an integer")
         data_manager.delete_movie(movie_id)
-        movies = data_manager.movies
-        return render_template("movies.html",movies=movies)
+        page = movies_page()
+        return render_template("movies.html", movies=page.items, next_cursor=page.next_cursor)
 
-if __name__ == "__main__":
+@route('/movies/search')
+@cached_page(lambda: ["movies"])
+def search_movies():
+    query = request.args.get("q", "").strip()
+    movies = data_manager.search_movies(query, limit=optional_int("limit") or 20) if query else []
+    return render_template("movies.html", movies=movies, query=query)
+
+@route('/users/<int:user_id>/recommendations')
+def recommendations(user_id):
+    user = data_manager.get_user(user_id)
+    if user is None:
+        abort(404)
+    limit = optional_int("limit") or 10
+    movies = data_manager.recommend_movies(user_id, min(limit, 100))
+    return render_template("recommendations.html", user=user, movies=movies)
 
-    app.run(debug=True, host="127.0.0.1",port=5000)
+@route('/jobs/<int:job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
+
+@route('/export')
+def export():
+    """
+    Download movies, users and ratings (?table=... to pick, repeatable) as JSONL, or
+    one table with ?format=csv. Streamed with chunked encoding as rows are read.
+    """
+    fmt = request.args.get("format", "jsonl")
+    tables = request.args.getlist("table")
+    try:
+        chunks = data_manager.export_data(tables, fmt)
+    except ValueError as e:
+        abort(400, str(e))
+    name = "-".join(tables) or "movie_app"
+    response = Response(stream_with_context(chunks),
+                        mimetype="text/csv" if fmt == "csv" else "application/x-ndjson")
+    response.headers["Content-Disposition"] = f"attachment; filename={name}.{fmt}"
+    return response
+
+@route('/posters/<int:movie_id>')
+def poster(movie_id):
+    movie = data_manager.get_movie(movie_id)
+    if movie is None or not is_poster_url(movie.poster):
+        abort(404)
+    size = request.args.get("size", DEFAULT_SIZE)
+    try:
+        path, digest = poster_cache.get(movie.poster, size)
+    except ValueError as e:
+        abort(400, str(e))
+    except PosterError:
+        # Better the third-party image than none at all.
+        return redirect(movie.poster)
+    response = send_file(path, mimetype=poster_cache.content_type(digest), etag=f"{digest[:32]}-{size}",
+                         max_age=POSTER_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    return response
+
+if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    create_app().run(debug=True, host="127.0.0.1",port=5000)
 
@@ -0,0 +1,166 @@
+import threading
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    """
+    Fixture for a test client of the app, run against a database in a temporary directory.
+    """
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.chdir(tmp_path_factory.mktemp("app"))
+    monkeypatch.setenv("OMDB_CACHE_PATH", "")
+    # Jobs are only queued, nothing calls OMDb.
+    monkeypatch.setenv("JOB_WORKER", "external")
+    import app
+    app.app.config["TESTING"] = True
+    yield app.app.test_client()
+    monkeypatch.undo()
+
+
+def test_pages_are_cached_and_revalidated(client):
+    """Test that listings carry validators and answer conditional requests with 304."""
+    first = client.get("/users")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Last-Modified"]
+    again = client.get("/users", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+
+def test_writes_invalidate_pages(client):
+    """Test that adding a user changes the cached users page."""
+    etag = client.get("/users").headers["ETag"]
+    assert client.post("/users/new", data={"name": "Zelda"}).status_code == 200
+    page = client.get("/users", headers={"If-None-Match": etag})
+    assert page.status_code == 200
+    assert b"Zelda" in page.data
+
+
+def test_new_user_replaces_cached_not_found(client):
+    """Test that an id looked up before its user existed shows the user once created."""
+    import app
+    user_id = max([user.id for user in app.data_manager.users], default=0) + 1
+    assert b"Yannick" not in client.get(f"/users/{user_id}").data
+    assert client.get(f"/api/v1/users/{user_id}").status_code == 404
+    client.post("/users/new", data={"name": "Yannick"})
+    assert b"Yannick" in client.get(f"/users/{user_id}").data
+    assert client.get(f"/api/v1/users/{user_id}").get_json()["data"]["name"] == "Yannick"
+
+
+def test_poster_route(client, tmp_path):
+    """Test that posters are served from the local cache with long-lived validators."""
+    import app
+    from posters_test import ImageServer, make_image
+    server = ImageServer()
+    server.images["/p.png"] = make_image()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        app.poster_cache.root = str(tmp_path)
+        movie = app.data_manager.add_pending_movie("Poster Test")
+        app.data_manager.update_movie(movie.id, {"poster": server.url("/p.png")})
+        response = client.get(f"/posters/{movie.id}?size=thumb")
+        assert response.status_code == 200
+        assert response.mimetype == "image/jpeg"
+        assert "public" in response.headers["Cache-Control"]
+        again = client.get(f"/posters/{movie.id}?size=thumb",
+                           headers={"If-None-Match": response.headers["ETag"]})
+        assert again.status_code == 304
+        assert client.get(f"/posters/{movie.id}?size=huge").status_code == 400
+        assert client.get("/posters/999999").status_code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_recommendations_page(client):
+    """Test the recommendations page for a user without and with a list."""
+    import app
+    assert client.get("/users/424242/recommendations").status_code == 404
+    client.post("/users/new", data={"name": "Rec"})
+    user = next(user for user in app.data_manager.users if user.name == "Rec")
+    page = client.get(f"/users/{user.id}/recommendations")
+    assert page.status_code == 200
+    assert b"No recommendations yet" in page.data
+
+
+def test_requests_are_instrumented(client):
+    """Test that pages report their timings and show up in /metrics."""
+    client.get("/movies?sort=year")
+    response = client.get("/movies?sort=-year")
+    assert "db;dur=" in response.headers["Server-Timing"]
+    metrics = client.get("/metrics").get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{method="GET",endpoint="list_movies",status="200"}' \
+        in metrics
+
+
+def test_new_movie_enqueues_enrichment(client):
+    """Test that adding a movie queues its enrichment and reports the job's status."""
+    import app
+    response = client.post("/movies/new", data={"name": "Queued Film"})
+    assert response.status_code == 200
+    [job_id] = [job["id"] for job in app.job_queue.claim(10) if job["kind"] == "enrich_movie"]
+    status = client.get(f"/jobs/{job_id}").get_json()
+    assert (status["kind"], status["status"], status["attempts"]) == ("enrich_movie", "running", 1)
+    assert client.get("/jobs/999999").status_code == 404
+
+
+def test_reused_movie_id_gets_its_own_enrichment(client):
+    """Test that a movie reusing a deleted movie's id is queued for enrichment anew."""
+    import app
+    client.post("/movies/new", data={"name": "Nonexistent title"})
+    [old] = [job for job in app.job_queue.claim(10) if job["kind"] == "enrich_movie"]
+    app.data_manager.delete_movie(old["payload"]["movie_id"])
+    client.post("/movies/new", data={"name": "The Matrix"})
+    [new] = [job for job in app.job_queue.claim(10) if job["kind"] == "enrich_movie"]
+    assert new["id"] != old["id"]
+    assert new["payload"] == {"movie_id": old["payload"]["movie_id"], "title": "The Matrix"}
+
+
+def test_delete_movie_form(client):
+    """Test that the movies page deletes by id and rejects ids that aren't integers."""
+    import app
+    movie = app.data_manager.add_pending_movie("Doomed Film")
+    assert client.post("/movies", data={"movie_id": "abc"}).status_code == 400
+    assert app.data_manager.get_movie(movie.id) is not None
+    response = client.post("/movies", data={"movie_id": str(movie.id)})
+    assert response.status_code == 200
+    assert app.data_manager.get_movie(movie.id) is None
+
+
+def test_export_streams(client):
+    """Test that /export streams the tables instead of building the whole body."""
+    response = client.get("/export?table=users&format=csv")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == "text/csv"
+    assert response.get_data(as_text=True).startswith("id,name\n")
+    assert client.get("/export?format=xml").status_code == 400
+
+
+def test_add_user_movies(client, monkeypatch):
+    """Test adding a watchlist in one request, answered with the diff of the list."""
+    import app
+    from benchmarks.stub_omdb import StubOMDb
+    stub = StubOMDb(latency=0).start()
+    monkeypatch.setenv("OMDB_BASE_URL", stub.base_url)
+    try:
+        client.post("/users/new", data={"name": "Watcher"})
+        user = next(user for user in app.data_manager.users if user.name == "Watcher")
+        stored = app.data_manager.add_pending_movie("Stored Film")
+        diff = client.post(f"/users/{user.id}/movies",
+                           json={"titles": ["Watchlist One", "Watchlist Two"],
+                                 "movie_ids": [stored.id]}).get_json()
+        assert [movie["name"] for movie in diff["added"]] == \
+            ["Stored Film", "Watchlist One", "Watchlist Two"]
+        assert len(diff["created"]) == 2 and stub.request_count == 2
+        diff = client.post(f"/users/{user.id}/movies", data="Watchlist One\nWatchlist Three\n",
+                           content_type="text/plain").get_json()
+        assert [movie["name"] for movie in diff["added"]] == ["Watchlist Three"]
+        assert len(diff["existing"]) == 1
+        assert client.post(f"/users/{user.id}/movies", json={"titles": "x"}).status_code == 400
+        assert client.post("/users/424242/movies", json={"titles": []}).status_code == 404
+    finally:
+        stub.stop()
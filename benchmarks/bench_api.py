@@ -0,0 +1,50 @@
+import argparse
+import os
+import tempfile
+
+from benchmarks.common import seed, measure
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Bytes and latency of a movie listing: HTML page vs the JSON API.")
+    parser.add_argument("--movies", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--ratings-per-user", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["JOB_WORKER"] = "external"
+        import app
+        flask_app = app.create_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        seed(app.data_manager.engine, args.movies, args.users, args.ratings_per_user,
+             create=False)
+        app.data_manager.invalidate(["movies"])
+        client = flask_app.test_client()
+        query = f"limit={args.limit}&sort=-rating"
+        cases = [
+            ("HTML page", f"/movies?{query}", {}),
+            ("JSON", f"/api/v1/movies?{query}", {}),
+            ("JSON gzip", f"/api/v1/movies?{query}", {"Accept-Encoding": "gzip"}),
+            ("JSON id,name", f"/api/v1/movies?{query}&fields=id,name", {}),
+            ("JSON id,name gzip", f"/api/v1/movies?{query}&fields=id,name",
+             {"Accept-Encoding": "gzip"}),
+        ]
+        print(f"{'response':<20}{'bytes':>9}{'p50 ms':>9}{'304 p50 ms':>12}")
+        for name, url, headers in cases:
+            response = client.get(url, headers=headers)
+            assert response.status_code == 200
+            etag = response.headers["ETag"]
+            stats = measure(lambda: client.get(url, headers=headers), args.repeat)
+            revalidated = measure(lambda: client.get(url, headers={**headers,
+                                                                   "If-None-Match": etag}),
+                                  args.repeat)
+            print(f"{name:<20}{len(response.data):>9}{stats['p50']:>9.2f}"
+                  f"{revalidated['p50']:>12.2f}")
+        app.data_manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
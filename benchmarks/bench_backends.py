@@ -0,0 +1,59 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import seed
+from benchmarks.stub_omdb import StubOMDb
+from benchmarks.suite import Scale, micro_benchmarks
+from datamanager import transfer
+from datamanager.memory_data_manager import MemoryDataManager
+from datamanager.sqlite_data_manager import SQliteDataManager
+
+
+def load_memory(source: SQliteDataManager) -> MemoryDataManager:
+    """
+    A MemoryDataManager holding the same rows as source.
+    """
+    data_manager = MemoryDataManager()
+    for table, rows in transfer.export_rows(source.engine):
+        data_manager.load(table, rows)
+    return data_manager
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="The suite's micro benchmarks on every storage backend, side by side.")
+    parser.add_argument("--movies", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--ratings-per-user", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args(argv)
+    scale = Scale(args.movies, args.users, args.ratings_per_user)
+
+    stub = StubOMDb(latency=0).start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            sqlite = SQliteDataManager(f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                                       cache_size=0)
+            seed(sqlite.engine, scale.movies, scale.users, scale.ratings_per_user,
+                 create=False)
+            started = time.perf_counter()
+            memory = load_memory(sqlite)
+            print(f"memory backend loaded in {time.perf_counter() - started:.1f}s")
+            results = {name: micro_benchmarks(data_manager, scale, stub, args.repeat)
+                       for name, data_manager in [("sqlite", sqlite), ("memory", memory)]}
+            sqlite.engine.dispose()
+    finally:
+        stub.stop()
+
+    print(f"{'method':<26}" + "".join(f"{name + ' p50 ms':>16}" for name in results))
+    for method in results["sqlite"]:
+        cells = []
+        for stats in (result.get(method, {"skipped": ""}) for result in results.values()):
+            cells.append(f"{'-':>16}" if "skipped" in stats else f"{stats['p50']:>16.3f}")
+        print(f"{method:<26}" + "".join(cells))
+
+
+if __name__ == "__main__":
+    main()
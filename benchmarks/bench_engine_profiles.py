@@ -0,0 +1,79 @@
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from benchmarks.common import seed
+from datamanager.engine_profiles import PROFILES
+from datamanager.sqlite_data_manager import SQliteDataManager
+
+
+def run_workload(data_manager, threads: int, duration: float, write_ratio: float,
+                 movies: int, users: int) -> dict:
+    """
+    Hammer the data manager from several threads with a read/write mix for `duration` seconds.
+    """
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+
+    def worker(worker_id):
+        rng = random.Random(worker_id)
+        local = {"reads": 0, "writes": 0, "errors": 0}
+        while time.monotonic() < stop:
+            try:
+                if rng.random() < write_ratio:
+                    data_manager.set_user_movies(rng.randint(1, users), rng.randint(1, movies),
+                                                 round(rng.uniform(1, 10), 1))
+                    local["writes"] += 1
+                elif rng.random() < 0.5:
+                    data_manager.get_user_movies(rng.randint(1, users))
+                    local["reads"] += 1
+                else:
+                    data_manager.list_movies(limit=20, sort="-rating")
+                    local["reads"] += 1
+            except (OperationalError, ValueError):
+                local["errors"] += 1
+        with lock:
+            for key, value in local.items():
+                counts[key] += value
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    counts["ops_per_second"] = (counts["reads"] + counts["writes"]) / duration
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mixed read/write throughput per engine profile.")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES))
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--movies", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--ratings-per-user", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(f"{'profile':<10}{'ops/s':>10}{'reads':>10}{'writes':>10}{'errors':>8}")
+    for name in args.profiles:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_manager = SQliteDataManager(f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                                             profile=name)
+            seed(data_manager.engine, args.movies, args.users, args.ratings_per_user, create=False)
+            result = run_workload(data_manager, args.threads, args.duration, args.write_ratio,
+                                  args.movies, args.users)
+            data_manager.engine.dispose()
+        print(f"{name:<10}{result['ops_per_second']:>10.0f}{result['reads']:>10}"
+              f"{result['writes']:>10}{result['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import os
+import random
+import tempfile
+
+from sqlalchemy import create_engine, select
+
+from benchmarks.common import seed, measure, movie_name
+from data_models import User, Movie, UserMovie
+from datamanager import migrations
+
+INDEXES = ["ix_movies_name", "ix_movies_year", "ix_movies_rating", "ix_users_name",
+           "ix_user_movies_user_id_movie_id", "ix_user_movies_movie_id"]
+
+
+def lookups(engine, movies: int, users: int, repeat: int) -> dict:
+    rng = random.Random(7)
+    with engine.connect() as conn:
+        def movie_by_name():
+            conn.execute(select(Movie.id).where(Movie.name == movie_name(rng.randrange(movies)))).first()
+
+        def user_by_name():
+            conn.execute(select(User.id).where(User.name == f"user{rng.randrange(users)}")).first()
+
+        def association():
+            conn.execute(select(UserMovie.id).where(UserMovie.user_id == rng.randint(1, users),
+                                                    UserMovie.movie_id == rng.randint(1, movies))).first()
+
+        return {"movie_by_name": measure(movie_by_name, repeat),
+                "user_by_name": measure(user_by_name, repeat),
+                "user_movie_pair": measure(association, repeat)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lookup latency before and after the index migration.")
+    parser.add_argument("--movies", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--ratings-per-user", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        seed(engine, args.movies, args.users, args.ratings_per_user)
+        # Turn the fresh database back into a pre-migration one.
+        with engine.begin() as conn:
+            for index in INDEXES:
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index}")
+            conn.exec_driver_sql("PRAGMA user_version = 0")
+
+        before = lookups(engine, args.movies, args.users, args.repeat)
+        migrations.migrate(engine)
+        after = lookups(engine, args.movies, args.users, args.repeat)
+        engine.dispose()
+
+    print(f"{'lookup':<18}{'before p50 ms':>15}{'after p50 ms':>15}{'speedup':>10}")
+    for name in before:
+        b, a = before[name]["p50"], after[name]["p50"]
+        print(f"{name:<18}{b:>15.3f}{a:>15.3f}{b / a:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import seed, movie_name
+from benchmarks.stub_omdb import StubOMDb
+from datamanager.sqlite_data_manager import SQliteDataManager
+from movie_api import OMDBCache, OMDBClient
+
+
+def add_one_by_one(data_manager, user_id: int, titles) -> None:
+    """
+    What a POST to /users/<id> per title does: look the title up, add it, re-read the list.
+    """
+    for title in titles:
+        data_manager.start_request()
+        movie = data_manager.find_movie(title)
+        data_manager.set_user_movies(user_id, movie.id, movie.rating)
+        data_manager.get_user_movies(user_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Adding a watchlist: per title vs one batch.")
+    parser.add_argument("--movies", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--ratings-per-user", type=int, default=20)
+    parser.add_argument("--titles", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--new-titles", type=int, default=100,
+                        help="titles not stored yet, fetched from a stub OMDb")
+    parser.add_argument("--latency", type=float, default=0.02, help="stub OMDb latency (s)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_manager = SQliteDataManager(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        seed(data_manager.engine, args.movies, args.users, args.ratings_per_user, create=False)
+        print(f"{'stored titles':<16}{'one by one ms':>15}{'batch ms':>10}")
+        offset = 0
+        for count in args.titles:
+            titles = [movie_name(offset + i) for i in range(2 * count)]
+            offset += 2 * count
+            start = time.perf_counter()
+            add_one_by_one(data_manager, 1, titles[:count])
+            single_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            data_manager.start_request()
+            diff = data_manager.add_user_movies(2, titles[count:], fetch=False)
+            batch_ms = (time.perf_counter() - start) * 1000
+            assert len(diff.added) + len(diff.existing) == count
+            print(f"{count:<16}{single_ms:>15.1f}{batch_ms:>10.1f}")
+
+        stub = StubOMDb(latency=args.latency).start()
+        try:
+            print(f"\n{'new titles':<16}{'workers':>8}{'batch ms':>10}")
+            for workers in (1, 8):
+                client = OMDBClient(cache=OMDBCache(path=None), base_url=stub.base_url)
+                titles = [f"Fetched {workers} {i}" for i in range(args.new_titles)]
+                start = time.perf_counter()
+                diff = data_manager.add_user_movies(3, titles, workers=workers, client=client)
+                batch_ms = (time.perf_counter() - start) * 1000
+                assert len(diff.created) == args.new_titles
+                print(f"{args.new_titles:<16}{workers:>8}{batch_ms:>10.1f}")
+        finally:
+            stub.stop()
+        data_manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
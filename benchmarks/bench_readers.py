@@ -0,0 +1,79 @@
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmarks.common import seed
+from datamanager.engine_profiles import read_only_url
+from datamanager.sqlite_data_manager import SQliteDataManager
+
+
+def run_reads(data_manager, threads: int, duration: float, write_ratio: float,
+              movies: int, users: int) -> float:
+    """
+    Operations per second of `threads` threads each running "requests" of one
+    data manager call, mostly reads, for `duration` seconds.
+    """
+    done = [0]
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+
+    def worker(worker_id):
+        rng = random.Random(worker_id)
+        local = 0
+        while time.monotonic() < stop:
+            data_manager.start_request()
+            if rng.random() < write_ratio:
+                data_manager.set_user_movies(rng.randint(1, users), rng.randint(1, movies), 7.0)
+            elif rng.random() < 0.5:
+                data_manager.get_user_movies(rng.randint(1, users))
+            else:
+                data_manager.list_movies(limit=20, sort="-rating",
+                                         year_min=rng.randint(1950, 2020))
+            local += 1
+        with lock:
+            done[0] += local
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return done[0] / duration
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Read throughput with every query on the writer versus a read-only pool.")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    parser.add_argument("--movies", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--ratings-per-user", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        seed(SQliteDataManager(url).engine, args.movies, args.users, args.ratings_per_user,
+             create=False)
+        setups = {
+            "writer only": SQliteDataManager(url, cache_size=0),
+            "reader pool": SQliteDataManager(url, cache_size=0, reader_url=read_only_url(url),
+                                             reader_pool_size=max(args.threads)),
+        }
+        print(f"cpus: {os.cpu_count()}")
+        print(f"{'threads':<10}" + "".join(f"{name + ' ops/s':>20}" for name in setups))
+        for threads in args.threads:
+            row = [run_reads(data_manager, threads, args.duration, args.write_ratio,
+                             args.movies, args.users) for data_manager in setups.values()]
+            print(f"{threads:<10}" + "".join(f"{ops:>20.0f}" for ops in row))
+        for data_manager in setups.values():
+            data_manager.engine.dispose()
+            data_manager.read_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
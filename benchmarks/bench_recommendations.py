@@ -0,0 +1,60 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+from benchmarks.common import measure
+from datamanager.recommendations import ItemSimilarityModel
+
+
+def synthetic_ratings(users: int, movies: int, per_user: int, seed_value: int = 42):
+    """
+    (user_id, movie_id, rating) triples with a long-tail popularity: a few movies
+    are on many lists, most on a few.
+    """
+    rng = np.random.default_rng(seed_value)
+    weights = 1.0 / np.arange(1, movies + 1) ** 0.8
+    weights /= weights.sum()
+    user_ids = np.repeat(np.arange(users), per_user)
+    movie_ids = rng.choice(movies, size=users * per_user, p=weights)
+    ratings = rng.integers(1, 11, size=users * per_user)
+    # Duplicate (user, movie) draws are fine: the model keeps the sum, like a re-rating would.
+    return zip(user_ids.tolist(), movie_ids.tolist(), ratings.tolist())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Item-item recommendation model latency.")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--movies", type=int, default=50_000)
+    parser.add_argument("--per-user", type=int, default=20)
+    parser.add_argument("--neighbours", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    model = ItemSimilarityModel(neighbours=args.neighbours, max_staleness=float("inf"))
+    model.fit(synthetic_ratings(args.users, args.movies, args.per_user))
+    fit_seconds = time.perf_counter() - started
+    rng = random.Random(3)
+
+    def update():
+        model.update(rng.randrange(args.users), rng.randrange(args.movies), rng.randint(1, 10))
+
+    results = {
+        "recommend": measure(lambda: model.recommend(rng.randrange(args.users), 10), args.repeat),
+        "update": measure(update, args.repeat),
+    }
+    started = time.perf_counter()
+    model.refresh()
+    refresh_ms = (time.perf_counter() - started) * 1000
+
+    print(f"fit: {fit_seconds:.1f}s, model arrays: {model.nbytes() / 2**20:.0f} MiB, "
+          f"refresh of pending updates: {refresh_ms:.0f} ms")
+    print(f"{'operation':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in results.items():
+        print(f"{name:<20}{stats['p50']:>10.3f}{stats['p95']:>10.3f}{stats['p99']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
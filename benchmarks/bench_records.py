@@ -0,0 +1,107 @@
+import argparse
+import os
+import tempfile
+import tracemalloc
+
+from sqlalchemy import select
+
+from benchmarks.common import seed, measure
+from data_models import Movie, MovieStats, User, UserMovie
+from datamanager.records import MovieRecord, UserRecord, UserMovieRecord
+from datamanager.sqlite_data_manager import (SQliteDataManager, MOVIE_COLUMNS, USER_COLUMNS,
+                                             USER_MOVIE_COLUMNS)
+
+
+def orm_listings(data_manager, limit: int) -> dict:
+    """
+    The listings as they were read before: ORM instances (movies with their joined
+    stats) from a session, and dicts for a user's movies.
+    """
+    def movies():
+        with data_manager.SessionFactory() as db:
+            return db.scalars(select(Movie).order_by(Movie.rating.desc(), Movie.id.desc())
+                              .limit(limit)).unique().all()
+
+    def users():
+        with data_manager.SessionFactory() as db:
+            return db.scalars(select(User).order_by(User.name, User.id).limit(limit)).all()
+
+    def user_movies():
+        query = (select(*USER_MOVIE_COLUMNS).join_from(UserMovie, Movie, UserMovie.movie_id == Movie.id)
+                 .where(UserMovie.user_id == 1).order_by(UserMovie.id))
+        with data_manager.engine.connect() as conn:
+            return [dict(row) for row in conn.execute(query).mappings()]
+
+    return {"list_movies": movies, "list_users": users, "user_movies": user_movies}
+
+
+def record_listings(data_manager, limit: int) -> dict:
+    """
+    The same reads as records built from Core rows, as the data manager does now.
+    """
+    def movies():
+        query = (select(*MOVIE_COLUMNS).outerjoin(MovieStats, MovieStats.movie_id == Movie.id)
+                 .order_by(Movie.rating.desc(), Movie.id.desc()).limit(limit))
+        with data_manager.engine.connect() as conn:
+            return [MovieRecord.from_row(row) for row in conn.execute(query)]
+
+    def users():
+        query = select(*USER_COLUMNS).order_by(User.name, User.id).limit(limit)
+        with data_manager.engine.connect() as conn:
+            return [UserRecord(*row) for row in conn.execute(query)]
+
+    def user_movies():
+        query = (select(*USER_MOVIE_COLUMNS).join_from(UserMovie, Movie, UserMovie.movie_id == Movie.id)
+                 .where(UserMovie.user_id == 1).order_by(UserMovie.id))
+        with data_manager.engine.connect() as conn:
+            return [UserMovieRecord(*row) for row in conn.execute(query)]
+
+    return {"list_movies": movies, "list_users": users, "user_movies": user_movies}
+
+
+def retained_bytes(fn) -> int:
+    """
+    Memory still allocated by fn's result once it returned.
+    """
+    tracemalloc.start()
+    try:
+        result = fn()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Listing latency and memory: ORM objects vs records.")
+    parser.add_argument("--movies", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--ratings-per-user", type=int, default=200)
+    parser.add_argument("--limit", type=int, nargs="+", default=[50, 200, 5000])
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_manager = SQliteDataManager(f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                                         cache_size=0)
+        seed(data_manager.engine, args.movies, args.users, args.ratings_per_user, create=False)
+        print(f"{'listing':<14}{'rows':>6}{'orm p50 ms':>12}{'rec p50 ms':>12}"
+              f"{'orm KiB':>10}{'rec KiB':>10}")
+        for limit in args.limit:
+            orm, records = orm_listings(data_manager, limit), record_listings(data_manager, limit)
+            for name in orm:
+                if name == "user_movies" and limit != args.limit[0]:
+                    continue  # does not depend on the limit
+                rows = len(records[name]())
+                assert rows == len(orm[name]())
+                orm_ms = measure(orm[name], args.repeat)["p50"]
+                record_ms = measure(records[name], args.repeat)["p50"]
+                print(f"{name:<14}{rows:>6}{orm_ms:>12.3f}{record_ms:>12.3f}"
+                      f"{retained_bytes(orm[name]) / 1024:>10.1f}"
+                      f"{retained_bytes(records[name]) / 1024:>10.1f}")
+        data_manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import os
+import random
+import tempfile
+
+from sqlalchemy import select
+
+from benchmarks.common import seed, measure, movie_name
+from data_models import Movie
+from datamanager.sqlite_data_manager import SQliteDataManager
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FTS5 movie search against LIKE scans.")
+    parser.add_argument("--movies", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_manager = SQliteDataManager(f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                                         profile="bulk", cache_size=0)
+        seed(data_manager.engine, args.movies, users=0, ratings_per_user=0, create=False)
+        rng = random.Random(3)
+
+        def title_words():
+            # Two of the made-up words of a random existing title.
+            return movie_name(rng.randrange(args.movies)).lower().split()[1:3]
+
+        def prefix_query():
+            first, second = title_words()
+            return f"{first} {second[:4]}"
+
+        def typo_query():
+            first, second = title_words()
+            letters = list(second)
+            i = rng.randrange(2, len(letters) - 1)
+            letters[i], letters[i + 1] = letters[i + 1], letters[i]
+            return f"{first} {''.join(letters)}"
+
+        def like_scan():
+            first, second = title_words()
+            with data_manager.SessionFactory() as db:
+                db.scalars(select(Movie).where(Movie.name.like(f"%{first} {second[:4]}%"))
+                           .limit(20)).all()
+
+        results = {
+            "fts_prefix": measure(lambda: data_manager.search_movies(prefix_query(), fuzzy=False),
+                                  args.repeat),
+            "fts_with_typo": measure(lambda: data_manager.search_movies(typo_query()),
+                                     args.repeat),
+            "like_scan": measure(like_scan, args.repeat),
+        }
+        data_manager.engine.dispose()
+
+    print(f"{'query':<20}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, stats in results.items():
+        print(f"{name:<20}{stats['p50']:>10.2f}{stats['p95']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import seed
+from datamanager.sqlite_data_manager import SQliteDataManager
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What a fresh process runs, up to each stage of startup. `app.app` builds the app
+# on first use; `_init_process` is what each process of the job worker runs at boot.
+STAGES = {
+    "interpreter": "pass",
+    "import app": "import app",
+    "app built": "import app; app.app",
+    "first request": "import app; app.app.test_client().get('/movies?limit=20')",
+    "job worker boot": "from datamanager import jobs; jobs._init_process('sqlite:///movie_app.db')",
+}
+
+
+def run_stage(code: str, cwd: str, repeat: int) -> dict:
+    """
+    Wall time (ms) of `python -c code` in cwd, run `repeat` times after a warm-up.
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, JOB_WORKER="external")
+    command = [sys.executable, "-c", code]
+    subprocess.run(command, cwd=cwd, env=env, check=True)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=env, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return {"p50": statistics.median(times), "min": min(times)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Cold start of the app and the job worker, each stage in a fresh process.")
+    parser.add_argument("--movies", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--ratings-per-user", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The processes open movie_app.db in their working directory, as the app does.
+        data_manager = SQliteDataManager(f"sqlite:///{os.path.join(tmp, 'movie_app.db')}")
+        seed(data_manager.engine, args.movies, args.users, args.ratings_per_user, create=False)
+        data_manager.engine.dispose()
+        print(f"{'stage':<18}{'p50 ms':>10}{'min ms':>10}")
+        for name, code in STAGES.items():
+            result = run_stage(code, tmp, args.repeat)
+            print(f"{name:<18}{result['p50']:>10.1f}{result['min']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+from typing import Callable
+
+from sqlalchemy import insert
+
+from data_models import Base, User, Movie, UserMovie
+
+DIRECTORS = ["Michael Mann", "Ridley Scott", "Kathryn Bigelow", "Denis Villeneuve",
+             "Sofia Coppola", "Bong Joon-ho", "Greta Gerwig", "Christopher Nolan"]
+WORDS = ["Dark", "Night", "Return", "City", "Star", "Blue", "Last", "Silent", "Red", "River",
+         "Empire", "Ghost", "Summer", "Iron", "Lost", "Shadow", "Golden", "Wild", "Glass", "Heart"]
+
+
+SYLLABLES = ["ka", "lo", "mi", "ren", "tor", "sha", "vel", "dar", "qui", "bel",
+             "zon", "fa", "gri", "mon", "tes", "lu", "nor", "pi", "sta", "vo"]
+# ~8k made-up words, so that like real titles most words are rare.
+VOCABULARY = [a + b for a in SYLLABLES for b in SYLLABLES] + \
+             [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+
+
+def movie_name(i: int) -> str:
+    """
+    Deterministic, human-looking title for the i-th synthetic movie (unique per i):
+    one common word and two rarer ones.
+    """
+    rng = random.Random(i)
+    words = [rng.choice(WORDS), *(word.title() for word in rng.sample(VOCABULARY, 2))]
+    return f"{' '.join(words)} {i}"
+
+
+def seed(engine, movies: int, users: int, ratings_per_user: int, batch: int = 10_000,
+         seed_value: int = 42, create: bool = True) -> None:
+    """
+    Fill a database with synthetic movies, users and user_movies rows.
+    """
+    rng = random.Random(seed_value)
+    if create:
+        Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for start in range(0, movies, batch):
+            conn.execute(insert(Movie), [
+                {"id": i + 1, "name": movie_name(i), "director": rng.choice(DIRECTORS),
+                 "year": rng.randint(1950, 2024), "poster": f"https://posters.example/{i}.jpg",
+                 "rating": round(rng.uniform(1, 10), 1)}
+                for i in range(start, min(start + batch, movies))])
+        for start in range(0, users, batch):
+            conn.execute(insert(User), [{"id": i + 1, "name": f"user{i}"}
+                                        for i in range(start, min(start + batch, users))])
+        rows = []
+        for user_id in range(1, users + 1):
+            for movie_id in rng.sample(range(1, movies + 1), min(ratings_per_user, movies)):
+                rows.append({"user_id": user_id, "movie_id": movie_id,
+                             "rating": round(rng.uniform(1, 10), 1), "user_rating": 0.0})
+            if len(rows) >= batch:
+                conn.execute(insert(UserMovie), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(UserMovie), rows)
+
+
+def measure(fn: Callable[[], object], repeat: int = 200, warmup: int = 5) -> dict:
+    """
+    Call fn repeatedly and return latency percentiles in milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def summarize(samples_ms: list) -> dict:
+    """
+    p50/p95/p99/mean of a list of millisecond samples.
+    """
+    ordered = sorted(samples_ms)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {"count": len(ordered), "p50": percentile(50), "p95": percentile(95),
+            "p99": percentile(99), "mean": statistics.fmean(ordered)}
@@ -0,0 +1,77 @@
+import argparse
+import json
+import sys
+
+METRICS = ("p50", "p95", "p99")
+
+
+def _series(results: dict):
+    """
+    Yield (scale, section, name, stats) for every measurement in a suite result.
+    """
+    for scale, result in results["scales"].items():
+        for name, stats in result.get("micro", {}).items():
+            if "p50" in stats:
+                yield scale, "micro", name, stats
+        load = result.get("load")
+        if load:
+            for name, stats in load["routes"].items():
+                yield scale, "load", name, stats
+            yield scale, "load", "overall", load["overall"]
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.2, min_delta_ms: float = 0.1):
+    """
+    Rows of (scale, section, name, metric, before, after, ratio, regressed). A metric
+    regressed when it got slower by more than `threshold` (relative) and more than
+    min_delta_ms (absolute, to ignore noise on sub-millisecond calls), or when
+    throughput dropped by more than `threshold`.
+    """
+    before = {(scale, section, name): stats for scale, section, name, stats in _series(baseline)}
+    rows = []
+    for scale, section, name, stats in _series(current):
+        old = before.get((scale, section, name))
+        if old is None:
+            continue
+        for metric in METRICS:
+            ratio = stats[metric] / old[metric] if old[metric] else 1.0
+            regressed = ratio > 1 + threshold and stats[metric] - old[metric] > min_delta_ms
+            rows.append((scale, section, name, metric, old[metric], stats[metric], ratio, regressed))
+        if old.get("throughput") and "throughput" in stats:
+            ratio = stats["throughput"] / old["throughput"]
+            rows.append((scale, section, name, "throughput", old["throughput"],
+                         stats["throughput"], ratio, ratio < 1 - threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare two benchmarks.suite results; exits 1 on regressions.")
+    parser.add_argument("baseline", help="JSON from the earlier commit")
+    parser.add_argument("current", help="JSON from the commit under test")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown that counts as a regression (default 0.2)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1,
+                        help="ignore latency changes smaller than this")
+    parser.add_argument("--all", action="store_true", help="print every row, not just regressions")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.threshold, args.min_delta_ms)
+    regressions = [row for row in rows if row[-1]]
+    print(f"{'scale':<6}{'section':<8}{'benchmark':<34}{'metric':<12}{'before':>10}{'after':>10}"
+          f"{'change':>9}")
+    for scale, section, name, metric, old, new, ratio, regressed in rows:
+        if args.all or regressed:
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{scale:<6}{section:<8}{name:<34}{metric:<12}{old:>10.3f}{new:>10.3f}"
+                  f"{(ratio - 1) * 100:>+8.0f}%{flag}")
+    print(f"{len(regressions)} regression(s) in {len(rows)} comparisons")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,23 @@
+import argparse
+import logging
+
+from werkzeug.serving import make_server
+
+
+def main(argv=None):
+    """
+    Serve app.py with a threaded WSGI server, for the load test (run it in the
+    directory holding movie_app.db).
+    """
+    parser = argparse.ArgumentParser(description="Serve the app for load tests.")
+    parser.add_argument("--port", type=int, required=True)
+    args = parser.parse_args(argv)
+
+    # One access log line per request would cost more than some of the requests.
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    import app
+    make_server("127.0.0.1", args.port, app.app, threaded=True).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
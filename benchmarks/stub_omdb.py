@@ -0,0 +1,53 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubOMDb(ThreadingHTTPServer):
+    """
+    Local stand-in for the OMDb API for load tests: every title exists, and each
+    answer takes `latency` seconds, like a real round trip would.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.02, port: int = 0):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.latency = latency
+        self.request_count = 0
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/?apikey=stub"
+
+    def start(self) -> "StubOMDb":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.request_count += 1
+        title = parse_qs(urlparse(self.path).query).get("t", [""])[0]
+        time.sleep(self.server.latency)
+        payload = json.dumps({
+            "Response": "True", "Title": title, "Director": "Stub Director", "Year": "2001",
+            "Poster": "N/A", "imdbRating": str(5 + len(title) % 5),
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
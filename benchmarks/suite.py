@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, asdict
+
+import requests
+
+from benchmarks.common import seed, measure, summarize, movie_name, DIRECTORS
+from benchmarks.stub_omdb import StubOMDb
+from data_models import User
+from datamanager.data_manager_interface import DataManagerInterface
+from datamanager.sqlite_data_manager import SQliteDataManager
+from movie_api import OMDBClient, OMDBCache
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass(frozen=True)
+class Scale:
+    movies: int
+    users: int
+    ratings_per_user: int
+
+    @property
+    def ratings(self) -> int:
+        return self.users * self.ratings_per_user
+
+
+SCALES = {
+    "1k": Scale(movies=1_000, users=100, ratings_per_user=10),
+    "100k": Scale(movies=100_000, users=5_000, ratings_per_user=20),
+    "1m": Scale(movies=1_000_000, users=50_000, ratings_per_user=20),
+}
+# Methods that load whole tables are only measured up to this many rows.
+FULL_SCAN_LIMIT = 100_000
+
+
+def _with_throughput(stats: dict) -> dict:
+    stats["throughput"] = 1000 / stats["mean"] if stats["mean"] else 0.0
+    return stats
+
+
+def micro_benchmarks(data_manager: DataManagerInterface, scale: Scale, stub: StubOMDb,
+                     repeat: int) -> dict:
+    """
+    Latency of every public data manager method, on data seeded at `scale`. For
+    SQliteDataManager the query cache is off (cache_size=0), so reads measure the
+    database path. Methods a backend does not have are skipped.
+    """
+    rng = random.Random(11)
+
+    def movie_id():
+        return rng.randint(1, scale.movies)
+
+    def user_id():
+        return rng.randint(1, scale.users)
+
+    def title_words():
+        return movie_name(rng.randrange(scale.movies)).split()
+
+    second_pages = []
+    for sort in ("name", "-year", "-rating"):
+        second_pages.append((sort, data_manager.list_movies(sort=sort).next_cursor))
+    pending = [data_manager.add_pending_movie(f"Benchmark pending {i}").id
+               for i in range(repeat + 10)]
+    client = OMDBClient(cache=OMDBCache(path=None), base_url=stub.base_url)
+    imported = iter(range(10 ** 9))
+
+    cases = {
+        "users": lambda: data_manager.users,
+        "movies": lambda: data_manager.movies,
+        "get_user": lambda: data_manager.get_user(user_id()),
+        "list_users": lambda: data_manager.list_users(),
+        "list_movies": lambda: data_manager.list_movies(sort=rng.choice(["name", "-year"])),
+        "list_movies_next_page": lambda: data_manager.list_movies(
+            sort=(page := rng.choice(second_pages))[0], after=page[1]),
+        "list_movies_filtered": lambda: data_manager.list_movies(
+            director=rng.choice(DIRECTORS), year_min=rng.randint(1950, 2020)),
+        "get_movie": lambda: data_manager.get_movie(movie_id()),
+        "search_movies": lambda: data_manager.search_movies(" ".join(title_words()[1:3])),
+        "find_movie": lambda: data_manager.find_movie(movie_name(rng.randrange(scale.movies))),
+        "get_user_movies": lambda: data_manager.get_user_movies(user_id()),
+        "get_movie_stats": lambda: data_manager.get_movie_stats(movie_id()),
+        "get_user_stats": lambda: data_manager.get_user_stats(user_id()),
+        "recommend_movies": lambda: data_manager.recommend_movies(user_id()),
+        "set_user_movies": lambda: data_manager.set_user_movies(user_id(), movie_id(), 7.0,
+                                                                rng.randint(1, 10)),
+        "set_user_movies_many": lambda: data_manager.set_user_movies_many(
+            [(user_id(), movie_id(), 7.0, rng.randint(1, 10)) for _ in range(100)]),
+        "add_user": lambda: data_manager.add_user(User(name=f"Benchmark user {rng.random()}")),
+        "add_pending_movie": lambda: data_manager.add_pending_movie(f"Pending {rng.random()}"),
+        "update_movie": lambda: data_manager.update_movie(movie_id(), {"rating": 7.5}),
+        "delete_movie": lambda: data_manager.delete_movie(pending.pop()),
+        "bulk_import_movies_10": lambda: data_manager.bulk_import_movies(
+            [f"Imported {next(imported)}" for _ in range(10)], client=client),
+    }
+    results = {}
+    if not hasattr(data_manager, "bulk_import_movies"):
+        del cases["bulk_import_movies_10"]
+    for name, fn in cases.items():
+        if name in ("users", "movies") and max(scale.movies, scale.users) > FULL_SCAN_LIMIT:
+            results[name] = {"skipped": f"loads more than {FULL_SCAN_LIMIT} rows"}
+            continue
+        results[name] = _with_throughput(measure(fn, repeat, warmup=min(5, repeat)))
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def load_test(directory: str, scale: Scale, stub: StubOMDb, concurrency: int,
+              duration: float) -> dict:
+    """
+    Drive the Flask routes from `concurrency` client threads for `duration` seconds,
+    against app.py served by a threaded WSGI server in a separate process.
+    """
+    port = _free_port()
+    env = dict(os.environ, OMDB_API_KEY="stub", OMDB_BASE_URL=stub.base_url,
+               OMDB_CACHE_PATH="", POSTER_CACHE_DIR=os.path.join(directory, "posters"),
+               PYTHONPATH=REPO_ROOT)
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.serve_app", "--port", str(port)],
+                              cwd=directory, env=env)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 300
+        while True:
+            try:
+                if requests.get(f"{base}/metrics", timeout=1).ok:
+                    break
+            except requests.ConnectionError:
+                pass
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("the app did not start")
+            time.sleep(0.2)
+
+        # (name, weight, request factory) - mostly reads, like real traffic.
+        routes = [
+            ("GET /movies", 30, lambda rng: ("GET", f"/movies?sort={rng.choice(['name', '-year', '-rating'])}"
+                                                    f"&year_min={rng.randint(1950, 2024)}", None)),
+            ("GET /movies/search", 20, lambda rng: (
+                "GET", f"/movies/search?q={'+'.join(movie_name(rng.randrange(scale.movies)).split()[1:3])}",
+                None)),
+            ("GET /users/<id>", 20, lambda rng: ("GET", f"/users/{rng.randint(1, scale.users)}", None)),
+            ("GET /users/<id>/recommendations", 10, lambda rng: (
+                "GET", f"/users/{rng.randint(1, scale.users)}/recommendations", None)),
+            ("POST /users/<id>", 15, lambda rng: (
+                "POST", f"/users/{rng.randint(1, scale.users)}",
+                {"movie_title": movie_name(rng.randrange(scale.movies))})),
+            ("POST /movies/new", 5, lambda rng: (
+                "POST", "/movies/new", {"name": f"Load test movie {rng.random()}"})),
+        ]
+        names = [name for name, _, _ in routes]
+        weights = [weight for _, weight, _ in routes]
+        factories = {name: factory for name, _, factory in routes}
+        samples = {name: [] for name in names}
+        errors = {name: 0 for name in names}
+        lock = threading.Lock()
+        stop = time.monotonic() + duration
+
+        def worker(worker_id):
+            rng = random.Random(worker_id)
+            session = requests.Session()
+            local = []
+            while time.monotonic() < stop:
+                name = rng.choices(names, weights)[0]
+                method, path, data = factories[name](rng)
+                started = time.perf_counter()
+                try:
+                    ok = session.request(method, base + path, data=data, timeout=30).status_code < 500
+                except requests.RequestException:
+                    ok = False
+                local.append((name, (time.perf_counter() - started) * 1000, ok))
+            with lock:
+                for name, elapsed, ok in local:
+                    samples[name].append(elapsed)
+                    errors[name] += not ok
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    results = {"concurrency": concurrency, "duration": elapsed, "routes": {}}
+    for name in names:
+        if samples[name]:
+            stats = summarize(samples[name])
+            stats["throughput"] = len(samples[name]) / elapsed
+            stats["errors"] = errors[name]
+            results["routes"][name] = stats
+    everything = [sample for route in samples.values() for sample in route]
+    results["overall"] = summarize(everything)
+    results["overall"]["throughput"] = len(everything) / elapsed
+    results["overall"]["errors"] = sum(errors.values())
+    return results
+
+
+def run_scale(name: str, scale: Scale, args, stub: StubOMDb) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        data_manager = SQliteDataManager(f"sqlite:///{os.path.join(tmp, 'movie_app.db')}",
+                                         cache_size=0)
+        seed(data_manager.engine, scale.movies, scale.users, scale.ratings_per_user, create=False)
+        result = {"scale": asdict(scale), "seed_seconds": time.perf_counter() - started}
+        print(f"[{name}] seeded in {result['seed_seconds']:.1f}s", file=sys.stderr)
+        if not args.skip_micro:
+            result["micro"] = micro_benchmarks(data_manager, scale, stub, args.repeat)
+            print(f"[{name}] micro benchmarks done", file=sys.stderr)
+        data_manager.engine.dispose()
+        if not args.skip_load:
+            result["load"] = load_test(tmp, scale, stub, args.concurrency, args.duration)
+            print(f"[{name}] load test done", file=sys.stderr)
+    return result
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark the data manager and load-test the app at several scales. "
+                    "Writes JSON for benchmarks.compare.")
+    parser.add_argument("--scale", action="append", choices=sorted(SCALES),
+                        help="database scale (repeatable, default 1k)")
+    parser.add_argument("--repeat", type=int, default=100, help="calls per micro benchmark")
+    parser.add_argument("--concurrency", type=int, default=8, help="load test client threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="load test seconds")
+    parser.add_argument("--omdb-latency", type=float, default=0.02,
+                        help="seconds the stub OMDb takes per answer")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--out", help="write the JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    stub = StubOMDb(latency=args.omdb_latency).start()
+    try:
+        results = {
+            "meta": {"commit": _commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                     "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                     "machine": platform.machine(), "cpus": os.cpu_count()},
+            "scales": {name: run_scale(name, SCALES[name], args, stub)
+                       for name in args.scale or ["1k"]},
+        }
+    finally:
+        stub.stop()
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
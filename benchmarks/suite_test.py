@@ -0,0 +1,39 @@
+import pytest
+
+from benchmarks.bench_backends import load_memory
+from benchmarks.common import seed
+from benchmarks.compare import compare
+from benchmarks.stub_omdb import StubOMDb
+from benchmarks.suite import Scale, micro_benchmarks
+from datamanager.sqlite_data_manager import SQliteDataManager
+
+
+@pytest.fixture
+def stub():
+    stub = StubOMDb(latency=0).start()
+    yield stub
+    stub.stop()
+
+
+def test_micro_benchmarks_smoke(stub, tmp_path):
+    """Test that every micro benchmark runs on a tiny database, on each backend."""
+    scale = Scale(movies=50, users=5, ratings_per_user=3)
+    data_manager = SQliteDataManager(f"sqlite:///{tmp_path / 'bench.db'}", cache_size=0)
+    seed(data_manager.engine, scale.movies, scale.users, scale.ratings_per_user, create=False)
+    for backend in (data_manager, load_memory(data_manager)):
+        results = micro_benchmarks(backend, scale, stub, repeat=3)
+        assert all(stats["count"] == 3 and stats["throughput"] > 0 for stats in results.values())
+
+
+def _result(p50, throughput):
+    stats = {"p50": p50, "p95": p50, "p99": p50, "mean": p50, "throughput": throughput}
+    return {"scales": {"1k": {"micro": {"get_movie": stats, "skipped": {"skipped": "why"}}}}}
+
+
+def test_compare_flags_regressions():
+    """Test the relative threshold, the noise floor and throughput drops."""
+    rows = compare(_result(1.0, 100), _result(1.5, 100))
+    assert {row[3] for row in rows if row[-1]} == {"p50", "p95", "p99"}
+    assert not any(row[-1] for row in compare(_result(0.01, 100), _result(0.05, 100)))
+    assert [row[3] for row in compare(_result(1.0, 100), _result(1.0, 50)) if row[-1]] == \
+        ["throughput"]
@@ -1,16 +1,7 @@
-from email.policy import default
+from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, Index
+from sqlalchemy.orm import relationship, declarative_base, validates
 
-from flask_sqlalchemy.session import Session
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, Table
-from sqlalchemy.orm import relationship, sessionmaker, declarative_base
-
-# Define the database connection string.  Use an in-memory database for testing.
-TEST_DB_URL = "sqlite:///:memory:"  # This could also be in a config.py
-
-engine = create_engine(TEST_DB_URL)
-
-Session = sessionmaker(bind=engine)
-session = Session()
+from movie_api import normalize_title
 
 
 # Base for declarative models
@@ -25,18 +16,21 @@ class UserMovie(Base):
     rating = Column(Float)
     user_rating = Column('user_rating', Float, default=0.0 )# Add the rating column here
 
+    __table_args__ = (
+        # One row per user and movie; also serves lookups by user_id alone.
+        Index("ix_user_movies_user_id_movie_id", "user_id", "movie_id", unique=True),
+        Index("ix_user_movies_movie_id", "movie_id"),
+    )
+
     def __repr__(self):
-        result = ""
-        for user in session.query(User).all():
-            result += (f"<UserMovie(user_id={self.user_id}, movie_id={self.movie_id}, "
-                       f"rating={self.rating})>\n")
-        return result
+        return (f"<UserMovie(user_id={self.user_id}, movie_id={self.movie_id}, "
+                f"rating={self.rating})>")
 
 # Define the User model
 class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True)
-    name = Column(String)
+    name = Column(String, index=True)
     movies = relationship("Movie", secondary="user_movies",
                           back_populates="users")
 
@@ -44,23 +38,127 @@ class User(Base):
         return f"<User(name='{self.name}', id={self.id if self.id else 'None'})>"
 
 
+def _name_key(context):
+    name = context.get_current_parameters().get("name")
+    return normalize_title(name) if name is not None else None
+
+
 # Define the Movie model
 class Movie(Base):
     __tablename__ = 'movies'
     id = Column(Integer, primary_key=True)
-    name = Column(String)
+    name = Column(String, index=True)
     director = Column(String)
-    year = Column(Integer)
+    year = Column(Integer, index=True)
     poster = Column(String)
-    rating = Column(Float)
+    rating = Column(Float, index=True)
+    # normalize_title(name), so titles differing in case (any script) or spacing are
+    # found as the same (bulk_import._existing_names). Set on every insert and by the
+    # ORM on renames.
+    name_key = Column(String, index=True, default=_name_key)
     users = relationship("User", secondary="user_movies",
                          back_populates="movies")
+    # Loaded with the movie (one row by primary key), so listings never scan user_movies.
+    stats = relationship("MovieStats", uselist=False, lazy="joined", viewonly=True)
+
+    @validates("name")
+    def _set_name_key(self, key, name):
+        self.name_key = normalize_title(name) if name is not None else None
+        return name
 
     def __repr__(self):
         return f"<Movie(name='{self.name}', id={self.id if self.id else 'None'})>"
 
 
+# Aggregates over user_movies, maintained by triggers in the same transaction as
+# every write to it (see datamanager.stats). user_rating 0 or NULL means "not rated".
+class MovieStats(Base):
+    __tablename__ = 'movie_stats'
+    movie_id = Column(Integer, ForeignKey('movies.id', ondelete="CASCADE"), primary_key=True)
+    user_count = Column(Integer, nullable=False, default=0)
+    rating_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Float, nullable=False, default=0.0)
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+
+class UserStats(Base):
+    __tablename__ = 'user_stats'
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True)
+    movie_count = Column(Integer, nullable=False, default=0)
+    rating_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Float, nullable=False, default=0.0)
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+
+class UserDirectorCount(Base):
+    __tablename__ = 'user_director_counts'
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True)
+    director = Column(String, primary_key=True)
+    movie_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # A user's top director is the first row of this index.
+        Index("ix_user_director_counts_user_id_movie_count", "user_id", "movie_count"),
+    )
+
+
+# Movies being deleted by SQliteDataManager.delete_movies(), which takes them out of
+# the aggregates in bulk (see datamanager.stats.remove_movies). Empty outside its transaction.
+class MovieDeletion(Base):
+    __tablename__ = 'movie_deletions'
+    movie_id = Column(Integer, primary_key=True)
+
+
+# The cache tags of every write, in commit order, written by each data manager that
+# writes (app workers, job workers) and read by the others to drop what they cached
+# (see SQliteDataManager.sync_changes). Rows older than a day are pruned.
+class Change(Base):
+    __tablename__ = 'changes'
+    seq = Column(Integer, primary_key=True)
+    # The data manager that wrote: it has dropped its own cached reads already.
+    origin = Column(String, nullable=False)
+    tags = Column(String, nullable=False)  # JSON list
+    created_at = Column(Float, nullable=False)
+
+    # Never reuse a seq, even once pruning emptied the table.
+    __table_args__ = {"sqlite_autoincrement": True}
+
+
+# Work queued for a job worker (see datamanager.jobs). payload, result and changed
+# are JSON; times are Unix timestamps.
+class Job(Base):
+    __tablename__ = 'jobs'
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(String, nullable=False, default="{}")
+    status = Column(String, nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    # Enqueueing the same key again returns the existing job instead of adding one.
+    idempotency_key = Column(String, unique=True)
+    run_at = Column(Float, nullable=False)
+    locked_until = Column(Float)
+    result = Column(String)
+    error = Column(String)
+    # Cache tags the job's writes touched (JSON list). Other processes learn of them
+    # from the changes table.
+    changed = Column(String)
+    created_at = Column(Float, nullable=False)
+    finished_at = Column(Float)
+
+    __table_args__ = (
+        # The next due jobs are the first rows of this index.
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+
 if __name__ == "__main__":
     # This block is for creating the tables if you want to do it directly.
-    Base.metadata.create_all(engine)
+    Base.metadata.create_all(create_engine("sqlite:///movie_app.db"))
     print("Tables created!")
\ No newline at end of file
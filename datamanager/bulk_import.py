@@ -0,0 +1,324 @@
+import argparse
+import contextvars
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+
+from sqlalchemy import select, insert, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from data_models import Movie, User, UserMovie
+from datamanager.records import movie_fields
+from movie_api import OMDBClient, RateLimiter, normalize_title
+
+
+DEFAULT_WORKERS = 8
+DEFAULT_RATE_LIMIT = 10.0  # OMDb requests per second
+DEFAULT_BATCH_SIZE = 200
+# Most titles and ids add_user_movies() takes in one call.
+MAX_LIST_ADD = 1000
+
+
+@dataclass
+class ImportReport:
+    """
+    Outcome of a bulk import.
+    """
+    imported: int = 0
+    skipped: int = 0
+    failed: List[Tuple[str, str]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def processed(self) -> int:
+        return self.imported + self.skipped + len(self.failed)
+
+    @property
+    def throughput(self) -> float:
+        """
+        Titles processed per second.
+        """
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f"imported={self.imported} skipped={self.skipped} failed={len(self.failed)} "
+                f"elapsed={self.elapsed:.2f}s throughput={self.throughput:.1f} titles/s")
+
+
+@dataclass
+class UserMoviesDiff:
+    """
+    What add_user_movies() changed on a user's list: the movies added (id, name,
+    year, rating), the ids of those that were on it already, the ids of movies it
+    stored from OMDb first, and the titles or ids it could not resolve.
+    """
+    added: List[dict] = field(default_factory=list)
+    existing: List[int] = field(default_factory=list)
+    created: List[int] = field(default_factory=list)
+    not_found: List[str | int] = field(default_factory=list)
+    failed: List[Tuple[str, str]] = field(default_factory=list)
+
+
+def read_titles(stream) -> Iterator[str]:
+    """
+    Yield titles from a text stream, one per line. Blank lines and # comments are skipped.
+    """
+    for line in stream:
+        title = line.strip()
+        if title and not title.startswith("#"):
+            yield title
+
+
+def _chunks(iterable: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _existing_names(db, names: Iterable[str]) -> set:
+    """
+    Normalized names of the given titles that already have a Movie row (one IN query
+    on the stored name_key).
+    """
+    keys = {normalize_title(name) for name in names}
+    if not keys:
+        return set()
+    return set(db.scalars(select(Movie.name_key).where(Movie.name_key.in_(keys))))
+
+
+def bulk_import_movies(data_manager, titles: Iterable[str], workers: int = DEFAULT_WORKERS,
+                       rate_limit: float = DEFAULT_RATE_LIMIT,
+                       batch_size: int = DEFAULT_BATCH_SIZE, client=None) -> ImportReport:
+    """
+    Import movies for a stream of titles.
+
+    Titles are consumed lazily in chunks of batch_size. Each chunk is deduped
+    against the titles already seen and the existing Movie rows, the rest is
+    fetched from OMDb on a bounded thread pool (rate limited), and fetched
+    movies are inserted in batched transactions while later fetches are still
+    in flight.
+    """
+    if client is None:
+        client = OMDBClient(rate_limiter=RateLimiter(rate_limit, burst=workers))
+    report = ImportReport()
+    started = time.perf_counter()
+    seen = set()
+    buffer = []
+    in_flight = {}
+    max_in_flight = max(workers * 4, batch_size)
+
+    def fetch(title):
+        return client.get_movie(title)
+
+    def collect(done):
+        for future in done:
+            title = in_flight.pop(future)
+            try:
+                movie = future.result()
+            except Exception as e:
+                report.failed.append((title, str(e) or type(e).__name__))
+                continue
+            if movie is None:
+                report.failed.append((title, "Movie not found"))
+            else:
+                buffer.append(movie_fields(movie))
+
+    def flush():
+        if not buffer:
+            return
+        with data_manager.get_db() as db:
+            existing = _existing_names(db, [movie["name"] for movie in buffer])
+            rows = []
+            for movie in buffer:
+                key = normalize_title(movie["name"])
+                # OMDb may resolve different inputs to the same canonical title.
+                if key in existing:
+                    report.skipped += 1
+                    continue
+                existing.add(key)
+                rows.append(movie)
+            if rows:
+                db.execute(insert(Movie), rows)
+        if rows:
+            data_manager.notify_written(["movies"], movies=rows)
+        report.imported += len(rows)
+        buffer.clear()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for chunk in _chunks(titles, batch_size):
+            fresh = []
+            for title in chunk:
+                key = normalize_title(title)
+                if key in seen:
+                    report.skipped += 1
+                    continue
+                seen.add(key)
+                fresh.append(title)
+            with data_manager.SessionFactory() as db:
+                existing = _existing_names(db, fresh)
+            for title in fresh:
+                if normalize_title(title) in existing:
+                    report.skipped += 1
+                else:
+                    in_flight[pool.submit(fetch, title)] = title
+            while len(in_flight) > max_in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                collect(done)
+                if len(buffer) >= batch_size:
+                    flush()
+        while in_flight:
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            collect(done)
+            if len(buffer) >= batch_size:
+                flush()
+        flush()
+
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def _fetch_all(client, titles: List[str], workers: int, diff: UserMoviesDiff) -> List[dict]:
+    """
+    The OMDb details of titles, fetched concurrently; misses and errors go to diff.
+    Each fetch runs in a copy of the caller's context, so the request's metrics
+    (instrumentation.current) count its upstream time.
+    """
+    if not titles:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(titles))) as pool:
+        futures = [(title, pool.submit(contextvars.copy_context().run, client.get_movie, title))
+                   for title in titles]
+    fetched = []
+    for title, future in futures:
+        try:
+            movie = future.result()
+        except Exception as e:
+            diff.failed.append((title, str(e) or type(e).__name__))
+            continue
+        if movie is None:
+            diff.not_found.append(title)
+        else:
+            fetched.append((title, movie_fields(movie)))
+    return fetched
+
+
+def add_user_movies(data_manager, user_id: int, titles: Iterable[str] = (),
+                    movie_ids: Iterable[int] = (), fetch: bool = True,
+                    workers: int = DEFAULT_WORKERS, client=None) -> UserMoviesDiff:
+    """
+    Add many movies, by title or id, to a user's list in one go.
+
+    Titles and ids are resolved with one IN query (titles by exact name, as
+    find_movie() tries first). With fetch, titles that are not stored yet are
+    looked up on OMDb concurrently; OMDb's canonical name is checked again so a
+    title typed differently does not store a second copy. The new movies and all
+    list entries are then written in one transaction. Movies on the list already
+    keep their ratings. Raises ValueError if the user does not exist, or for more
+    than MAX_LIST_ADD titles and ids.
+    """
+    unique = {}
+    for title in titles:
+        if title.strip():
+            unique.setdefault(normalize_title(title), title.strip())
+    titles = list(unique.values())
+    movie_ids = list(dict.fromkeys(movie_ids))
+    if len(titles) + len(movie_ids) > MAX_LIST_ADD:
+        raise ValueError(f"At most {MAX_LIST_ADD} titles and ids at once")
+    diff = UserMoviesDiff()
+    with data_manager.engine_for_reads().connect() as conn:
+        if conn.scalar(select(User.id).where(User.id == user_id)) is None:
+            raise ValueError("User not found")
+        rows = conn.execute(select(Movie.id, Movie.name, Movie.year, Movie.rating).where(
+            or_(Movie.id.in_(movie_ids), Movie.name.in_(titles)))).mappings().all()
+    by_id = {row["id"]: dict(row) for row in rows}
+    by_name = {row["name"]: dict(row) for row in rows}
+    movies = {}  # id -> row, in the order asked for
+    for movie_id in movie_ids:
+        if movie_id in by_id:
+            movies[movie_id] = by_id[movie_id]
+        else:
+            diff.not_found.append(movie_id)
+    missing = []
+    for title in titles:
+        if title in by_name:
+            movies[by_name[title]["id"]] = by_name[title]
+        elif fetch:
+            missing.append(title)
+        else:
+            diff.not_found.append(title)
+    if client is None and missing:
+        client = OMDBClient()
+    fetched = _fetch_all(client, missing, workers, diff)
+
+    new = {}  # name -> OMDb details of the movies stored here
+    with data_manager.engine.begin() as conn:
+        if fetched:
+            names = {movie["name"] for _, movie in fetched}
+            stored = {row.name: dict(row._mapping) for row in conn.execute(
+                select(Movie.id, Movie.name, Movie.year, Movie.rating)
+                .where(Movie.name.in_(names)))}
+            for _, movie in fetched:
+                if movie["name"] not in stored:
+                    new.setdefault(movie["name"], movie)
+            if new:
+                inserted = conn.execute(
+                    insert(Movie).returning(Movie.id, Movie.name, Movie.year, Movie.rating,
+                                            sort_by_parameter_order=True),
+                    list(new.values()))
+                for row in inserted:
+                    stored[row.name] = dict(row._mapping)
+                    diff.created.append(row.id)
+            for _, movie in fetched:
+                row = stored[movie["name"]]
+                movies.setdefault(row["id"], row)
+        if movies:
+            statement = sqlite_insert(UserMovie).on_conflict_do_nothing(
+                index_elements=[UserMovie.user_id, UserMovie.movie_id])
+            added = set(conn.scalars(statement.returning(UserMovie.movie_id), [
+                {"user_id": user_id, "movie_id": movie_id, "rating": row["rating"],
+                 "user_rating": 0.0} for movie_id, row in movies.items()]))
+            for movie_id, row in movies.items():
+                if movie_id in added:
+                    diff.added.append(row)
+                else:
+                    diff.existing.append(movie_id)
+
+    if diff.created or diff.added:
+        # The movies' aggregate stats (see datamanager.stats) changed with the list.
+        data_manager.notify_written(["movies", f"user_movies:{user_id}"], movies=new.values(),
+                                    ratings=[(user_id, row["id"], 0.0) for row in diff.added])
+    return diff
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import movies from OMDb by title.")
+    parser.add_argument("file", nargs="?", default="-",
+                        help="file with one title per line, '-' for stdin (default)")
+    parser.add_argument("--db", default="sqlite:///movie_app.db", help="database URL")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_LIMIT,
+                        help="maximum OMDb requests per second")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    from datamanager.sqlite_data_manager import SQliteDataManager
+    data_manager = SQliteDataManager(args.db)
+    stream = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+    try:
+        report = data_manager.bulk_import_movies(read_titles(stream), workers=args.workers,
+                                                 rate_limit=args.rate,
+                                                 batch_size=args.batch_size)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    for title, reason in report.failed:
+        print(f"failed: {title}: {reason}", file=sys.stderr)
+    print(report)
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import io
+import threading
+
+import pytest
+
+import instrumentation
+from datamanager.sqlite_data_manager import SQliteDataManager
+from datamanager.bulk_import import read_titles
+from data_models import Movie, User
+from movie_api import OMDBUnavailableError, RateLimiter
+
+TEST_DB_URL = "sqlite:///:memory:"
+
+
+class FakeClient:
+    """
+    Stands in for OMDBClient: knows every title except those starting with "Unknown".
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get_movie(self, title):
+        with self.lock:
+            self.calls.append(title)
+        if title.startswith("Unknown"):
+            return None
+        if title == "Broken":
+            raise OMDBUnavailableError("OMDb circuit is open")
+        name = "The Matrix" if title.lower() == "matrix" else title
+        return {"name": name, "director": "Director", "year": 2000, "poster": "p.jpg",
+                "rating": 7.0}
+
+
+@pytest.fixture(scope="function")
+def data_manager():
+    return SQliteDataManager(TEST_DB_URL)
+
+
+def test_bulk_import(data_manager: SQliteDataManager):
+    """Test importing a stream of titles in several batches."""
+    titles = (f"Movie {i}" for i in range(25))
+    client = FakeClient()
+    report = data_manager.bulk_import_movies(titles, workers=4, batch_size=10, client=client)
+    assert report.imported == 25
+    assert report.failed == []
+    assert report.throughput > 0
+    with data_manager.SessionFactory() as session:
+        assert session.query(Movie).count() == 25
+
+
+def test_bulk_import_dedupes(data_manager: SQliteDataManager):
+    """Test that duplicate and already stored titles are neither fetched nor inserted."""
+    with data_manager.SessionFactory() as session:
+        session.add(Movie(name="The Matrix"))
+        session.commit()
+    client = FakeClient()
+    report = data_manager.bulk_import_movies(
+        ["the matrix", "Inception", "inception ", "Matrix", "Heat"], batch_size=2, client=client)
+    assert report.imported == 2
+    assert report.skipped == 3
+    assert sorted(client.calls) == ["Heat", "Inception", "Matrix"]
+    with data_manager.SessionFactory() as session:
+        assert session.query(Movie).count() == 3
+
+
+def test_bulk_import_dedupes_beyond_ascii(data_manager: SQliteDataManager):
+    """Test that stored titles match regardless of non-ASCII case and inner spacing."""
+    with data_manager.SessionFactory() as session:
+        session.add_all([Movie(name="Amélie"), Movie(name="The  Matrix")])
+        session.commit()
+    client = FakeClient()
+    report = data_manager.bulk_import_movies(["AMÉLIE", "the matrix"], client=client)
+    assert (report.imported, report.skipped) == (0, 2)
+    assert client.calls == []
+
+
+def test_bulk_import_reports_failures(data_manager: SQliteDataManager):
+    """Test that missing titles and upstream errors are reported, not raised."""
+    client = FakeClient()
+    report = data_manager.bulk_import_movies(["Unknown 1", "Broken", "Heat"], client=client)
+    assert report.imported == 1
+    assert dict(report.failed) == {"Unknown 1": "Movie not found",
+                                   "Broken": "OMDb circuit is open"}
+
+
+def test_add_user_movies(data_manager: SQliteDataManager):
+    """Test adding stored and new movies to a list in one call, and the diff it returns."""
+    with data_manager.SessionFactory() as session:
+        session.add_all([User(id=1, name="Ann"), Movie(id=1, name="The Matrix", rating=8.7),
+                         Movie(id=2, name="Heat", rating=8.3)])
+        session.commit()
+    data_manager.set_user_movies(1, 2, 9.0)
+    client = FakeClient()
+    diff = data_manager.add_user_movies(
+        1, ["Heat", "The Matrix", "Matrix", "Alien", " alien", "Unknown 1", "Broken"],
+        movie_ids=[1, 99], client=client)
+    assert sorted(client.calls) == ["Alien", "Broken", "Matrix", "Unknown 1"]
+    assert [row["name"] for row in diff.added] == ["The Matrix", "Alien"]
+    assert diff.existing == [2]
+    assert len(diff.created) == 1
+    assert diff.not_found == [99, "Unknown 1"]
+    assert diff.failed == [("Broken", "OMDb circuit is open")]
+    # One copy of The Matrix, and Heat's own rating kept.
+    assert [(movie.name, movie.rating) for movie in data_manager.get_user_movies(1)] == \
+        [("Heat", 9.0), ("The Matrix", 8.7), ("Alien", 7.0)]
+    assert data_manager.get_movie_stats(1)["user_count"] == 1
+
+    diff = data_manager.add_user_movies(1, ["Inception"], fetch=False)
+    assert diff.not_found == ["Inception"] and diff.added == []
+    with pytest.raises(ValueError):
+        data_manager.add_user_movies(2, ["Heat"])
+
+
+def test_add_user_movies_counts_upstream_time(data_manager: SQliteDataManager):
+    """Test that lookups on the fetch threads count towards the request's upstream time."""
+    class TimedClient(FakeClient):
+        get_movie = instrumentation.timed_upstream(FakeClient.get_movie)
+
+    data_manager.add_user(User(name="Ann"))
+    metrics = instrumentation.RequestMetrics()
+    token = instrumentation.current.set(metrics)
+    try:
+        data_manager.add_user_movies(1, ["Alien", "Heat", "Unknown 1"], client=TimedClient())
+    finally:
+        instrumentation.current.reset(token)
+    assert metrics.upstream_calls == 3
+    assert metrics.upstream_time > 0
+
+
+def test_read_titles():
+    """Test parsing a title file."""
+    stream = io.StringIO("The Matrix\n\n# comment\n  Heat  \n")
+    assert list(read_titles(stream)) == ["The Matrix", "Heat"]
+
+
+def test_rate_limiter():
+    """Test that the token bucket spaces out calls beyond the burst."""
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    limiter = RateLimiter(rate=2, burst=2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(4):
+        limiter.acquire()
+    assert now[0] == pytest.approx(1.0)
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable
+
+# Sentinel returned by ResultCache.get when a key is not cached.
+MISS = object()
+# Tag standing for all data: invalidating it drops every entry and changes every version.
+ALL = "*"
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache whose entries are tagged with the data they were built from,
+    e.g. {"movies"} or {"user:3", "user_movies:3"}. invalidate(tags) drops exactly the
+    entries depending on those tags. Bounded by entry count and, optionally, total size.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_size: int | None = None, clock=time.time):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[Any, frozenset, int]] = OrderedDict()
+        self._keys_by_tag: dict[str, set] = {}
+        self._modified: dict[str, float] = {}
+        self._versions: dict[str, int] = {}
+        self._created = clock()
+        self.size = 0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        """
+        The cached value for key, or MISS.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str], size: int = 1,
+            generation: int | None = None) -> None:
+        """
+        Cache value under key. Pass the `generation` read before building the value:
+        if anything was invalidated in the meantime the value may be stale and is dropped.
+        """
+        tags = frozenset(tags)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self.max_size is not None and size > self.max_size:
+                return
+            self._discard(key)
+            self._entries[key] = (value, tags, size)
+            self.size += size
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or \
+                    (self.max_size is not None and self.size > self.max_size):
+                self._discard(next(iter(self._entries)))
+
+    def get_or_load(self, key: Hashable, tags: Iterable[str], load: Callable[[], Any]):
+        """
+        The cached value for key, calling load() and caching its result on a miss.
+        """
+        value = self.get(key)
+        if value is MISS:
+            generation = self.generation
+            value = load()
+            self.set(key, value, tags, generation=generation)
+        return value
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        """
+        Drop every entry that depends on any of the tags (every entry for ALL).
+        """
+        now = self._clock()
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                self._modified[tag] = now
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+                keys = list(self._entries) if tag == ALL else self._keys_by_tag.get(tag, ())
+                for key in list(keys):
+                    self._discard(key)
+
+    def last_modified(self, tags: Iterable[str]) -> float:
+        """
+        When data behind any of the tags last changed (or when the cache was created).
+        """
+        with self._lock:
+            return max([self._created] + [self._modified.get(tag, 0) for tag in {*tags, ALL}])
+
+    def version(self, tags: Iterable[str]) -> str:
+        """
+        An opaque version of the data behind the tags, e.g. for an ETag: it changes
+        whenever any of them is invalidated, and differs between cache instances.
+        """
+        with self._lock:
+            count = sum(self._versions.get(tag, 0) for tag in {*tags, ALL})
+        return f"{int(self._created * 1000):x}-{count}"
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "size": self.size}
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry[2]
+        for tag in entry[1]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
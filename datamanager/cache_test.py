@@ -0,0 +1,70 @@
+from datamanager.cache import ResultCache, MISS, ALL
+
+
+def test_invalidate_by_tag():
+    """Test that invalidating a tag drops exactly the entries depending on it."""
+    cache = ResultCache()
+    cache.set("movies page", 1, ["movies"])
+    cache.set("alice", 2, ["user:1", "user_movies:1"])
+    cache.set("bob", 3, ["user:2", "user_movies:2"])
+    cache.invalidate(["user_movies:1"])
+    assert cache.get("alice") is MISS
+    assert cache.get("bob") == 3
+    assert cache.get("movies page") == 1
+
+
+def test_lru_bounds():
+    """Test eviction by entry count and by total size."""
+    cache = ResultCache(max_entries=2, max_size=10)
+    cache.set("a", "a", ["t"], size=4)
+    cache.set("b", "b", ["t"], size=4)
+    cache.get("a")
+    cache.set("c", "c", ["t"], size=4)
+    assert cache.get("b") is MISS
+    assert cache.stats()["size"] == 8
+    cache.set("huge", "x", ["t"], size=11)
+    assert cache.get("huge") is MISS
+
+
+def test_stale_load_is_not_cached():
+    """Test that a value loaded while its data was being changed is not kept."""
+    cache = ResultCache()
+
+    def load():
+        cache.invalidate(["movies"])
+        return "stale"
+
+    assert cache.get_or_load("page", ["movies"], load) == "stale"
+    assert cache.get("page") is MISS
+
+
+def test_last_modified():
+    """Test that last_modified follows invalidations of the given tags."""
+    now = [100.0]
+    cache = ResultCache(clock=lambda: now[0])
+    now[0] = 150.0
+    cache.invalidate(["movies"])
+    assert cache.last_modified(["users"]) == 100.0
+    assert cache.last_modified(["users", "movies"]) == 150.0
+
+
+def test_version():
+    """Test that a version changes with invalidations of its tags only."""
+    cache = ResultCache()
+    before = cache.version(["user:1", "user_movies:1"])
+    cache.invalidate(["movies", "user:2"])
+    assert cache.version(["user:1", "user_movies:1"]) == before
+    cache.invalidate(["user_movies:1"])
+    assert cache.version(["user:1", "user_movies:1"]) != before
+    assert ResultCache(clock=lambda: 1.0).version([]) != ResultCache(clock=lambda: 2.0).version([])
+
+
+def test_invalidate_all():
+    """Test that the ALL tag drops every entry and moves every version."""
+    cache = ResultCache()
+    cache.set("a", 1, ["movies"])
+    cache.set("b", 2, ["user:1"])
+    before = cache.version(["users"])
+    cache.invalidate([ALL])
+    assert cache.get("a") is MISS and cache.get("b") is MISS
+    assert cache.version(["users"]) != before
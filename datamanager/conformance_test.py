@@ -0,0 +1,226 @@
+import pytest
+
+from data_models import User
+from datamanager import transfer
+from datamanager.bulk_import_test import FakeClient
+from datamanager.memory_data_manager import MemoryDataManager
+from datamanager.sqlite_data_manager import SQliteDataManager
+
+# The behaviour every DataManagerInterface backend must share, run against each of
+# them. A new backend only needs its own entry in BACKENDS.
+
+BACKENDS = {
+    "sqlite": lambda: SQliteDataManager("sqlite:///:memory:"),
+    "memory": MemoryDataManager,
+}
+
+MOVIES = [
+    ("Heat", "Michael Mann", 1995, 8.3),
+    ("Thief", "Michael Mann", 1981, 7.4),
+    ("Alien", "Ridley Scott", 1979, 8.5),
+    ("Amélie", "Jean-Pierre Jeunet", 2001, 8.3),
+    ("Collateral", "Michael Mann", None, None),
+]
+
+
+@pytest.fixture(params=list(BACKENDS))
+def data_manager(request):
+    """
+    Fixture for each backend, holding Ann and Bob and the MOVIES (ids 1 to 5), filled
+    through the interface only.
+    """
+    data_manager = BACKENDS[request.param]()
+    for name in ("Ann", "Bob"):
+        data_manager.add_user(User(name=name))
+    for name, director, year, rating in MOVIES:
+        movie = data_manager.add_pending_movie(name)
+        data_manager.update_movie(movie.id, {"director": director, "year": year,
+                                             "rating": rating})
+    return data_manager
+
+
+def _names(movies):
+    return [movie.name for movie in movies]
+
+
+def test_users(data_manager):
+    """Test adding, getting and listing users."""
+    user = User(name="Cid")
+    data_manager.add_user(user)
+    assert user.id == 3
+    assert data_manager.get_user(3).name == "Cid"
+    assert data_manager.get_user(99) is None
+    assert _names(data_manager.users) == ["Ann", "Bob", "Cid"]
+    page = data_manager.list_users(limit=2, sort="-name")
+    assert _names(page.items) == ["Cid", "Bob"]
+    assert _names(data_manager.list_users(after=page.next_cursor, sort="-name").items) == ["Ann"]
+
+
+def test_list_movies_sorts_and_filters(data_manager):
+    """Test that cursors walk every sort in order, NULLs first ascending and last descending."""
+    expected = {
+        "name": ["Alien", "Amélie", "Collateral", "Heat", "Thief"],
+        "-name": ["Thief", "Heat", "Collateral", "Amélie", "Alien"],
+        "year": ["Collateral", "Alien", "Thief", "Heat", "Amélie"],
+        "-rating": ["Alien", "Amélie", "Heat", "Thief", "Collateral"],
+    }
+    for sort, names in expected.items():
+        seen, after = [], None
+        while True:
+            page = data_manager.list_movies(limit=2, after=after, sort=sort)
+            seen += _names(page.items)
+            after = page.next_cursor
+            if after is None:
+                break
+        assert seen == names, sort
+    assert _names(data_manager.list_movies(director="mann", year_min=1990).items) == ["Heat"]
+    assert _names(data_manager.list_movies(year_max=1981, sort="year").items) == ["Alien",
+                                                                                   "Thief"]
+    with pytest.raises(ValueError):
+        data_manager.list_movies(sort="poster")
+    with pytest.raises(ValueError):
+        data_manager.list_movies(after="garbage")
+
+
+def test_lists_and_stats(data_manager):
+    """Test that list writes are upserts, all or nothing, and keep the stats exact."""
+    data_manager.set_user_movies_many([(1, 3, 8.5, 9.0), (1, 1, 8.3, 0.0), (1, 2, 7.4, 5.0),
+                                       (2, 1, 8.3, 7.0)])
+    data_manager.set_user_movies(1, 3, 8.5, 7.0)
+    assert [(movie.id, movie.rating) for movie in data_manager.get_user_movies(1)] == [
+        (3, 8.5), (1, 8.3), (2, 7.4)]
+    assert data_manager.get_user_movies(2)[0]["name"] == "Heat"
+    with pytest.raises(ValueError):
+        data_manager.set_user_movies_many([(2, 2, 7.0), (2, 99, 7.0)])
+    assert len(data_manager.get_user_movies(2)) == 1
+
+    assert data_manager.get_user_stats(1) == {"movie_count": 3, "rating_count": 2,
+                                              "average_rating": 6.0,
+                                              "top_director": "Michael Mann"}
+    assert data_manager.get_movie_stats(1) == {"user_count": 2, "rating_count": 1,
+                                               "average_rating": 7.0}
+    assert data_manager.get_movie(1).stats.user_count == 2
+    assert data_manager.get_movie(4).stats is None
+
+    data_manager.update_movie(3, {"director": "Michael Mann"})
+    assert data_manager.get_user_stats(1)["top_director"] == "Michael Mann"
+    data_manager.update_movie(1, {"director": "Ridley Scott"})
+    data_manager.update_movie(2, {"director": "Ridley Scott"})
+    assert data_manager.get_user_stats(1)["top_director"] == "Ridley Scott"
+
+
+def test_delete_movies(data_manager):
+    """Test that deleted movies leave every list and every aggregate."""
+    data_manager.set_user_movies_many([(1, 1, 8.3, 9.0), (1, 2, 7.4, 5.0), (2, 1, 8.3, 7.0)])
+    with pytest.raises(ValueError):
+        data_manager.delete_movies([2, "abc"])
+    assert data_manager.get_movie(2) is not None
+    assert data_manager.delete_movies(["1", 99]) == 1
+    assert data_manager.delete_movie(1) is False
+    assert data_manager.get_movie(1) is None
+    assert _names(data_manager.get_user_movies(1)) == ["Thief"]
+    assert data_manager.get_user_movies(2) == []
+    assert data_manager.get_user_stats(1) == {"movie_count": 1, "rating_count": 1,
+                                              "average_rating": 5.0,
+                                              "top_director": "Michael Mann"}
+    assert data_manager.get_user_stats(2)["movie_count"] == 0
+    assert "Heat" not in _names(data_manager.list_movies().items)
+    assert data_manager.search_movies("heat", fuzzy=False) == []
+
+
+def test_search(data_manager):
+    """Test prefix, accent-insensitive and typo-tolerant search, name matches first."""
+    assert _names(data_manager.search_movies("ali")) == ["Alien"]
+    assert _names(data_manager.search_movies("amelie")) == ["Amélie"]
+    assert _names(data_manager.search_movies("michael heat")) == ["Heat"]
+    assert _names(data_manager.search_movies("scott", fuzzy=False)) == ["Alien"]
+    assert _names(data_manager.search_movies("colateral")) == ["Collateral"]
+    assert data_manager.search_movies("zzz") == []
+    assert data_manager.find_movie("Thief").id == 2
+    assert data_manager.find_movie("theif").name == "Thief"
+
+
+def test_change_tracking(data_manager):
+    """Test that writes report their tags and move the data version of those tags only."""
+    seen = []
+    data_manager.add_listener(seen.append)
+    users, movies = data_manager.data_version(["users"]), data_manager.data_version(["movies"])
+    list_1 = data_manager.data_version(["user_movies:1"])
+    data_manager.set_user_movies(2, 1, 8.3)
+    assert {"movies", "user_movies:2"} <= seen[-1]
+    assert data_manager.data_version(["user_movies:1"]) == list_1
+    assert data_manager.data_version(["movies"]) != movies
+    data_manager.add_user(User(name="Cid"))
+    assert "users" in seen[-1]
+    assert data_manager.data_version(["users"]) != users
+    data_manager.invalidate(["user_movies:1"])
+    assert data_manager.data_version(["user_movies:1"]) != list_1
+
+
+def test_add_user_movies(data_manager):
+    """Test adding known ids and titles and fetching the rest, keeping existing entries."""
+    stored = []
+    data_manager.add_movie_listener(stored.append)
+    data_manager.set_user_movies(1, 2, 7.4, 9.0)
+    diff = data_manager.add_user_movies(1, titles=["Heat", "Matrix", "Unknown X", "heat"],
+                                        movie_ids=[2, 99], client=FakeClient())
+    assert [row["name"] for row in diff.added] == ["Heat", "The Matrix"]
+    assert diff.existing == [2]
+    assert diff.created == [6]
+    assert diff.not_found == [99, "Unknown X"]
+    assert [name for name in _names(data_manager.get_user_movies(1))] == [
+        "Thief", "Heat", "The Matrix"]
+    assert data_manager.get_user_movies(1)[0].rating == 7.4
+    assert [fields["name"] for fields in stored] == ["The Matrix"]
+    with pytest.raises(ValueError):
+        data_manager.add_user_movies(99, titles=["Heat"])
+
+
+def test_omdb_string_fields(data_manager):
+    """Test that OMDb's strings for year and rating are stored as numbers, "N/A" as None."""
+    class OMDbShapedClient:
+        def get_movie(self, title):
+            return {"name": title, "director": "Director", "year": "2004–2010",
+                    "poster": "N/A", "rating": "8.3"}
+
+    movie = data_manager.add_pending_movie("Heat 2")
+    data_manager.update_movie(movie.id, {"director": "Michael Mann", "year": "2026",
+                                         "rating": "N/A"})
+    assert (data_manager.get_movie(6).year, data_manager.get_movie(6).rating) == (2026, None)
+    assert _names(data_manager.list_movies(director="mann", year_min=1990).items) == [
+        "Heat", "Heat 2"]
+    assert _names(data_manager.list_movies(sort="rating").items)[:2] == ["Collateral", "Heat 2"]
+    diff = data_manager.add_user_movies(1, titles=["Lost"], client=OMDbShapedClient())
+    assert diff.added == [{"id": 7, "name": "Lost", "year": 2004, "rating": 8.3}]
+    assert _names(data_manager.list_movies(sort="-year", limit=2).items) == ["Heat 2", "Lost"]
+
+    with pytest.raises(ValueError):
+        data_manager.update_movie(1, {"year": ["1995"]})
+    assert data_manager.get_movie(1).year == 1995
+    assert data_manager.search_movies("heat", fuzzy=False)[0].name == "Heat"
+
+
+def test_recommendations_skip_owned_movies(data_manager):
+    """Test that recommendations come from similar lists and leave out the user's movies."""
+    data_manager.set_user_movies_many([(1, 1, 8.3, 9.0), (2, 1, 8.3, 8.0), (2, 2, 7.4, 8.0),
+                                       (2, 3, 8.5, 7.0)])
+    recommended = _names(data_manager.recommend_movies(1))
+    assert set(recommended) == {"Thief", "Alien"}
+    data_manager.set_user_movies(1, 2, 7.4, 9.0)
+    assert _names(data_manager.recommend_movies(1)) == ["Alien"]
+
+
+def test_memory_loads_sqlite_export():
+    """Test that the memory backend loaded from an export lists what SQLite lists."""
+    source = BACKENDS["sqlite"]()
+    source.add_user(User(name="Ann"))
+    for name, *_ in MOVIES:
+        source.add_pending_movie(name)
+    source.set_user_movies_many([(1, 2, 7.0, 8.0), (1, 1, 6.0)])
+    data_manager = MemoryDataManager()
+    for table, rows in transfer.export_rows(source.engine):
+        data_manager.load(table, rows)
+    for sort in ("name", "-year"):
+        assert data_manager.list_movies(sort=sort) == source.list_movies(sort=sort)
+    assert data_manager.get_user_stats(1) == source.get_user_stats(1)
+    assert data_manager.add_pending_movie("Ronin").id == 6
@@ -1,20 +1,193 @@
 from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List
+
+from datamanager.pagination import DEFAULT_PAGE_SIZE, Page
+
+# What the app, the JSON API, and the job handlers need from storage.
+# Backends: SQliteDataManager (the app's) and MemoryDataManager (in-process, for tests
+# and throwaway deployments). datamanager/conformance_test.py runs the same tests on
+# each of them; benchmarks/bench_backends.py measures them side by side.
+#
+# Users and movies come back as objects with the fields of UserRecord and MovieRecord
+# (see datamanager.records; SQliteDataManager returns model instances for single rows).
+
 
 class DataManagerInterface(ABC):
 
+    @property
+    @abstractmethod
+    def users(self) -> List[Any]:
+        """
+        All users.
+        """
+
+    @abstractmethod
+    def get_user(self, user_id: int):
+        """
+        The user with user_id, or None.
+        """
+
+    @abstractmethod
+    def add_user(self, user) -> None:
+        """
+        Store a new user (a data_models.User); its id is set on it.
+        """
+
+    @abstractmethod
+    def list_users(self, limit: int = DEFAULT_PAGE_SIZE, after: str | None = None,
+                   sort: str = "name") -> Page:
+        """
+        One page of UserRecords, sorted by name ("-name" for descending). Pass the
+        previous page's next_cursor as `after`. Raises ValueError for a bad sort or cursor.
+        """
+
+    @property
+    @abstractmethod
+    def movies(self) -> List[Any]:
+        """
+        All movies.
+        """
+
+    @abstractmethod
+    def list_movies(self, limit: int = DEFAULT_PAGE_SIZE, after: str | None = None,
+                    sort: str = "name", director: str | None = None,
+                    year_min: int | None = None, year_max: int | None = None) -> Page:
+        """
+        One page of MovieRecords with their stats, sorted by "name", "year" or "rating"
+        ("-" prefix for descending; NULLs first ascending, last descending), optionally
+        filtered by a case-insensitive director substring and an inclusive year range.
+        """
+
+    @abstractmethod
+    def get_movie(self, movie_id: int):
+        """
+        The movie with movie_id (with its stats), or None.
+        """
+
+    @abstractmethod
+    def search_movies(self, query: str, limit: int = 20, fuzzy: bool = True) -> List[Any]:
+        """
+        Movies whose name or director has words starting with every word of query
+        (case and accent insensitive), name matches first. With fuzzy, typos are
+        tolerated when that finds fewer than limit movies.
+        """
+
+    @abstractmethod
+    def find_movie(self, title: str):
+        """
+        The movie called exactly title, or else the best search match for it, or None.
+        """
+
+    @abstractmethod
+    def add_pending_movie(self, movie_title: str):
+        """
+        Store a movie that only has a title yet, and return it (with its id).
+        """
+
+    @abstractmethod
+    def update_movie(self, movie_id: int, update_data: dict):
+        """
+        Change fields of a movie. Returns the movie, or None if it does not exist.
+        """
+
+    @abstractmethod
+    def delete_movies(self, movie_ids: Iterable[int]) -> int:
+        """
+        Delete movies and take them off every list. Returns how many existed.
+        Raises ValueError, deleting nothing, if an id isn't an integer.
+        """
+
+    def delete_movie(self, movie_id: int) -> bool:
+        """
+        Delete a movie and take it off every list. Returns whether it existed.
+        """
+        return self.delete_movies([movie_id]) == 1
+
+    @abstractmethod
+    def get_user_movies(self, user_id: int) -> List[Any]:
+        """
+        The UserMovieRecords of a user's list, in the order they were added.
+        """
+
+    @abstractmethod
+    def set_user_movies_many(self, entries: Iterable[tuple]) -> int:
+        """
+        Add or update (user_id, movie_id, rating[, user_rating]) entries, all or
+        nothing. Returns how many were written. Raises ValueError, and writes
+        nothing, if a user or movie is missing.
+        """
+
+    def set_user_movies(self, user_id: int, movie_id: int, rating: float,
+                        user_rating: float = 0.0) -> None:
+        """
+        Add a movie to a user's list with a rating, or update the rating.
+        Raises ValueError if either of them is missing.
+        """
+        self.set_user_movies_many([(user_id, movie_id, rating, user_rating)])
+
+    @abstractmethod
+    def add_user_movies(self, user_id: int, titles: Iterable[str] = (),
+                        movie_ids: Iterable[int] = (), fetch: bool = True, **kwargs):
+        """
+        Add many movies to a user's list by title or id, fetching unknown titles from
+        OMDb with fetch, and return a bulk_import.UserMoviesDiff. Movies already on the
+        list keep their ratings. Raises ValueError if the user does not exist.
+        """
+
+    @abstractmethod
+    def get_movie_stats(self, movie_id: int) -> Dict[str, Any]:
+        """
+        {"user_count", "rating_count", "average_rating"} of a movie.
+        """
+
+    @abstractmethod
+    def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        """
+        {"movie_count", "rating_count", "average_rating", "top_director"} of a user.
+        """
+
+    @abstractmethod
+    def recommend_movies(self, user_id: int, limit: int = 10) -> List[Any]:
+        """
+        Movies the user doesn't have yet, best first.
+        """
+
+    @abstractmethod
+    def add_listener(self, callback) -> None:
+        """
+        Call callback(tags) after every write, with the tags of the data that changed:
+        "users", "user:<id>", "movies" and "user_movies:<user id>".
+        """
+
     @abstractmethod
-    def users(self):
-        pass
+    def add_movie_listener(self, callback) -> None:
+        """
+        Call callback(fields) with the OMDb fields of every movie stored or re-fetched.
+        """
 
     @abstractmethod
-    def users(self, user):
-        pass
+    def notify_written(self, tags, movies: Iterable[dict] = (),
+                       ratings: Iterable[tuple] = ()) -> None:
+        """
+        Report writes to the data manager's own storage made around its write methods
+        (see datamanager.bulk_import and datamanager.transfer): the tags changed, the
+        OMDb fields of the movies stored (for the movie listeners) and the
+        (user_id, movie_id, user_rating)s written (for the recommendations).
+        """
 
     @abstractmethod
-    def get_user_movies(self, user_id):
-        pass
+    def invalidate(self, tags) -> None:
+        """
+        Report writes made behind the data manager's back, by tag.
+        """
 
     @abstractmethod
-    def set_user_movies(self, user_id, movie):
-        pass
+    def data_version(self, tags) -> str:
+        """
+        A version of the data behind tags that changes with every write to it.
+        """
 
+    def start_request(self) -> None:
+        """
+        Mark the start of a unit of work (e.g. a web request).
+        """
@@ -1,7 +1,8 @@
 import pytest
+from sqlalchemy import event
 
 from datamanager.sqlite_data_manager import SQliteDataManager
-from data_models import User, Movie
+from data_models import User, Movie, UserMovie
 
 TEST_DB_URL = "sqlite:///:memory:"
 
@@ -109,6 +110,32 @@ def test_get_user_movies(data_manager: SQliteDataManager):
 
 
 
+def test_get_user_movies_single_query(data_manager: SQliteDataManager):
+    """Test that listing a user's movies costs one statement, however many movies there are."""
+    user = User(name="Test User")
+    movies = [Movie(name=f"Movie {i}", director="Director", year=2000 + i, poster="p.jpg",
+                    rating=7.0) for i in range(10)]
+    with data_manager.SessionFactory() as session:
+        session.add_all([user, *movies])
+        session.commit()
+        for movie in movies:
+            data_manager.set_user_movies(user.id, movie.id, 6.0)
+        user_id = user.id
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(data_manager.engine, "before_cursor_execute", count)
+    try:
+        user_movies = data_manager.get_user_movies(user_id)
+    finally:
+        event.remove(data_manager.engine, "before_cursor_execute", count)
+    assert len(user_movies) == 10
+    assert len(statements) == 1
+
+
 def test_set_user_movies(data_manager: SQliteDataManager):
     """Test setting (adding) a movie to a user's list."""
     user = User(name="Test User")
@@ -231,3 +258,300 @@ def test_delete_movie_not_found(data_manager: SQliteDataManager):
         deleted = data_manager.delete_movie(999)
         assert deleted is False
 
+
+
+def _walk(list_page, **kwargs):
+    """Collect every item by following next_cursor until the last page."""
+    items, after = [], None
+    while True:
+        page = list_page(after=after, **kwargs)
+        items.extend(page.items)
+        if page.next_cursor is None:
+            return items
+        after = page.next_cursor
+
+
+def test_list_movies_pagination(data_manager: SQliteDataManager):
+    """Test walking the movie listing page by page in every sort order."""
+    years = [2001, None, 1999, 2001, 2010, None, 1985]
+    with data_manager.SessionFactory() as session:
+        session.add_all([Movie(name=f"Movie {i}", director="Director", year=year, rating=i / 2)
+                         for i, year in enumerate(years)])
+        session.commit()
+
+    by_name = _walk(data_manager.list_movies, limit=3)
+    assert [movie.name for movie in by_name] == [f"Movie {i}" for i in range(7)]
+
+    by_year = _walk(data_manager.list_movies, limit=2, sort="year")
+    assert [movie.year for movie in by_year] == [None, None, 1985, 1999, 2001, 2001, 2010]
+
+    by_year_desc = _walk(data_manager.list_movies, limit=2, sort="-year")
+    assert [movie.year for movie in by_year_desc] == [2010, 2001, 2001, 1999, 1985, None, None]
+    assert len({movie.id for movie in by_year_desc}) == 7
+
+    by_rating = _walk(data_manager.list_movies, limit=4, sort="-rating")
+    assert [movie.rating for movie in by_rating] == sorted((i / 2 for i in range(7)), reverse=True)
+
+
+def test_list_movies_filters(data_manager: SQliteDataManager):
+    """Test filtering movies by director and year range."""
+    with data_manager.SessionFactory() as session:
+        session.add_all([
+            Movie(name="Heat", director="Michael Mann", year=1995),
+            Movie(name="Collateral", director="Michael Mann", year=2004),
+            Movie(name="Alien", director="Ridley Scott", year=1979),
+        ])
+        session.commit()
+    page = data_manager.list_movies(director="mann", year_min=2000)
+    assert [movie.name for movie in page.items] == ["Collateral"]
+    page = data_manager.list_movies(year_max=1995, sort="year")
+    assert [movie.name for movie in page.items] == ["Alien", "Heat"]
+    assert page.next_cursor is None
+
+
+def test_list_users_pagination(data_manager: SQliteDataManager):
+    """Test paging through users and rejecting bad parameters."""
+    with data_manager.SessionFactory() as session:
+        session.add_all([User(name=name) for name in ["Carol", "Alice", "Bob", "Alice"]])
+        session.commit()
+    assert [user.name for user in _walk(data_manager.list_users, limit=1, sort="-name")] == \
+        ["Carol", "Bob", "Alice", "Alice"]
+    with pytest.raises(ValueError):
+        data_manager.list_users(sort="age")
+    with pytest.raises(ValueError):
+        data_manager.list_users(after="not-a-cursor")
+
+
+def test_listings_return_records(data_manager: SQliteDataManager):
+    """Test that listings are immutable records with everything the templates read."""
+    from dataclasses import FrozenInstanceError
+    from datamanager.records import MovieRecord, UserMovieRecord
+    with data_manager.SessionFactory() as session:
+        session.add_all([User(id=1, name="Ann"), Movie(id=1, name="Heat", year=1995),
+                         Movie(id=2, name="Alien", year=1979)])
+        session.commit()
+    data_manager.set_user_movies(1, 1, 8.0, 9.0)
+    alien, heat = data_manager.list_movies().items
+    assert isinstance(heat, MovieRecord) and not hasattr(heat, "__dict__")
+    assert (heat.stats.user_count, heat.stats.average_rating, alien.stats) == (1, 9.0, None)
+    with pytest.raises(FrozenInstanceError):
+        heat.name = "Heat 2"
+    [entry] = data_manager.get_user_movies(1)
+    assert entry == UserMovieRecord(1, "Heat", None, 1995, None, 8.0)
+    assert entry["name"] == "Heat"
+    assert data_manager.list_users().items[0].asdict() == {"id": 1, "name": "Ann"}
+
+
+def test_set_user_movies_upsert(data_manager: SQliteDataManager):
+    """Test that setting a rating twice updates the row in one statement instead of adding one."""
+    user = User(name="Test User")
+    movie = Movie(name="Test Movie", director="Test Director", year=2024, poster="test.jpg", rating=7.5)
+    with data_manager.SessionFactory() as session:
+        session.add_all([user, movie])
+        session.commit()
+        user_id, movie_id = user.id, movie.id
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if "INTO changes" not in statement:  # the change log, see sync_changes
+            statements.append(statement)
+
+    data_manager.set_user_movies(user_id, movie_id, 5.0)
+    event.listen(data_manager.engine, "before_cursor_execute", count)
+    try:
+        data_manager.set_user_movies(user_id, movie_id, 6.5, 9.0)
+    finally:
+        event.remove(data_manager.engine, "before_cursor_execute", count)
+    assert len(statements) == 1
+    assert "ON CONFLICT" in statements[0]
+    with data_manager.SessionFactory() as session:
+        rows = session.query(UserMovie).filter_by(user_id=user_id).all()
+        assert [(row.rating, row.user_rating) for row in rows] == [(6.5, 9.0)]
+
+
+def test_set_user_movies_missing_movie(data_manager: SQliteDataManager):
+    """Test that rating a non-existent movie is rejected by the foreign key."""
+    user = User(name="Test User")
+    with data_manager.SessionFactory() as session:
+        session.add(user)
+        session.commit()
+        with pytest.raises(ValueError):
+            data_manager.set_user_movies(user.id, 999, 5.0)
+
+
+def test_set_user_movies_many(data_manager: SQliteDataManager):
+    """Test writing a batch of ratings, and that a bad entry rolls back the whole batch."""
+    users = [User(name=f"User {i}") for i in range(3)]
+    movies = [Movie(name=f"Movie {i}") for i in range(4)]
+    with data_manager.SessionFactory() as session:
+        session.add_all([*users, *movies])
+        session.commit()
+        entries = [(user.id, movie.id, 7.0) for user in users for movie in movies]
+        assert data_manager.set_user_movies_many(entries) == 12
+        assert data_manager.set_user_movies_many([(users[0].id, movies[0].id, 1.0, 2.0)]) == 1
+        with pytest.raises(ValueError):
+            data_manager.set_user_movies_many([(users[1].id, movies[0].id, 3.0), (999, 1, 1.0)])
+        assert session.query(UserMovie).count() == 12
+        assert data_manager.get_user_movies(users[0].id)[0]["rating"] == 1.0
+        assert data_manager.get_user_movies(users[1].id)[0]["rating"] == 7.0
+
+
+def test_reads_are_cached_until_written(data_manager: SQliteDataManager):
+    """Test that cached reads are invalidated by the writes that affect them, and only those."""
+    user = User(name="Test User")
+    other = User(name="Other User")
+    movie = Movie(name="Test Movie", director="Test Director", year=2024, poster="test.jpg", rating=7.5)
+    with data_manager.SessionFactory() as session:
+        session.add_all([user, other, movie])
+        session.commit()
+        user_id, other_id, movie_id = user.id, other.id, movie.id
+
+    changes = []
+    data_manager.add_listener(changes.append)
+    assert data_manager.get_user_movies(user_id) == []
+    assert data_manager.get_user_movies(other_id) == []
+    hits = data_manager.cache.hits
+    assert data_manager.get_user_movies(user_id) == []
+    assert data_manager.cache.hits == hits + 1
+
+    data_manager.set_user_movies(user_id, movie_id, 8.0)
+    assert changes == [{"movies", f"user_movies:{user_id}"}]
+    assert len(data_manager.get_user_movies(user_id)) == 1
+    hits = data_manager.cache.hits
+    data_manager.get_user_movies(other_id)
+    assert data_manager.cache.hits == hits + 1
+
+    assert len(data_manager.list_movies().items) == 1
+    data_manager.delete_movie(movie_id)
+    assert changes[-1] == {"movies", f"user_movies:{user_id}"}
+    assert data_manager.list_movies().items == []
+    assert data_manager.get_user_movies(user_id) == []
+
+
+def test_writes_reach_other_processes_caches(tmp_path):
+    """Test that cached reads of one data manager follow another's writes to the same file."""
+    url = f"sqlite:///{tmp_path / 'movies.db'}"
+    writer, reader = SQliteDataManager(url), SQliteDataManager(url)
+    reader.sync_interval = 3600
+    reader.start_request()
+    assert reader.get_user(1) is None
+    writer.add_user(User(name="Ann"))
+    reader.start_request()  # checked too recently
+    assert reader.get_user(1) is None
+    changes = []
+    reader.add_listener(changes.append)
+    reader.sync_changes(force=True)
+    assert changes == [{"users", "user:1"}]
+    assert reader.get_user(1).name == "Ann"
+
+    # Its own writes are not dropped again.
+    reader.add_user(User(name="Bob"))
+    reader.sync_changes(force=True)
+    assert changes[-1] == {"users", "user:2"}
+
+    # Changes pruned before it read them: everything goes.
+    reader.list_movies()
+    writer.add_pending_movie("Heat")
+    with writer.engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM changes")
+    writer.add_pending_movie("Alien")
+    reader.sync_changes(force=True)
+    assert "*" in changes[-1]
+    assert [movie.name for movie in reader.list_movies().items] == ["Alien", "Heat"]
+
+
+def test_processes_agree_on_data_versions(tmp_path):
+    """Test that data versions come from the shared change log, not from the process."""
+    url = f"sqlite:///{tmp_path / 'movies.db'}"
+    first, second = SQliteDataManager(url), SQliteDataManager(url)
+    assert first.data_version(["users"]) == second.data_version(["users"])
+    first.add_user(User(name="Ann"))
+    users, movies = first.data_version(["users"]), first.data_version(["movies"])
+    assert users != second.data_version(["users"])
+    second.sync_changes(force=True)
+    assert second.data_version(["users"]) == users
+    assert second.data_version(["movies"]) == movies
+    second.invalidate(["movies"])
+    first.sync_changes(force=True)
+    assert first.data_version(["movies"]) == second.data_version(["movies"]) != movies
+    assert first.data_version(["users"]) == users
+
+
+def test_synced_list_changes_update_the_recommender(tmp_path):
+    """Test that other processes' list writes patch the recommendation model, not drop it."""
+    url = f"sqlite:///{tmp_path / 'movies.db'}"
+    writer, reader = SQliteDataManager(url), SQliteDataManager(url)
+    for name in ("Ann", "Bob"):
+        writer.add_user(User(name=name))
+    for name in ("Heat", "Thief", "Alien"):
+        writer.add_pending_movie(name)
+    writer.set_user_movies_many([(1, 1, 8.3), (2, 1, 8.3), (2, 2, 7.4)])
+    reader.sync_changes(force=True)
+    model = reader._get_recommender()
+    assert [movie.name for movie in reader.recommend_movies(1)] == ["Thief"]
+
+    writer.set_user_movies(2, 3, 8.5)
+    writer.delete_movie(2)
+    reader.sync_changes(force=True)
+    assert reader._recommender is model
+    assert 3 in model.rated_movies(2)
+    model.refresh()
+    assert [movie.name for movie in reader.recommend_movies(1)] == ["Alien"]
+
+    # Changes pruned before it read them: the model goes too.
+    writer.add_pending_movie("Collateral")
+    with writer.engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM changes")
+    writer.add_pending_movie("Ronin")
+    reader.sync_changes(force=True)
+    assert reader._recommender is None
+
+
+@pytest.fixture
+def catalog(data_manager: SQliteDataManager):
+    """Fixture adding a few movies to search through."""
+    with data_manager.SessionFactory() as session:
+        session.add_all([
+            Movie(name="The Matrix", director="Lana Wachowski, Lilly Wachowski", year=1999),
+            Movie(name="The Matrix Reloaded", director="Lana Wachowski, Lilly Wachowski", year=2003),
+            Movie(name="Heat", director="Michael Mann", year=1995),
+            Movie(name="Mad Max: Fury Road", director="George Miller", year=2015),
+            Movie(name="Amélie", director="Jean-Pierre Jeunet", year=2001),
+        ])
+        session.commit()
+    return data_manager
+
+
+def test_search_movies_prefix(catalog: SQliteDataManager):
+    """Test ranked prefix search over names and directors."""
+    assert [movie.name for movie in catalog.search_movies("matr")] == \
+        ["The Matrix", "The Matrix Reloaded"]
+    assert [movie.name for movie in catalog.search_movies("mann")] == ["Heat"]
+    assert [movie.name for movie in catalog.search_movies("fury ROAD")] == ["Mad Max: Fury Road"]
+    assert [movie.name for movie in catalog.search_movies("amelie")] == ["Amélie"]
+    assert catalog.search_movies("  ") == []
+
+
+def test_search_movies_fuzzy(catalog: SQliteDataManager):
+    """Test that typos still find the movie, after exact prefix matches."""
+    assert [movie.name for movie in catalog.search_movies("matirx", limit=1)] == ["The Matrix"]
+    assert catalog.search_movies("matirx", fuzzy=False) == []
+    assert catalog.search_movies("zzzzzz") == []
+
+
+def test_search_follows_writes(catalog: SQliteDataManager):
+    """Test that the search index is kept in sync with the movies table."""
+    heat = catalog.search_movies("heat")[0]
+    catalog.update_movie(heat.id, {"name": "Collateral"})
+    assert catalog.search_movies("heat", fuzzy=False) == []
+    assert [movie.id for movie in catalog.search_movies("collateral")] == [heat.id]
+    catalog.delete_movie(heat.id)
+    assert catalog.search_movies("collateral") == []
+
+
+def test_find_movie(catalog: SQliteDataManager):
+    """Test resolving a title typed by a user."""
+    assert catalog.find_movie("Heat").name == "Heat"
+    assert catalog.find_movie("the matrx").name == "The Matrix"
+    assert catalog.find_movie("Nothing like it") is None
@@ -0,0 +1,88 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+
+from datamanager.engine_profiles import EngineProfile, get_profile, read_only_url
+from datamanager.sqlite_data_manager import SQliteDataManager
+from data_models import User
+
+
+def _pragma(data_manager, name):
+    with data_manager.engine.connect() as conn:
+        return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def test_wal_profile(tmp_path):
+    """Test that the wal profile's PRAGMAs and pool are applied to a file database."""
+    data_manager = SQliteDataManager(f"sqlite:///{tmp_path / 'movies.db'}", profile="wal")
+    assert _pragma(data_manager, "journal_mode") == "wal"
+    assert _pragma(data_manager, "synchronous") == 1  # NORMAL
+    assert _pragma(data_manager, "foreign_keys") == 1
+    assert _pragma(data_manager, "busy_timeout") == 5000
+    assert _pragma(data_manager, "cache_size") == -64 * 1024
+    assert isinstance(data_manager.engine.pool, QueuePool)
+    assert data_manager.engine.pool.size() == get_profile("wal").pool_size
+
+
+def test_default_profile(tmp_path):
+    """Test that the default profile keeps the rollback journal."""
+    data_manager = SQliteDataManager(f"sqlite:///{tmp_path / 'movies.db'}", profile="default")
+    assert _pragma(data_manager, "journal_mode") == "delete"
+    assert _pragma(data_manager, "foreign_keys") == 1
+
+
+def test_custom_profile(tmp_path):
+    """Test passing an EngineProfile directly."""
+    profile = EngineProfile(journal_mode="WAL", synchronous="OFF", busy_timeout=100)
+    data_manager = SQliteDataManager(f"sqlite:///{tmp_path / 'movies.db'}", profile=profile)
+    assert _pragma(data_manager, "synchronous") == 0
+    assert _pragma(data_manager, "busy_timeout") == 100
+
+
+def test_unknown_profile():
+    """Test that a typo in the profile name is reported."""
+    with pytest.raises(ValueError):
+        SQliteDataManager("sqlite:///:memory:", profile="turbo")
+
+
+@pytest.fixture
+def split_data_manager(tmp_path):
+    """
+    Fixture for a data manager with a read-only reader pool next to the writer,
+    recording which engine ran each statement.
+    """
+    url = f"sqlite:///{tmp_path / 'movies.db'}"
+    data_manager = SQliteDataManager(url, reader_url=read_only_url(url), reader_pool_size=2,
+                                     cache_size=0)
+    data_manager.routed = []
+    for name, engine in (("writer", data_manager.engine), ("reader", data_manager.read_engine)):
+        event.listen(engine, "before_cursor_execute",
+                     lambda *args, name=name: data_manager.routed.append(name))
+    return data_manager
+
+
+def test_reads_go_to_readers(split_data_manager):
+    """Test that reads use the read-only pool, which refuses writes."""
+    split_data_manager.start_request()
+    split_data_manager.list_movies()
+    split_data_manager.get_user_movies(1)
+    assert set(split_data_manager.routed) == {"reader"}
+    assert split_data_manager.read_engine.pool.size() == 2
+    with pytest.raises(OperationalError):
+        with split_data_manager.read_engine.begin() as conn:
+            conn.exec_driver_sql("DELETE FROM movies")
+    assert read_only_url("sqlite:///:memory:") is None
+
+
+def test_read_your_writes(split_data_manager):
+    """Test that reads after a write in the same request go to the writer, until the next one."""
+    split_data_manager.start_request()
+    split_data_manager.add_user(User(name="Ann"))
+    split_data_manager.routed.clear()
+    assert [user.name for user in split_data_manager.list_users().items] == ["Ann"]
+    assert split_data_manager.routed == ["writer"]
+    split_data_manager.start_request()
+    split_data_manager.routed.clear()
+    assert [user.name for user in split_data_manager.list_users().items] == ["Ann"]
+    assert split_data_manager.routed == ["reader"]
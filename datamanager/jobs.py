@@ -0,0 +1,448 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+
+from data_models import Job
+from movie_api import AsyncOMDBClient, OMDBConfigError
+from posters import PosterCache, PosterError, PosterInvalidError, is_poster_url
+
+# Slow work (OMDb lookups, poster downloads, bulk imports, deletes) is stored as rows
+# of the jobs table and run by a Worker, so requests only pay for an INSERT.
+#
+# A job is claimed by setting it "running" with a lease; a worker that dies leaves
+# the lease to expire and the job is claimed again. A job that raises is retried
+# with exponential backoff until max_attempts, then marked "failed". PERMANENT_ERRORS
+# (bad input, an OMDb title or poster URL that can't be used, a missing OMDb key) fail
+# at once. Handlers should therefore be safe to run twice.
+#
+# Kinds registered with batch=n run up to n due jobs in one call on one worker slot:
+# enrich_movie looks all their titles up concurrently on one event loop, so a worker
+# keeps many OMDb requests pending without a thread each.
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 300))
+POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 0.5))
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 300.0
+# Errors a retry won't fix; OMDBRequestError and PosterInvalidError are raised as
+# ValueErrors.
+PERMANENT_ERRORS = (ValueError, OMDBConfigError)
+ENRICH_BATCH = int(os.getenv("JOB_ENRICH_BATCH", 50))
+
+# kind -> handler(data_manager, **payload), returning a JSON-serializable result.
+HANDLERS: Dict[str, Callable] = {}
+# kind -> most jobs per call of a batch handler(data_manager, payloads), which returns
+# one result, or the exception that job failed with, per payload.
+BATCH_SIZES: Dict[str, int] = {}
+
+
+def handler(kind: str, batch: int = 1):
+    """
+    Register a function as the handler of jobs of `kind`, `batch` of them at a time
+    when batch > 1 (see BATCH_SIZES).
+    """
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        if batch > 1:
+            BATCH_SIZES[kind] = batch
+        return fn
+    return decorator
+
+
+class JobQueue:
+    """
+    The jobs table of a database, see the module comment.
+    """
+
+    def __init__(self, engine: Engine, lease: float = LEASE_SECONDS,
+                 backoff_base: float = BACKOFF_BASE, backoff_max: float = BACKOFF_MAX,
+                 clock=time.time):
+        self.engine = engine
+        self.lease = lease
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._clock = clock
+        # Set on every enqueue, so a worker in this process needn't wait for its next poll.
+        self.wakeup = threading.Event()
+
+    def enqueue(self, kind: str, payload: dict | None = None, idempotency_key: str | None = None,
+                max_attempts: int = 3, delay: float = 0.0) -> int:
+        """
+        Queue a job and return its id. If a job with idempotency_key exists already,
+        whatever its status, nothing is queued and its id is returned.
+        Raises ValueError for a kind without a handler.
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind {kind!r}")
+        now = self._clock()
+        statement = sqlite_insert(Job).values(
+            kind=kind, payload=json.dumps(payload or {}), status=QUEUED,
+            max_attempts=max_attempts, idempotency_key=idempotency_key, run_at=now + delay,
+            created_at=now).on_conflict_do_nothing(index_elements=[Job.idempotency_key])
+        with self.engine.begin() as conn:
+            result = conn.execute(statement)
+            if result.rowcount:
+                job_id = result.inserted_primary_key[0]
+            else:
+                job_id = conn.scalar(select(Job.id).where(Job.idempotency_key == idempotency_key))
+        self.wakeup.set()
+        return job_id
+
+    def get(self, job_id: int) -> dict | None:
+        """
+        Status of a job: kind, status, attempts, result, error and times, or None.
+        """
+        with self.engine.connect() as conn:
+            row = conn.execute(select(Job).where(Job.id == job_id)).mappings().first()
+        if row is None:
+            return None
+        return {"id": row["id"], "kind": row["kind"], "status": row["status"],
+                "attempts": row["attempts"], "max_attempts": row["max_attempts"],
+                "result": json.loads(row["result"]) if row["result"] is not None else None,
+                "error": row["error"], "created_at": row["created_at"],
+                "run_at": row["run_at"], "finished_at": row["finished_at"]}
+
+    def claim(self, limit: int = 1, kind: str | None = None) -> List[dict]:
+        """
+        Lease up to `limit` due jobs (of `kind` only, if given), oldest first: queued
+        ones and running ones whose lease expired. One UPDATE ... RETURNING, so two
+        workers never get the same job.
+        """
+        now = self._clock()
+        of_kind = " AND kind = :kind" if kind is not None else ""
+        with self.engine.begin() as conn:
+            rows = conn.execute(text(
+                "UPDATE jobs SET status = :running, attempts = attempts + 1, "
+                "locked_until = :locked_until "
+                "WHERE id IN (SELECT id FROM jobs WHERE status = :queued AND run_at <= :now"
+                f"{of_kind} UNION ALL SELECT id FROM jobs WHERE status = :running "
+                f"AND locked_until < :now{of_kind} ORDER BY id LIMIT :limit) "
+                "RETURNING id, kind, payload, attempts, max_attempts"),
+                {"running": RUNNING, "queued": QUEUED, "now": now, "kind": kind,
+                 "locked_until": now + self.lease, "limit": limit}).mappings().all()
+        jobs = []
+        for row in sorted(rows, key=lambda row: row["id"]):
+            if row["attempts"] > row["max_attempts"]:
+                # Its worker died on every attempt.
+                self._finish(row["id"], FAILED, error="lease expired")
+                continue
+            jobs.append({"id": row["id"], "kind": row["kind"],
+                         "payload": json.loads(row["payload"]), "attempts": row["attempts"],
+                         "max_attempts": row["max_attempts"]})
+        return jobs
+
+    def complete(self, job_id: int, result=None, changed=()) -> None:
+        """
+        Mark a job done with its result and the cache tags its writes touched.
+        """
+        self._finish(job_id, DONE, result=result, changed=changed)
+
+    def fail(self, job_id: int, error: str, retry: bool = True) -> str:
+        """
+        Record a failed attempt. The job is queued again after a backoff while it has
+        attempts left (and retry is true), else it is failed. Returns the new status.
+        """
+        with self.engine.begin() as conn:
+            attempts, max_attempts = conn.execute(
+                select(Job.attempts, Job.max_attempts).where(Job.id == job_id)).one()
+            if not retry or attempts >= max_attempts:
+                status = FAILED
+            else:
+                status = QUEUED
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+                conn.execute(text(
+                    "UPDATE jobs SET status = :queued, run_at = :run_at, locked_until = NULL, "
+                    "error = :error WHERE id = :id"),
+                    {"queued": QUEUED, "run_at": self._clock() + delay, "error": error,
+                     "id": job_id})
+        if status == FAILED:
+            self._finish(job_id, FAILED, error=error)
+        return status
+
+    def _finish(self, job_id: int, status: str, result=None, error: str | None = None,
+                changed=()) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE jobs SET status = :status, result = :result, error = :error, "
+                "changed = :changed, locked_until = NULL, finished_at = :now "
+                "WHERE id = :id"),
+                {"status": status, "result": json.dumps(result) if result is not None else None,
+                 "error": error, "changed": json.dumps(sorted(changed)), "now": self._clock(),
+                 "id": job_id})
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Number of jobs per status.
+        """
+        with self.engine.connect() as conn:
+            return dict(conn.execute(text("SELECT status, COUNT(*) FROM jobs GROUP BY status")).all())
+
+
+# The data manager jobs run against, one per worker process (or the app's own for
+# a Worker running in threads), the poster cache, built on first use, and the cache
+# tags written by the current job.
+_data_manager = None
+_poster_cache = None
+_local = threading.local()
+
+
+def _record_changes(tags) -> None:
+    changed = getattr(_local, "changed", None)
+    if changed is not None:
+        changed.update(tags)
+
+
+def _init_process(db_url: str) -> None:
+    global _data_manager
+    from datamanager.sqlite_data_manager import SQliteDataManager
+    # Leave Ctrl-C to the parent, which finishes the running jobs.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _data_manager = SQliteDataManager(db_url, cache_size=0)
+    _data_manager.add_listener(_record_changes)
+    # Details stored by a job bring their poster along; on disk, so the app serves it.
+    _data_manager.add_movie_listener(
+        lambda movie: _fetch_poster_later(movie.get("poster")))
+
+
+def _get_poster_cache() -> PosterCache:
+    global _poster_cache
+    if _poster_cache is None:
+        _poster_cache = PosterCache()
+    return _poster_cache
+
+
+def _fetch_poster_later(url: str | None) -> None:
+    if is_poster_url(url):
+        JobQueue(_data_manager.engine).enqueue("fetch_poster", {"url": url},
+                                               idempotency_key=f"fetch_poster:{url}")
+
+
+def _run_jobs(kind: str, payloads: List[dict]):
+    """
+    Run jobs of one kind in a worker: one, or a batch (see BATCH_SIZES).
+    Returns (a result or exception per payload, changed cache tags).
+    """
+    _local.changed = set()
+    try:
+        if kind in BATCH_SIZES:
+            results = HANDLERS[kind](_data_manager, payloads)
+        else:
+            [payload] = payloads
+            results = [HANDLERS[kind](_data_manager, **payload)]
+        return results, sorted(_local.changed)
+    finally:
+        _local.changed = None
+
+
+class Worker:
+    """
+    Claims due jobs and runs them on an executor, at most `concurrency` at a time.
+    Use in_processes() for a standalone worker, in_threads() to run jobs inside the app.
+    """
+
+    def __init__(self, queue: JobQueue, executor_factory: Callable, concurrency: int,
+                 poll_interval: float = POLL_INTERVAL):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._executor_factory = executor_factory
+        self._executor = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def in_processes(cls, db_url: str, processes: int | None = None, **kwargs) -> "Worker":
+        """
+        A worker running jobs in a pool of processes, each with its own data manager.
+        """
+        from datamanager.sqlite_data_manager import SQliteDataManager
+        processes = processes or os.cpu_count() or 1
+        queue = JobQueue(SQliteDataManager(db_url, cache_size=0).engine)
+        # Spawned rather than forked: the parent has threads and open connections.
+        context = multiprocessing.get_context("spawn")
+        return cls(queue, lambda: ProcessPoolExecutor(processes, mp_context=context,
+                                                      initializer=_init_process,
+                                                      initargs=(db_url,)),
+                   processes, **kwargs)
+
+    @classmethod
+    def in_threads(cls, data_manager, threads: int = 4, **kwargs) -> "Worker":
+        """
+        A worker running jobs in threads of this process, against data_manager.
+        """
+        global _data_manager
+        _data_manager = data_manager
+        data_manager.add_listener(_record_changes)
+        return cls(JobQueue(data_manager.engine), lambda: ThreadPoolExecutor(
+            threads, thread_name_prefix="job-worker"), threads, **kwargs)
+
+    def run(self) -> None:
+        """
+        Run jobs until stop() is called, then wait for the running ones.
+        """
+        self._executor = self._executor_factory()
+        in_flight = {}
+        try:
+            while not self._stop.is_set():
+                free = self.concurrency - len(in_flight)
+                for job in self.queue.claim(free) if free else []:
+                    jobs = [job]
+                    if job["kind"] in BATCH_SIZES:
+                        jobs += self.queue.claim(BATCH_SIZES[job["kind"]] - 1, job["kind"])
+                    future = self._executor.submit(_run_jobs, job["kind"],
+                                                   [job["payload"] for job in jobs])
+                    in_flight[future] = jobs
+                if not in_flight:
+                    self.queue.wakeup.wait(self.poll_interval)
+                    self.queue.wakeup.clear()
+                    continue
+                done, _ = wait(in_flight, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._finish(in_flight.pop(future), future)
+            for future, jobs in in_flight.items():
+                self._finish(jobs, future)
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _finish(self, jobs: List[dict], future) -> None:
+        try:
+            results, changed = future.result()
+        except BrokenProcessPool as e:
+            # A job killed its process; the pool has to be replaced.
+            for job in jobs:
+                self.queue.fail(job["id"], f"worker process died: {e}")
+            if getattr(self._executor, "_broken", False):
+                self._executor.shutdown(wait=False)
+                self._executor = self._executor_factory()
+            return
+        except Exception as e:
+            results, changed = [e] * len(jobs), ()
+        for job, result in zip(jobs, results):
+            if isinstance(result, PERMANENT_ERRORS):
+                self.queue.fail(job["id"], f"{type(result).__name__}: {result}", retry=False)
+            elif isinstance(result, Exception):
+                self.queue.fail(job["id"], f"{type(result).__name__}: {result}")
+            else:
+                self.queue.complete(job["id"], result, changed)
+
+    def start(self) -> None:
+        """
+        Run in a background thread (once; later calls do nothing).
+        """
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self.run, name="job-worker", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop claiming jobs and wait for the running ones.
+        """
+        self._stop.set()
+        self.queue.wakeup.set()
+        with self._lock:
+            if self._thread is not None:
+                self._thread.join()
+                self._thread = None
+
+
+@handler("enrich_movie", batch=ENRICH_BATCH)
+def enrich_movies(data_manager, payloads: List[dict]) -> list:
+    """
+    Fill in pending movies' details from OMDb, removing those OMDb doesn't know.
+    payloads: {"movie_id", "title"} dicts, whose titles are looked up concurrently.
+    """
+    movies = asyncio.run(_get_movies([payload["title"] for payload in payloads]))
+    results = []
+    for payload in payloads:
+        movie = movies[payload["title"]]
+        if isinstance(movie, Exception):
+            # OMDBUnavailableError: retried later; OMDBRequestError: failed, the movie is kept.
+            results.append(movie)
+            continue
+        try:
+            pending = data_manager.get_movie(payload["movie_id"])
+            if pending is None or pending.name != payload["title"]:
+                # Deleted or enriched already, or its id now belongs to a later movie:
+                # leave that row alone.
+                results.append({"found": movie is not None, "stale": True})
+            elif movie is None:
+                results.append({"found": False,
+                                "deleted": data_manager.delete_movie(payload["movie_id"])})
+            else:
+                updated = data_manager.update_movie(payload["movie_id"], movie)
+                results.append({"found": True, "updated": updated is not None})
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+async def _get_movies(titles: List[str]) -> dict:
+    async with AsyncOMDBClient(max_concurrency=ENRICH_BATCH) as client:
+        return await client.get_movies(titles)
+
+
+@handler("fetch_poster")
+def fetch_poster(data_manager, url: str) -> dict:
+    try:
+        digest = _get_poster_cache().get(url)[1]
+    except PosterInvalidError as e:
+        raise ValueError(str(e))
+    except PosterError as e:
+        raise RuntimeError(str(e))
+    return {"digest": digest}
+
+
+@handler("import_movies")
+def import_movies(data_manager, titles: List[str]) -> dict:
+    report = data_manager.bulk_import_movies(titles)
+    return {"imported": report.imported, "skipped": report.skipped,
+            "failed": [list(failure) for failure in report.failed]}
+
+
+@handler("import_ratings")
+def import_ratings(data_manager, entries: List[list]) -> dict:
+    """
+    entries: [user_id, movie_id, rating(, user_rating)] lists, see set_user_movies_many.
+    """
+    return {"written": data_manager.set_user_movies_many(tuple(entry) for entry in entries)}
+
+
+@handler("delete_movie")
+def delete_movie(data_manager, movie_id: int) -> dict:
+    return {"deleted": data_manager.delete_movie(movie_id)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run queued jobs in a pool of processes.")
+    parser.add_argument("--db", default="sqlite:///movie_app.db", help="database URL")
+    parser.add_argument("--processes", type=int, default=None, help="default: one per core")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    args = parser.parse_args(argv)
+
+    worker = Worker.in_processes(args.db, args.processes, poll_interval=args.poll_interval)
+    print(f"job worker: {worker.concurrency} processes, {worker.queue.counts()}", file=sys.stderr)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: worker.stop())
+    worker.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+import asyncio
+import time
+
+import pytest
+
+from datamanager import jobs
+from datamanager.jobs import JobQueue, Worker, handler
+from datamanager.sqlite_data_manager import SQliteDataManager
+from data_models import Movie, User
+from movie_api import OMDBRequestError
+from posters import PosterInvalidError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@handler("test_flaky")
+def flaky(data_manager, fail_times: int, name: str) -> dict:
+    """
+    Fails fail_times attempts (counted in a user per attempt), then succeeds.
+    """
+    data_manager.add_user(User(name=name))
+    attempts = sum(user.name == name for user in data_manager.users)
+    if attempts <= fail_times:
+        raise RuntimeError(f"attempt {attempts} failed")
+    return {"attempts": attempts}
+
+
+@pytest.fixture
+def data_manager(tmp_path):
+    """
+    Fixture for a file-backed data manager (jobs run in other threads and processes).
+    """
+    return SQliteDataManager(f"sqlite:///{tmp_path / 'movies.db'}", cache_size=0)
+
+
+@pytest.fixture
+def queue(data_manager):
+    return JobQueue(data_manager.engine, lease=60, clock=FakeClock())
+
+
+def test_enqueue_is_idempotent(queue):
+    """Test that a repeated idempotency key returns the first job."""
+    first = queue.enqueue("delete_movie", {"movie_id": 1}, idempotency_key="delete:1")
+    again = queue.enqueue("delete_movie", {"movie_id": 1}, idempotency_key="delete:1")
+    other = queue.enqueue("delete_movie", {"movie_id": 1})
+    assert first == again != other
+    assert queue.counts() == {"queued": 2}
+    assert queue.get(first)["status"] == "queued"
+    assert queue.get(12345) is None
+    with pytest.raises(ValueError):
+        queue.enqueue("no_such_kind")
+
+
+def test_claim_retry_and_fail(queue):
+    """Test leases, backoff between attempts and failure after max_attempts."""
+    job_id = queue.enqueue("delete_movie", {"movie_id": 1}, max_attempts=2)
+    [job] = queue.claim(5)
+    assert (job["id"], job["payload"], job["attempts"]) == (job_id, {"movie_id": 1}, 1)
+    assert queue.claim(5) == []  # leased
+    assert queue.fail(job_id, "boom") == "queued"
+    assert queue.claim(5) == []  # backing off
+    queue._clock.now += queue.backoff_base
+    [job] = queue.claim(5)
+    assert job["attempts"] == 2
+    assert queue.fail(job_id, "boom again") == "failed"
+    status = queue.get(job_id)
+    assert (status["status"], status["error"]) == ("failed", "boom again")
+
+
+def test_expired_lease_is_claimed_again(queue):
+    """Test that the job of a worker that died is picked up after its lease."""
+    job_id = queue.enqueue("delete_movie", {"movie_id": 1}, max_attempts=2)
+    queue.claim()
+    queue._clock.now += 61
+    assert [job["id"] for job in queue.claim()] == [job_id]
+    queue._clock.now += 61
+    assert queue.claim() == []
+    assert queue.get(job_id)["error"] == "lease expired"
+
+
+def test_thread_worker_retries(data_manager):
+    """Test that a worker runs jobs until they succeed and records their results."""
+    worker = Worker.in_threads(data_manager, threads=2, poll_interval=0.01)
+    worker.queue.backoff_base = 0.01
+    ok = worker.queue.enqueue("test_flaky", {"fail_times": 1, "name": "flaky"})
+    bad = worker.queue.enqueue("test_flaky", {"fail_times": 5, "name": "bad"}, max_attempts=2)
+    worker.start()
+    try:
+        deadline = time.monotonic() + 10
+        while worker.queue.counts().keys() - {"done", "failed"} and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        worker.stop()
+    assert worker.queue.get(ok)["status"] == "done"
+    assert worker.queue.get(ok)["result"] == {"attempts": 2}
+    assert worker.queue.get(bad)["status"] == "failed"
+    assert worker.queue.get(bad)["error"] == "RuntimeError: attempt 2 failed"
+
+
+def test_process_worker_writes_reach_other_caches(data_manager, tmp_path):
+    """Test jobs run in worker processes, and their writes reach another process's cache."""
+    url = f"sqlite:///{tmp_path / 'movies.db'}"
+    cached = SQliteDataManager(url)
+    movie = cached.add_pending_movie("Doomed")
+    assert cached.get_movie(movie.id) is not None
+
+    worker = Worker.in_processes(url, processes=1, poll_interval=0.01)
+    job_id = worker.queue.enqueue("delete_movie", {"movie_id": movie.id})
+    worker.start()
+    try:
+        deadline = time.monotonic() + 60
+        while worker.queue.get(job_id)["status"] != "done" and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        worker.stop()
+    assert worker.queue.get(job_id)["result"] == {"deleted": True}
+    assert cached.get_movie(movie.id) is not None  # still cached
+    cached.sync_changes(force=True)
+    assert cached.get_movie(movie.id) is None
+
+
+class FakeAsyncClient:
+    """
+    Stands in for AsyncOMDBClient: answers each title after `delay` seconds and records
+    the most lookups pending at once. Titles starting with "Unknown" are not found,
+    those starting with "Rejected" are rejected.
+    """
+    delay = 0.0
+    pending = peak = 0
+
+    def __init__(self, **options):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def get_movies(self, titles):
+        cls = type(self)
+
+        async def lookup(title):
+            cls.pending += 1
+            cls.peak = max(cls.peak, cls.pending)
+            await asyncio.sleep(cls.delay)
+            cls.pending -= 1
+            if title.startswith("Unknown"):
+                return None
+            if title.startswith("Rejected"):
+                return OMDBRequestError(f"OMDb rejected the request for {title!r} (401)")
+            return {"name": title.title(), "director": "Director", "year": 1999,
+                    "poster": "p.jpg", "rating": 8.0}
+
+        titles = list(dict.fromkeys(titles))
+        return dict(zip(titles, await asyncio.gather(*map(lookup, titles))))
+
+
+@pytest.fixture
+def omdb(monkeypatch):
+    """
+    Fixture replacing the jobs' AsyncOMDBClient with a fresh FakeAsyncClient class.
+    """
+    client = type("Client", (FakeAsyncClient,), {})
+    monkeypatch.setattr(jobs, "AsyncOMDBClient", client)
+    return client
+
+
+def _run_until_finished(worker, job_ids) -> None:
+    worker.start()
+    try:
+        deadline = time.monotonic() + 10
+        while any(worker.queue.get(job_id)["status"] not in ("done", "failed")
+                  for job_id in job_ids) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        worker.stop()
+
+
+def test_enrich_movies(data_manager, omdb):
+    """Test the enrichment job: details stored for known titles, unknown ones removed."""
+    known = data_manager.add_pending_movie("the matrix")
+    unknown = data_manager.add_pending_movie("Unknown Film")
+    assert jobs.enrich_movies(data_manager, [{"movie_id": known.id, "title": "the matrix"},
+                                             {"movie_id": unknown.id, "title": "Unknown Film"}]
+                              ) == [{"found": True, "updated": True},
+                                    {"found": False, "deleted": True}]
+    with data_manager.SessionFactory() as session:
+        assert [(movie.name, movie.year) for movie in session.query(Movie)] == [
+            ("The Matrix", 1999)]
+
+
+def test_enrichment_leaves_reused_ids_alone(data_manager, omdb):
+    """Test that a job whose movie id now belongs to another movie doesn't touch it."""
+    old = data_manager.add_pending_movie("Unknown Film")
+    data_manager.delete_movie(old.id)
+    new = data_manager.add_pending_movie("Alien")
+    assert new.id == old.id
+    assert jobs.enrich_movies(data_manager, [{"movie_id": old.id, "title": "Unknown Film"}]) == [
+        {"found": False, "stale": True}]
+    assert data_manager.get_movie(new.id).name == "Alien"
+
+
+def test_enrichment_lookups_run_concurrently(data_manager, omdb):
+    """Test that one worker thread keeps a whole batch of OMDb lookups pending at once."""
+    omdb.delay = 0.2
+    worker = Worker.in_threads(data_manager, threads=1, poll_interval=0.01)
+    job_ids = []
+    for i in range(20):
+        movie = data_manager.add_pending_movie(f"Movie {i}")
+        job_ids.append(worker.queue.enqueue("enrich_movie", {"movie_id": movie.id,
+                                                             "title": movie.name}))
+    started = time.monotonic()
+    _run_until_finished(worker, job_ids)
+    assert time.monotonic() - started < 2
+    assert omdb.peak == 20
+    assert all(worker.queue.get(job_id)["result"] == {"found": True, "updated": True}
+               for job_id in job_ids)
+
+
+def test_rejected_title_fails_without_retry(data_manager, omdb):
+    """Test that an OMDb rejection fails its job at once and keeps the pending movie."""
+    rejected = data_manager.add_pending_movie("Rejected Film")
+    heat = data_manager.add_pending_movie("Heat")
+    worker = Worker.in_threads(data_manager, threads=1, poll_interval=0.01)
+    job_ids = [worker.queue.enqueue("enrich_movie", {"movie_id": movie.id, "title": movie.name})
+               for movie in (rejected, heat)]
+    _run_until_finished(worker, job_ids)
+    failed, done = (worker.queue.get(job_id) for job_id in job_ids)
+    assert (failed["status"], failed["attempts"]) == ("failed", 1)
+    assert failed["error"].startswith("OMDBRequestError")
+    assert data_manager.get_movie(rejected.id) is not None
+    assert done["status"] == "done"
+
+
+def test_fetch_poster_shares_one_cache(data_manager, monkeypatch):
+    """Test that poster jobs reuse the worker's PosterCache and fail bad images for good."""
+    caches = []
+
+    class FakePosterCache:
+        def __init__(self):
+            caches.append(self)
+
+        def get(self, url):
+            if url.endswith("broken.jpg"):
+                raise PosterInvalidError(f"Cannot decode poster {url}")
+            return f"/thumbs/{url}", f"digest-{url}"
+
+    monkeypatch.setattr(jobs, "PosterCache", FakePosterCache)
+    monkeypatch.setattr(jobs, "_poster_cache", None)
+    assert jobs.fetch_poster(data_manager, "a.jpg") == {"digest": "digest-a.jpg"}
+    assert jobs.fetch_poster(data_manager, "b.jpg") == {"digest": "digest-b.jpg"}
+    with pytest.raises(ValueError):
+        jobs.fetch_poster(data_manager, "broken.jpg")
+    assert len(caches) == 1
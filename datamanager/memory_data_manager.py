@@ -0,0 +1,545 @@
+import bisect
+import dataclasses
+import difflib
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List
+
+from datamanager import bulk_import
+from datamanager.cache import ResultCache, ALL
+from datamanager.data_manager_interface import DataManagerInterface
+from datamanager.pagination import (Page, encode_cursor, decode_cursor, parse_sort, clamp_limit,
+                                    DEFAULT_PAGE_SIZE)
+from datamanager.records import (UserRecord, MovieRecord, MovieStatsRecord, UserMovieRecord,
+                                 movie_fields)
+from movie_api import OMDBClient, normalize_title
+
+# Listing sorts, as in SQliteDataManager.
+MOVIE_SORTS = dict.fromkeys(("name", "year", "rating"))
+USER_SORTS = dict.fromkeys(("name",))
+MOVIE_FIELDS = ("name", "director", "year", "poster", "rating")
+# Search weights of a word in the name and in the director (like the bm25 weights).
+NAME_WEIGHT, DIRECTOR_WEIGHT = 10, 1
+
+
+def _sort_key(value, row_id: int) -> tuple:
+    # SQLite's order: NULLs before any value, ties broken by id.
+    return (value is not None, value, row_id)
+
+
+def _words(text: str | None) -> List[str]:
+    """
+    The words of text, case and accent folded (like the FTS5 unicode61 tokenizer).
+    """
+    if not text:
+        return []
+    decomposed = unicodedata.normalize("NFKD", text)
+    return re.findall(r"\w+", "".join(c for c in decomposed
+                                      if not unicodedata.combining(c)).casefold())
+
+
+class MemoryDataManager(DataManagerInterface):
+    """
+    All data in dicts of immutable records, in this process only: for tests, demos
+    and caches in front of another backend. Listings read sorted key lists (bisect
+    to the cursor, then walk), search reads an inverted word index, and aggregate
+    stats are kept up to date on every write, so reads never scan all rows.
+    One lock serializes writes; records handed out never change.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._users: Dict[int, UserRecord] = {}
+        self._movies: Dict[int, MovieRecord] = {}
+        self._ids_by_name: Dict[str, set] = {}
+        # user id -> {movie id: [rating, user_rating]}, in the order they were added
+        self._lists: Dict[int, Dict[int, list]] = {}
+        self._holders: Dict[int, set] = {}
+        self._user_stats: Dict[int, list] = {}  # [movie_count, rating_count, rating_sum]
+        self._directors: Dict[int, Counter] = {}
+        self._user_keys: Dict[str, list] = {name: [] for name in USER_SORTS}
+        self._movie_keys: Dict[str, list] = {name: [] for name in MOVIE_SORTS}
+        self._postings: Dict[str, Dict[int, int]] = {}  # word -> {movie id: weight}
+        self._vocabulary: List[str] = []
+        self._next_user_id = self._next_movie_id = 1
+        # Only for its per-tag versions (data_version); reads need no cache.
+        self._versions = ResultCache(max_entries=0)
+        self._listeners = []
+        self._movie_listeners = []
+        self._recommender = None
+
+    # Change tracking, as in SQliteDataManager.
+
+    def add_listener(self, callback) -> None:
+        self._listeners.append(callback)
+
+    def add_movie_listener(self, callback) -> None:
+        self._movie_listeners.append(callback)
+
+    def _movies_stored(self, movies: Iterable[dict]) -> None:
+        for movie in movies:
+            for callback in self._movie_listeners:
+                callback(movie)
+
+    def notify_written(self, tags, movies: Iterable[dict] = (),
+                       ratings: Iterable[tuple] = ()) -> None:
+        self._changed(tags)
+        self._movies_stored(movies)
+        self._rated(list(ratings))
+
+    def _changed(self, tags) -> None:
+        tags = set(tags)
+        self._versions.invalidate(tags)
+        for callback in self._listeners:
+            callback(tags)
+
+    def invalidate(self, tags) -> None:
+        tags = set(tags)
+        if ALL in tags or any(tag.startswith("user_movies:") for tag in tags):
+            self._recommender = None
+        self._changed(tags)
+
+    def data_version(self, tags) -> str:
+        return self._versions.version(tags)
+
+    # Users.
+
+    @property
+    def users(self) -> List[UserRecord]:
+        with self._lock:
+            return list(self._users.values())
+
+    def get_user(self, user_id: int) -> UserRecord | None:
+        return self._users.get(user_id)
+
+    def add_user(self, user) -> None:
+        with self._lock:
+            user_id = user.id if user.id is not None else self._next_user_id
+            if user_id in self._users:
+                raise ValueError(f"User {user_id} exists")
+            self._next_user_id = max(self._next_user_id, user_id + 1)
+            self._users[user_id] = UserRecord(user_id, user.name)
+            bisect.insort(self._user_keys["name"], _sort_key(user.name, user_id))
+            user.id = user_id
+        self._changed(["users", f"user:{user_id}"])
+
+    def list_users(self, limit: int = DEFAULT_PAGE_SIZE, after: str | None = None,
+                   sort: str = "name") -> Page:
+        with self._lock:
+            return self._paginate(self._users, self._user_keys, USER_SORTS, sort, limit, after)
+
+    # Movies.
+
+    @property
+    def movies(self) -> List[MovieRecord]:
+        with self._lock:
+            return list(self._movies.values())
+
+    def list_movies(self, limit: int = DEFAULT_PAGE_SIZE, after: str | None = None,
+                    sort: str = "name", director: str | None = None,
+                    year_min: int | None = None, year_max: int | None = None) -> Page:
+        def accept(movie: MovieRecord) -> bool:
+            if director and (movie.director is None or
+                             director.lower() not in movie.director.lower()):
+                return False
+            if year_min is not None and (movie.year is None or movie.year < year_min):
+                return False
+            if year_max is not None and (movie.year is None or movie.year > year_max):
+                return False
+            return True
+
+        with self._lock:
+            return self._paginate(self._movies, self._movie_keys, MOVIE_SORTS, sort, limit,
+                                  after, accept)
+
+    @staticmethod
+    def _paginate(records: dict, keys: dict, sorts: dict, sort: str, limit: int | None,
+                  after: str | None, accept=None) -> Page:
+        """
+        Keyset pagination over the sorted keys of a sort: bisect to the cursor, then
+        walk until limit + 1 accepted records.
+        """
+        name, descending = parse_sort(sort, sorts)
+        keys = keys[name]
+        limit = clamp_limit(limit)
+        if descending:
+            position = len(keys)
+        else:
+            position = 0
+        if after:
+            sort_value, row_id = decode_cursor(after)
+            try:
+                position = (bisect.bisect_left if descending else bisect.bisect_right)(
+                    keys, _sort_key(sort_value, row_id))
+            except TypeError:
+                raise ValueError(f"Invalid cursor: {after!r}")
+        indexes = range(position - 1, -1, -1) if descending else range(position, len(keys))
+        items = []
+        for i in indexes:
+            record = records[keys[i][2]]
+            if accept is None or accept(record):
+                items.append(record)
+                if len(items) > limit:
+                    break
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(getattr(items[-1], name), items[-1].id)
+        return Page(items=items, next_cursor=next_cursor)
+
+    def get_movie(self, movie_id: int) -> MovieRecord | None:
+        return self._movies.get(movie_id)
+
+    def search_movies(self, query: str, limit: int = 20, fuzzy: bool = True) -> List[MovieRecord]:
+        words = _words(query)
+        if not words:
+            return []
+        limit = clamp_limit(limit)
+        with self._lock:
+            ids = self._match_movie_ids([[(word, True)] for word in words], limit)
+            if fuzzy and len(ids) < limit:
+                similar = [self._similar_terms(word) for word in words]
+                if any(similar):
+                    groups = [[(word, True)] + [(term, False) for term in terms]
+                              for word, terms in zip(words, similar)]
+                    ids += [movie_id for movie_id in self._match_movie_ids(groups, limit)
+                            if movie_id not in ids][:limit - len(ids)]
+            return [self._movies[movie_id] for movie_id in ids]
+
+    def _match_movie_ids(self, groups: List[List[tuple]], limit: int) -> List[int]:
+        """
+        Ids of the best movies matching every group of alternative (term, is prefix)s.
+        """
+        scores = None
+        for group in groups:
+            group_scores = {}
+            for term, prefix in group:
+                if prefix:
+                    start = bisect.bisect_left(self._vocabulary, term)
+                    end = bisect.bisect_left(self._vocabulary, term + "\U0010ffff")
+                    words = self._vocabulary[start:end]
+                else:
+                    words = [term] if term in self._postings else []
+                for word in words:
+                    for movie_id, weight in self._postings[word].items():
+                        group_scores[movie_id] = max(group_scores.get(movie_id, 0), weight)
+            if scores is None:
+                scores = group_scores
+            else:
+                scores = {movie_id: score + group_scores[movie_id]
+                          for movie_id, score in scores.items() if movie_id in group_scores}
+            if not scores:
+                return []
+        return sorted(scores, key=lambda movie_id: (-scores[movie_id], movie_id))[:limit]
+
+    def _similar_terms(self, word: str, cutoff: float = 0.75) -> List[str]:
+        if len(word) < 3:
+            return []
+        candidates = []
+        for prefix in {word[:2], word[1] + word[0]}:
+            start = bisect.bisect_left(self._vocabulary, prefix)
+            end = bisect.bisect_left(self._vocabulary, prefix + "\U0010ffff")
+            candidates += self._vocabulary[start:end]
+        return difflib.get_close_matches(word, candidates, n=3, cutoff=cutoff)
+
+    def find_movie(self, title: str) -> MovieRecord | None:
+        ids = self._ids_by_name.get(title)
+        if ids:
+            return self._movies[min(ids)]
+        matches = self.search_movies(title, limit=1)
+        return matches[0] if matches else None
+
+    def add_pending_movie(self, movie_title: str) -> MovieRecord:
+        with self._lock:
+            movie = self._store_movie({"name": movie_title})
+        self._changed(["movies"])
+        return movie
+
+    def _store_movie(self, fields: dict) -> MovieRecord:
+        fields = movie_fields(fields)
+        movie = MovieRecord(self._next_movie_id, *(fields.get(name) for name in MOVIE_FIELDS))
+        self._next_movie_id += 1
+        self._index_movie(movie)
+        return movie
+
+    def _index_movie(self, movie: MovieRecord, insort=bisect.insort) -> None:
+        self._movies[movie.id] = movie
+        self._ids_by_name.setdefault(movie.name, set()).add(movie.id)
+        for name, keys in self._movie_keys.items():
+            insort(keys, _sort_key(getattr(movie, name), movie.id))
+        weights = Counter()
+        for word in _words(movie.name):
+            weights[word] = NAME_WEIGHT
+        for word in _words(movie.director):
+            weights[word] = max(weights[word], DIRECTOR_WEIGHT)
+        for word, weight in weights.items():
+            if word not in self._postings:
+                self._postings[word] = {}
+                insort(self._vocabulary, word)
+            self._postings[word][movie.id] = weight
+
+    def _unindex_movie(self, movie: MovieRecord) -> None:
+        del self._movies[movie.id]
+        ids = self._ids_by_name[movie.name]
+        ids.discard(movie.id)
+        if not ids:
+            del self._ids_by_name[movie.name]
+        for name, keys in self._movie_keys.items():
+            del keys[bisect.bisect_left(keys, _sort_key(getattr(movie, name), movie.id))]
+        for word in set(_words(movie.name)) | set(_words(movie.director)):
+            postings = self._postings[word]
+            postings.pop(movie.id, None)
+            if not postings:
+                del self._postings[word]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, word)]
+
+    def update_movie(self, movie_id: int, update_data: dict) -> MovieRecord | None:
+        with self._lock:
+            movie = self._movies.get(movie_id)
+            if movie is None:
+                return None
+            # Built (and checked) in full before any index changes.
+            updated = dataclasses.replace(movie, **movie_fields(update_data))
+            self._unindex_movie(movie)
+            self._index_movie(updated)
+            holders = list(self._holders.get(movie_id, ()))
+            if updated.director != movie.director:
+                for user_id in holders:
+                    self._count_director(user_id, movie.director, -1)
+                    self._count_director(user_id, updated.director, 1)
+        self._changed(["movies", *(f"user_movies:{user_id}" for user_id in holders)])
+        if "poster" in update_data:
+            self._movies_stored([update_data])
+        return updated
+
+    def delete_movies(self, movie_ids: Iterable[int]) -> int:
+        try:
+            movie_ids = list(dict.fromkeys(int(movie_id) for movie_id in movie_ids))
+        except (TypeError, ValueError):
+            raise ValueError("Movie ids must be integers")
+        holders = set()
+        deleted = 0
+        with self._lock:
+            for movie_id in movie_ids:
+                movie = self._movies.get(movie_id)
+                if movie is None:
+                    continue
+                for user_id in self._holders.pop(movie_id, ()):
+                    rating, user_rating = self._lists[user_id].pop(movie_id)
+                    self._count_user(user_id, movie, user_rating, -1)
+                    holders.add(user_id)
+                self._unindex_movie(movie)
+                deleted += 1
+        if deleted:
+            self._changed(["movies", *(f"user_movies:{user_id}" for user_id in holders)])
+            if self._recommender is not None:
+                for movie_id in movie_ids:
+                    self._recommender.remove_movie(movie_id)
+        return deleted
+
+    def load(self, table: str, rows: Iterable[dict]) -> int:
+        """
+        Bulk-load rows of a datamanager.transfer table ("users", "movies", then
+        "user_movies"), e.g. from transfer.export_rows(). Ids are kept, and the sorted
+        indexes are sorted once at the end rather than kept sorted row by row.
+        Returns how many rows were loaded.
+        """
+        count, tags = 0, [table]
+        with self._lock:
+            if table == "users":
+                for row in rows:
+                    self._users[row["id"]] = UserRecord(row["id"], row["name"])
+                    self._user_keys["name"].append(_sort_key(row["name"], row["id"]))
+                    self._next_user_id = max(self._next_user_id, row["id"] + 1)
+                    count += 1
+            elif table == "movies":
+                for row in rows:
+                    movie = MovieRecord(row["id"], *(row[name] for name in MOVIE_FIELDS))
+                    self._index_movie(movie, insort=list.append)
+                    self._next_movie_id = max(self._next_movie_id, row["id"] + 1)
+                    count += 1
+            elif table == "user_movies":
+                rows = [(row["user_id"], row["movie_id"], row["rating"], row["user_rating"])
+                        for row in rows]
+                if any(user_id not in self._users or movie_id not in self._movies
+                       for user_id, movie_id, _, _ in rows):
+                    raise ValueError("User or movie not found")
+                for entry in rows:
+                    self._set_entry(*entry)
+                count = len(rows)
+                tags = ["movies", *{f"user_movies:{row[0]}" for row in rows}]
+            else:
+                raise ValueError(f"Unknown table {table!r}")
+            for keys in (*self._user_keys.values(), *self._movie_keys.values()):
+                keys.sort()
+            self._vocabulary.sort()
+        self._recommender = None
+        self._changed(tags)
+        return count
+
+    # Lists and their aggregates.
+
+    def _count_director(self, user_id: int, director: str | None, sign: int) -> None:
+        if director:
+            counts = self._directors.setdefault(user_id, Counter())
+            counts[director] += sign
+            if counts[director] <= 0:
+                del counts[director]
+
+    def _count_user(self, user_id: int, movie: MovieRecord, user_rating: float | None,
+                    sign: int) -> None:
+        """
+        Add (sign 1) or remove (sign -1) a list entry to or from the user's and the
+        movie's aggregates, as the stats triggers do in SQLite.
+        """
+        rated = 1 if user_rating and user_rating > 0 else 0
+        rating = user_rating if rated else 0.0
+        stats = self._user_stats.setdefault(user_id, [0, 0, 0.0])
+        stats[0] += sign
+        stats[1] += sign * rated
+        stats[2] += sign * rating
+        if stats[0] <= 0:
+            del self._user_stats[user_id]
+        self._count_director(user_id, movie.director, sign)
+        movie = self._movies[movie.id]
+        old = movie.stats or MovieStatsRecord(0, 0, 0.0)
+        new = MovieStatsRecord(old.user_count + sign, old.rating_count + sign * rated,
+                               old.rating_sum + sign * rating)
+        self._movies[movie.id] = dataclasses.replace(
+            movie, stats=new if new.user_count > 0 else None)
+
+    def get_user_movies(self, user_id: int) -> List[UserMovieRecord]:
+        with self._lock:
+            return [UserMovieRecord(movie.id, movie.name, movie.director, movie.year,
+                                    movie.poster, entry[0])
+                    for movie, entry in ((self._movies[movie_id], entry) for movie_id, entry
+                                         in self._lists.get(user_id, {}).items())]
+
+    def set_user_movies_many(self, entries: Iterable[tuple]) -> int:
+        rows = [(entry[0], entry[1], entry[2], entry[3] if len(entry) > 3 else 0.0)
+                for entry in entries]
+        if not rows:
+            return 0
+        with self._lock:
+            if any(user_id not in self._users or movie_id not in self._movies
+                   for user_id, movie_id, _, _ in rows):
+                raise ValueError("User or movie not found")
+            for user_id, movie_id, rating, user_rating in rows:
+                self._set_entry(user_id, movie_id, rating, user_rating)
+        self._changed(["movies", *(f"user_movies:{row[0]}" for row in rows)])
+        self._rated([(user_id, movie_id, user_rating)
+                     for user_id, movie_id, _, user_rating in rows])
+        return len(rows)
+
+    def _set_entry(self, user_id: int, movie_id: int, rating, user_rating) -> None:
+        entries = self._lists.setdefault(user_id, {})
+        movie = self._movies[movie_id]
+        if movie_id in entries:
+            self._count_user(user_id, movie, entries[movie_id][1], -1)
+            entries[movie_id][:] = [rating, user_rating]
+        else:
+            entries[movie_id] = [rating, user_rating]
+            self._holders.setdefault(movie_id, set()).add(user_id)
+        self._count_user(user_id, movie, user_rating, 1)
+
+    def _rated(self, entries: List[tuple]) -> None:
+        model = self._recommender
+        if model is not None:
+            from datamanager.recommendations import implicit_rating
+            for user_id, movie_id, user_rating in entries:
+                model.update(user_id, movie_id, implicit_rating(user_rating))
+
+    def add_user_movies(self, user_id: int, titles: Iterable[str] = (),
+                        movie_ids: Iterable[int] = (), fetch: bool = True,
+                        workers: int = bulk_import.DEFAULT_WORKERS,
+                        client: OMDBClient | None = None) -> bulk_import.UserMoviesDiff:
+        unique = {}
+        for title in titles:
+            if title.strip():
+                unique.setdefault(normalize_title(title), title.strip())
+        titles = list(unique.values())
+        movie_ids = list(dict.fromkeys(movie_ids))
+        if len(titles) + len(movie_ids) > bulk_import.MAX_LIST_ADD:
+            raise ValueError(f"At most {bulk_import.MAX_LIST_ADD} titles and ids at once")
+        if user_id not in self._users:
+            raise ValueError("User not found")
+        diff = bulk_import.UserMoviesDiff()
+        chosen = []
+        with self._lock:
+            for movie_id in movie_ids:
+                if movie_id in self._movies:
+                    chosen.append(movie_id)
+                else:
+                    diff.not_found.append(movie_id)
+            missing = []
+            for title in titles:
+                if title in self._ids_by_name:
+                    chosen.append(min(self._ids_by_name[title]))
+                elif fetch:
+                    missing.append(title)
+                else:
+                    diff.not_found.append(title)
+        if client is None and missing:
+            client = OMDBClient()
+        fetched = bulk_import._fetch_all(client, missing, workers, diff)
+
+        new = []
+        with self._lock:
+            for _, fields in fetched:
+                if fields["name"] in self._ids_by_name:
+                    chosen.append(min(self._ids_by_name[fields["name"]]))
+                else:
+                    movie = self._store_movie(fields)
+                    diff.created.append(movie.id)
+                    chosen.append(movie.id)
+                    new.append(fields)
+            entries = self._lists.setdefault(user_id, {})
+            for movie_id in dict.fromkeys(chosen):
+                if movie_id in entries:
+                    diff.existing.append(movie_id)
+                    continue
+                movie = self._movies[movie_id]
+                self._set_entry(user_id, movie_id, movie.rating, 0.0)
+                diff.added.append({"id": movie.id, "name": movie.name, "year": movie.year,
+                                   "rating": movie.rating})
+
+        if diff.created or diff.added:
+            self._changed(["movies", f"user_movies:{user_id}"])
+            self._movies_stored(new)
+            self._rated([(user_id, row["id"], 0.0) for row in diff.added])
+        return diff
+
+    def get_movie_stats(self, movie_id: int) -> Dict[str, Any]:
+        movie = self._movies.get(movie_id)
+        if movie is None or movie.stats is None:
+            return {"user_count": 0, "rating_count": 0, "average_rating": None}
+        stats = movie.stats
+        return {"user_count": stats.user_count, "rating_count": stats.rating_count,
+                "average_rating": stats.average_rating}
+
+    def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        with self._lock:
+            stats = self._user_stats.get(user_id)
+            if stats is None:
+                return {"movie_count": 0, "rating_count": 0, "average_rating": None,
+                        "top_director": None}
+            directors = self._directors.get(user_id)
+            top_director = min(directors.items(), key=lambda item: (-item[1], item[0]))[0] \
+                if directors else None
+            return {"movie_count": stats[0], "rating_count": stats[1],
+                    "average_rating": stats[2] / stats[1] if stats[1] else None,
+                    "top_director": top_director}
+
+    def recommend_movies(self, user_id: int, limit: int = 10) -> List[MovieRecord]:
+        with self._lock:
+            if self._recommender is None:
+                from datamanager.recommendations import ItemSimilarityModel, implicit_rating
+                self._recommender = ItemSimilarityModel().fit(
+                    (holder, movie_id, implicit_rating(entry[1]))
+                    for holder, entries in self._lists.items()
+                    for movie_id, entry in entries.items())
+            scores = dict(self._recommender.recommend(user_id, limit))
+            movies = [self._movies[movie_id] for movie_id in scores if movie_id in self._movies]
+        return sorted(movies, key=lambda movie: -scores[movie.id])
@@ -0,0 +1,190 @@
+import argparse
+from typing import Callable, List, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Connection, Engine
+
+from data_models import Base, Change, Job, MovieDeletion
+from datamanager import stats
+from datamanager.records import movie_fields
+from movie_api import normalize_title
+
+# Base.metadata.create_all only creates missing tables, it never changes a table
+# that already exists in an older movie_app.db. Each migration brings such a
+# database one version forward; the version lives in PRAGMA user_version.
+# Every step must also be a no-op on a database freshly created from the models.
+# ensure_schema() only reads the version when the database is up to date.
+
+
+def _add_lookup_indexes(conn: Connection) -> None:
+    # Drop duplicate user/movie pairs (keeping the latest) so the unique index can be built.
+    conn.exec_driver_sql(
+        "DELETE FROM user_movies WHERE id NOT IN "
+        "(SELECT MAX(id) FROM user_movies GROUP BY user_id, movie_id)")
+    conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ix_user_movies_user_id_movie_id "
+                         "ON user_movies (user_id, movie_id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_user_movies_movie_id "
+                         "ON user_movies (movie_id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_movies_name ON movies (name)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_movies_year ON movies (year)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_movies_rating ON movies (rating)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_users_name ON users (name)")
+
+
+def _add_movie_search(conn: Connection) -> None:
+    # Word index for ranked prefix search over name and director.
+    conn.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5("
+        "name, director, content='movies', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+    # The distinct words of that index, looked up to correct typos in queries.
+    conn.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts_terms USING fts5vocab(movies_fts, 'row')")
+    # Keep the index in sync with the movies table.
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS movies_fts_insert AFTER INSERT ON movies BEGIN "
+        "INSERT INTO movies_fts (rowid, name, director) VALUES (new.id, new.name, new.director); "
+        "END")
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS movies_fts_delete AFTER DELETE ON movies BEGIN "
+        "INSERT INTO movies_fts (movies_fts, rowid, name, director) "
+        "VALUES ('delete', old.id, old.name, old.director); "
+        "END")
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS movies_fts_update AFTER UPDATE OF name, director "
+        "ON movies BEGIN "
+        "INSERT INTO movies_fts (movies_fts, rowid, name, director) "
+        "VALUES ('delete', old.id, old.name, old.director); "
+        "INSERT INTO movies_fts (rowid, name, director) VALUES (new.id, new.name, new.director); "
+        "END")
+    # Index the movies that already exist.
+    conn.exec_driver_sql("INSERT INTO movies_fts (movies_fts) VALUES ('rebuild')")
+
+
+def _add_stats(conn: Connection) -> None:
+    # The tables themselves come from the models; fill them and keep them up to date.
+    stats.create_triggers(conn)
+    stats.rebuild(conn)
+
+
+def _add_jobs(conn: Connection) -> None:
+    Job.__table__.create(conn, checkfirst=True)
+
+
+def _add_bulk_movie_deletes(conn: Connection) -> None:
+    MovieDeletion.__table__.create(conn, checkfirst=True)
+    # The delete trigger now skips the rows of movies deleted in bulk.
+    conn.exec_driver_sql("DROP TRIGGER IF EXISTS user_movies_stats_delete")
+    stats.create_triggers(conn)
+
+
+def _add_lower_name_index(conn: Connection) -> None:
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_movies_name_lower ON movies (lower(name))")
+
+
+def _add_change_log(conn: Connection) -> None:
+    Change.__table__.create(conn, checkfirst=True)
+
+
+def _drop_job_change_seq(conn: Connection) -> None:
+    # Superseded by the change log. SQLite won't drop an indexed column.
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_jobs_change_seq")
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(jobs)")}
+    if "change_seq" in columns:
+        conn.exec_driver_sql("ALTER TABLE jobs DROP COLUMN change_seq")
+
+
+def _add_movie_name_key(conn: Connection) -> None:
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(movies)")}
+    if "name_key" not in columns:
+        conn.exec_driver_sql("ALTER TABLE movies ADD COLUMN name_key VARCHAR")
+    rows = conn.exec_driver_sql(
+        "SELECT id, name FROM movies WHERE name_key IS NULL AND name IS NOT NULL").all()
+    if rows:
+        conn.exec_driver_sql("UPDATE movies SET name_key = ? WHERE id = ?",
+                             [(normalize_title(name), movie_id) for movie_id, name in rows])
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_movies_name_key ON movies (name_key)")
+    # SQLite's lower() only folds ASCII, which is why the key replaces this index.
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_movies_name_lower")
+
+
+def _convert_omdb_strings(conn: Connection) -> None:
+    # Rows stored before movie_fields() kept OMDb's strings ("1999", "8.7", "N/A").
+    for table, key, columns in [("movies", "id", ("year", "rating")),
+                                ("user_movies", "id", ("rating",))]:
+        for column in columns:
+            rows = conn.exec_driver_sql(
+                f"SELECT {key}, {column} FROM {table} WHERE typeof({column}) = 'text'").all()
+            if rows:
+                conn.exec_driver_sql(
+                    f"UPDATE {table} SET {column} = ? WHERE {key} = ?",
+                    [(movie_fields({column: value})[column], row_id) for row_id, value in rows])
+
+
+# (version, description, step) in the order they must be applied.
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "lookup indexes and unique user/movie pairs", _add_lookup_indexes),
+    (2, "full-text movie search", _add_movie_search),
+    (3, "aggregate statistics per movie and user", _add_stats),
+    (4, "background job queue", _add_jobs),
+    (5, "set-based movie deletes", _add_bulk_movie_deletes),
+    (6, "case-insensitive movie name index", _add_lower_name_index),
+    (7, "cross-process change log", _add_change_log),
+    (8, "drop the jobs' unused change_seq", _drop_job_change_seq),
+    (9, "normalized movie name key", _add_movie_name_key),
+    (10, "numeric year and rating", _convert_omdb_strings),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn: Connection) -> int:
+    """
+    The schema version recorded in the database (0 for a database that was never migrated).
+    """
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrate(engine: Engine) -> int:
+    """
+    Apply every pending migration. Returns the resulting schema version.
+    """
+    with engine.connect() as conn:
+        current = schema_version(conn)
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+        current = version
+    return current
+
+
+def ensure_schema(engine: Engine) -> int:
+    """
+    Bring a database to the latest schema: one PRAGMA when it is there already,
+    else create the missing tables and apply the pending migrations.
+    Returns the schema version.
+    """
+    with engine.connect() as conn:
+        version = schema_version(conn)
+    if version >= LATEST_VERSION:
+        return version
+    Base.metadata.create_all(engine)
+    return migrate(engine)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upgrade a database to the latest schema.")
+    parser.add_argument("--db", default="sqlite:///movie_app.db", help="database URL")
+    args = parser.parse_args(argv)
+    engine = create_engine(args.db)
+    with engine.connect() as conn:
+        before = schema_version(conn)
+    after = ensure_schema(engine)
+    print(f"schema version {before} -> {after}")
+
+
+if __name__ == "__main__":
+    main()
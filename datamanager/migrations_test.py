@@ -0,0 +1,167 @@
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from datamanager import migrations
+from datamanager.sqlite_data_manager import SQliteDataManager
+from data_models import UserMovie
+
+# The schema as created by the first release, before any migration existed.
+LEGACY_SCHEMA = """
+CREATE TABLE users (id INTEGER NOT NULL, name VARCHAR, PRIMARY KEY (id));
+CREATE TABLE movies (id INTEGER NOT NULL, name VARCHAR, director VARCHAR, year INTEGER,
+                     poster VARCHAR, rating FLOAT, PRIMARY KEY (id));
+CREATE TABLE user_movies (id INTEGER NOT NULL, user_id INTEGER, movie_id INTEGER, rating FLOAT,
+                          user_rating FLOAT, PRIMARY KEY (id),
+                          FOREIGN KEY(user_id) REFERENCES users (id),
+                          FOREIGN KEY(movie_id) REFERENCES movies (id));
+"""
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """
+    Fixture for a database file in the legacy schema, with duplicate user/movie rows.
+    """
+    path = tmp_path / "movie_app.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.execute("INSERT INTO users (id, name) VALUES (1, 'Alice')")
+    conn.execute("INSERT INTO movies (id, name) VALUES (1, 'Heat'), (2, 'Alien')")
+    conn.executemany("INSERT INTO user_movies (user_id, movie_id, rating) VALUES (?, ?, ?)",
+                     [(1, 1, 5.0), (1, 1, 7.0), (1, 2, 6.0)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _index_names(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    finally:
+        conn.close()
+
+
+def test_migrate_legacy_database(legacy_db):
+    """Test that opening a legacy database adds the indexes in place and drops duplicates."""
+    data_manager = SQliteDataManager(f"sqlite:///{legacy_db}")
+    assert {"ix_movies_name", "ix_users_name", "ix_user_movies_user_id_movie_id",
+            "ix_user_movies_movie_id"} <= _index_names(legacy_db)
+    with data_manager.engine.connect() as conn:
+        assert migrations.schema_version(conn) == migrations.LATEST_VERSION
+    user_movies = data_manager.get_user_movies(1)
+    assert [(movie["name"], movie["rating"]) for movie in user_movies] == \
+        [("Heat", 7.0), ("Alien", 6.0)]
+
+
+def test_main_upgrades_legacy_database(legacy_db, capsys):
+    """Test that the command line upgrade creates the tables later versions rely on."""
+    migrations.main(["--db", f"sqlite:///{legacy_db}"])
+    assert capsys.readouterr().out == f"schema version 0 -> {migrations.LATEST_VERSION}\n"
+    assert SQliteDataManager(f"sqlite:///{legacy_db}").get_movie_stats(1)["user_count"] == 1
+
+
+def test_unused_job_column_is_dropped(tmp_path):
+    """Test that a version 7 database loses jobs.change_seq and its index."""
+    path = tmp_path / "movie_app.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.execute("CREATE TABLE jobs (id INTEGER PRIMARY KEY, change_seq INTEGER)")
+    conn.execute("CREATE INDEX ix_jobs_change_seq ON jobs (change_seq)")
+    conn.execute("PRAGMA user_version = 7")
+    conn.close()
+    migrations.main(["--db", f"sqlite:///{path}"])
+    conn = sqlite3.connect(path)
+    assert "change_seq" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+    conn.close()
+    assert "ix_jobs_change_seq" not in _index_names(path)
+
+
+def test_legacy_movies_get_name_keys(legacy_db):
+    """Test that existing movies get their normalized name key."""
+    conn = sqlite3.connect(legacy_db)
+    conn.execute("UPDATE movies SET name = 'Amélie  Poulain' WHERE id = 2")
+    conn.commit()
+    conn.close()
+    data_manager = SQliteDataManager(f"sqlite:///{legacy_db}")
+    with data_manager.engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT name_key FROM movies ORDER BY id").all() == [
+            ("heat",), ("amélie poulain",)]
+    assert "ix_movies_name_key" in _index_names(legacy_db)
+
+
+def test_omdb_strings_become_numbers(legacy_db):
+    """Test that year and rating strings stored by older versions are converted."""
+    conn = sqlite3.connect(legacy_db)
+    conn.execute("UPDATE movies SET year = '1995', rating = '8.3' WHERE id = 1")
+    conn.execute("UPDATE movies SET year = '2005–2013', rating = 'N/A' WHERE id = 2")
+    conn.execute("UPDATE user_movies SET rating = 'N/A' WHERE movie_id = 2")
+    conn.commit()
+    conn.close()
+    data_manager = SQliteDataManager(f"sqlite:///{legacy_db}")
+    assert [(movie.year, movie.rating) for movie in data_manager.list_movies(sort="year").items] \
+        == [(1995, 8.3), (2005, None)]
+    assert [movie.rating for movie in data_manager.get_user_movies(1)] == [7.0, None]
+
+
+def test_duplicate_pairs_are_rejected(legacy_db):
+    """Test that the unique index stops duplicate user/movie rows."""
+    data_manager = SQliteDataManager(f"sqlite:///{legacy_db}")
+    with pytest.raises(IntegrityError):
+        with data_manager.get_db() as db:
+            db.add(UserMovie(user_id=1, movie_id=2, rating=1.0))
+
+
+def test_migrate_is_idempotent(legacy_db):
+    """Test that migrating an up-to-date database does nothing."""
+    SQliteDataManager(f"sqlite:///{legacy_db}")
+    data_manager = SQliteDataManager(f"sqlite:///{legacy_db}")
+    assert migrations.migrate(data_manager.engine) == migrations.LATEST_VERSION
+
+
+def test_legacy_movies_are_searchable(legacy_db):
+    """Test that the search index is built for movies that existed before the migration."""
+    data_manager = SQliteDataManager(f"sqlite:///{legacy_db}")
+    assert [movie.name for movie in data_manager.search_movies("ali")] == ["Alien"]
+
+
+def test_lookups_use_indexes(legacy_db):
+    """Test that the hot lookups are index searches rather than table scans."""
+    SQliteDataManager(f"sqlite:///{legacy_db}")
+    conn = sqlite3.connect(legacy_db)
+    queries = ["SELECT id FROM movies WHERE name = 'Heat'",
+               "SELECT name FROM movies WHERE lower(name) IN ('heat', 'alien')",
+               "SELECT id FROM users WHERE name = 'Alice'",
+               "SELECT id FROM user_movies WHERE user_id = 1 AND movie_id = 2"]
+    for query in queries:
+        plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + query))
+        assert "USING" in plan and "INDEX" in plan, plan
+    conn.close()
+
+
+def test_legacy_stats_are_built(legacy_db):
+    """Test that aggregate stats are computed for ratings that existed before the migration."""
+    data_manager = SQliteDataManager(f"sqlite:///{legacy_db}")
+    assert data_manager.get_movie_stats(1)["user_count"] == 1
+    assert data_manager.get_user_stats(1)["movie_count"] == 2
+
+
+def test_up_to_date_schema_is_only_probed(tmp_path):
+    """Test that opening a current database costs one PRAGMA, and a version 3 one gets jobs."""
+    from sqlalchemy import event
+    url = f"sqlite:///{tmp_path / 'movie_app.db'}"
+    data_manager = SQliteDataManager(url)
+    with data_manager.engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE jobs")
+        conn.exec_driver_sql("PRAGMA user_version = 3")
+    assert migrations.ensure_schema(data_manager.engine) == migrations.LATEST_VERSION
+    assert "ix_jobs_status_run_at" in _index_names(tmp_path / "movie_app.db")
+
+    statements = []
+    event.listen(data_manager.engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    migrations.ensure_schema(data_manager.engine)
+    assert statements == ["PRAGMA user_version"]
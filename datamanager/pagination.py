@@ -0,0 +1,79 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import Any, List
+
+from sqlalchemy import and_, or_
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+@dataclass
+class Page:
+    """
+    One page of a keyset-paginated listing. next_cursor is None on the last page.
+    """
+    items: List[Any]
+    next_cursor: str | None = None
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """
+    Encode the sort key of the last row on a page into an opaque cursor.
+    """
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[Any, int]:
+    """
+    Decode a cursor made by encode_cursor. Raises ValueError if it is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if not isinstance(row_id, int):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return sort_value, row_id
+
+
+def parse_sort(sort: str, columns: dict) -> tuple[str, bool]:
+    """
+    Split a sort parameter such as "year" or "-rating" into (column name, descending).
+    """
+    descending = sort.startswith("-")
+    name = sort.lstrip("-")
+    if name not in columns:
+        raise ValueError(f"Cannot sort by {sort!r}, choose one of {sorted(columns)}")
+    return name, descending
+
+
+def keyset_filter(column, id_column, sort_value: Any, row_id: int, descending: bool):
+    """
+    WHERE clause selecting the rows after (sort_value, row_id) in ORDER BY column, id.
+
+    SQLite sorts NULLs first ascending and last descending, so NULL sort values
+    get their own branch. Plain comparisons keep an index on (column) usable.
+    """
+    if not descending:
+        if sort_value is None:
+            return or_(and_(column.is_(None), id_column > row_id), column.is_not(None))
+        return or_(column > sort_value, and_(column == sort_value, id_column > row_id))
+    if sort_value is None:
+        return and_(column.is_(None), id_column < row_id)
+    return or_(column < sort_value, and_(column == sort_value, id_column < row_id),
+               column.is_(None))
+
+
+def clamp_limit(limit: int | None) -> int:
+    """
+    Keep a requested page size within 1..MAX_PAGE_SIZE.
+    """
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
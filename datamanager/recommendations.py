@@ -0,0 +1,266 @@
+import threading
+import time
+from typing import Iterable, List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+
+DEFAULT_NEIGHBOURS = 50
+DEFAULT_BLOCK_SIZE = 256
+DEFAULT_MERGE_THRESHOLD = 1000
+DEFAULT_MAX_STALENESS = 30.0  # seconds
+
+
+def implicit_rating(user_rating: float | None) -> float:
+    """
+    The matrix value for a user_movies row. The app doesn't ask for explicit
+    ratings (user_rating defaults to 0.0), so having a movie on the list counts as 1.
+    """
+    return float(user_rating) if user_rating else 1.0
+
+
+class ItemSimilarityModel:
+    """
+    Item-item collaborative filtering over a sparse users x movies rating matrix.
+
+    Similarity is the cosine between movie columns. Only the `neighbours` most
+    similar movies are kept per movie, so the model is O(movies * neighbours)
+    on top of the O(ratings) matrix, however dense the co-rating graph gets.
+
+    Writes are cheap: a changed rating is patched into the matrix in place, a new
+    one goes to a small pending buffer, and the movie is marked dirty. Dirty
+    movies get their neighbours recomputed in one batch once merge_threshold
+    writes have piled up, or max_staleness seconds after the first of them,
+    never per request. A user's own new ratings are visible immediately.
+    """
+
+    def __init__(self, neighbours: int = DEFAULT_NEIGHBOURS, block_size: int = DEFAULT_BLOCK_SIZE,
+                 merge_threshold: int = DEFAULT_MERGE_THRESHOLD,
+                 max_staleness: float = DEFAULT_MAX_STALENESS, clock=time.monotonic):
+        self.neighbours = neighbours
+        self.block_size = block_size
+        self.merge_threshold = merge_threshold
+        self.max_staleness = max_staleness
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._user_index: dict[int, int] = {}
+        self._item_index: dict[int, int] = {}
+        self._item_ids: list[int] = []
+        self._matrix = sp.csr_matrix((0, 0), dtype=np.float32)
+        self._pending: dict[tuple[int, int], float] = {}
+        self._pending_by_user: dict[int, dict[int, float]] = {}
+        self._dirty: set[int] = set()
+        self._dirty_since: float | None = None
+        self._removed: set[int] = set()
+        self._neighbour_ids = np.full((0, self.neighbours), -1, dtype=np.int32)
+        self._neighbour_sims = np.zeros((0, self.neighbours), dtype=np.float32)
+
+    def fit(self, ratings: Iterable[Tuple[int, int, float]]) -> "ItemSimilarityModel":
+        """
+        Build the model from scratch from (user_id, movie_id, value) triples.
+        """
+        with self._lock:
+            self._reset()
+            rows, cols, values = [], [], []
+            for user_id, movie_id, value in ratings:
+                rows.append(self._user(user_id))
+                cols.append(self._item(movie_id))
+                values.append(value)
+            self._matrix = self._build(rows, cols, values)
+            self._grow()
+            self._compute_neighbours(np.arange(len(self._item_ids)), symmetric=False)
+        return self
+
+    def update(self, user_id: int, movie_id: int, value: float) -> None:
+        """
+        Record that user_id rated movie_id with value.
+        """
+        with self._lock:
+            u, i = self._user(user_id), self._item(movie_id)
+            self._removed.discard(i)
+            if u < self._matrix.shape[0] and i < self._matrix.shape[1]:
+                start, end = self._matrix.indptr[u], self._matrix.indptr[u + 1]
+                pos = start + np.searchsorted(self._matrix.indices[start:end], i)
+                if pos < end and self._matrix.indices[pos] == i:
+                    self._matrix.data[pos] = value
+                    self._mark_dirty(i)
+                    return
+            self._pending[(u, i)] = value
+            self._pending_by_user.setdefault(u, {})[i] = value
+            self._mark_dirty(i)
+
+    def rated_movies(self, user_id: int) -> set:
+        """
+        The ids of the movies user_id has rated, pending ratings included.
+        """
+        with self._lock:
+            u = self._user_index.get(user_id)
+            if u is None:
+                return set()
+            return {self._item_ids[i] for i in self._user_ratings(u)[0].tolist()}
+
+    def remove_movie(self, movie_id: int) -> None:
+        """
+        Never recommend movie_id again (e.g. it was deleted). Its ratings stay in
+        the matrix until the next fit().
+        """
+        with self._lock:
+            i = self._item_index.get(movie_id)
+            if i is not None:
+                self._removed.add(i)
+
+    def refresh(self) -> None:
+        """
+        Merge pending ratings into the matrix and recompute dirty movies' neighbours.
+        """
+        with self._lock:
+            if self._pending:
+                coo = self._matrix.tocoo()
+                keys = np.array(list(self._pending), dtype=np.int64)
+                values = np.fromiter(self._pending.values(), dtype=np.float32)
+                self._matrix = self._build(np.concatenate([coo.row, keys[:, 0]]),
+                                           np.concatenate([coo.col, keys[:, 1]]),
+                                           np.concatenate([coo.data, values]))
+                self._pending.clear()
+                self._pending_by_user.clear()
+            if self._dirty:
+                self._grow()
+                self._compute_neighbours(np.fromiter(self._dirty, dtype=np.int64),
+                                         symmetric=True)
+                self._dirty.clear()
+            self._dirty_since = None
+
+    def recommend(self, user_id: int, n: int = 10) -> List[Tuple[int, float]]:
+        """
+        Up to n (movie_id, score) pairs the user hasn't rated, best first: the sum of
+        the user's ratings of each candidate's neighbours, weighted by similarity.
+        """
+        with self._lock:
+            if self._dirty_since is not None and \
+                    self._clock() - self._dirty_since >= self.max_staleness:
+                self.refresh()
+            u = self._user_index.get(user_id)
+            if u is None:
+                return []
+            items, values = self._user_ratings(u)
+            known = items < len(self._neighbour_ids)
+            if not known.any():
+                return []
+            neighbour_ids = self._neighbour_ids[items[known]]
+            weights = self._neighbour_sims[items[known]] * values[known, None]
+            filled = neighbour_ids >= 0
+            scores = np.bincount(neighbour_ids[filled], weights=weights[filled],
+                                 minlength=len(self._neighbour_ids))
+            scores[items[known]] = 0
+            if self._removed:
+                scores[list(self._removed)] = 0
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > n:
+                candidates = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [(self._item_ids[i], float(scores[i])) for i in candidates]
+
+    def nbytes(self) -> int:
+        """
+        Approximate memory held by the arrays of the model.
+        """
+        return (self._matrix.data.nbytes + self._matrix.indices.nbytes +
+                self._matrix.indptr.nbytes + self._neighbour_ids.nbytes +
+                self._neighbour_sims.nbytes)
+
+    def _user(self, user_id: int) -> int:
+        return self._user_index.setdefault(user_id, len(self._user_index))
+
+    def _item(self, movie_id: int) -> int:
+        i = self._item_index.get(movie_id)
+        if i is None:
+            i = self._item_index[movie_id] = len(self._item_ids)
+            self._item_ids.append(movie_id)
+        return i
+
+    def _build(self, rows, cols, values) -> sp.csr_matrix:
+        matrix = sp.csr_matrix(
+            (np.asarray(values, dtype=np.float32),
+             (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+            shape=(len(self._user_index), len(self._item_ids)))
+        matrix.sum_duplicates()  # also sorts the indices, which update() relies on
+        return matrix
+
+    def _mark_dirty(self, i: int) -> None:
+        self._dirty.add(i)
+        if self._dirty_since is None:
+            self._dirty_since = self._clock()
+        if len(self._pending) >= self.merge_threshold or len(self._dirty) >= self.merge_threshold:
+            self.refresh()
+
+    def _grow(self) -> None:
+        # Movies added since the last refresh get empty neighbour lists (-1 slots).
+        missing = len(self._item_ids) - len(self._neighbour_ids)
+        if missing > 0:
+            self._neighbour_ids = np.vstack(
+                [self._neighbour_ids, np.full((missing, self.neighbours), -1, dtype=np.int32)])
+            self._neighbour_sims = np.vstack(
+                [self._neighbour_sims, np.zeros((missing, self.neighbours), dtype=np.float32)])
+
+    def _user_ratings(self, u: int) -> tuple[np.ndarray, np.ndarray]:
+        ratings = {}
+        if u < self._matrix.shape[0]:
+            start, end = self._matrix.indptr[u], self._matrix.indptr[u + 1]
+            ratings = dict(zip(self._matrix.indices[start:end].tolist(),
+                               self._matrix.data[start:end].tolist()))
+        ratings.update(self._pending_by_user.get(u, {}))
+        return (np.fromiter(ratings.keys(), dtype=np.int64, count=len(ratings)),
+                np.fromiter(ratings.values(), dtype=np.float32, count=len(ratings)))
+
+    def _compute_neighbours(self, items: np.ndarray, symmetric: bool) -> None:
+        """
+        Recompute the top-k neighbour lists of the given movie indexes, a block of
+        movies at a time so that the similarity rows in flight stay bounded.
+        With symmetric=True the new similarities are also patched into the other
+        movies' lists (used for incremental updates, where those aren't recomputed).
+        """
+        matrix = self._matrix
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+        inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        normalized = (matrix @ sp.diags(inverse.astype(np.float32))).tocsr()
+        transposed = normalized.T.tocsr()
+        k = self.neighbours
+        for start in range(0, len(items), self.block_size):
+            block = items[start:start + self.block_size]
+            similarities = (transposed[block] @ normalized).tocsr()
+            for row, i in enumerate(block):
+                lo, hi = similarities.indptr[row], similarities.indptr[row + 1]
+                others = similarities.indices[lo:hi]
+                sims = similarities.data[lo:hi]
+                keep = (others != i) & (sims > 0)
+                others, sims = others[keep], sims[keep]
+                if len(others) > k:
+                    top = np.argpartition(-sims, k - 1)[:k]
+                    top_others, top_sims = others[top], sims[top]
+                else:
+                    top_others, top_sims = others, sims
+                self._neighbour_ids[i] = -1
+                self._neighbour_sims[i] = 0
+                self._neighbour_ids[i, :len(top_others)] = top_others
+                self._neighbour_sims[i, :len(top_sims)] = top_sims
+                if symmetric and len(others):
+                    self._patch_reverse(i, others, sims)
+
+    def _patch_reverse(self, i: int, others: np.ndarray, sims: np.ndarray) -> None:
+        lists = self._neighbour_ids[others]
+        present = lists == i
+        has = present.any(axis=1)
+        # Movies already listing i: refresh the similarity in place.
+        rows, slots = np.nonzero(present)
+        self._neighbour_sims[others[rows], slots] = sims[rows]
+        # Others: i replaces their weakest neighbour if it is now more similar.
+        rest = np.flatnonzero(~has)
+        weakest = np.argmin(self._neighbour_sims[others[rest]], axis=1)
+        better = sims[rest] > self._neighbour_sims[others[rest], weakest]
+        targets, slots = others[rest][better], weakest[better]
+        self._neighbour_ids[targets, slots] = i
+        self._neighbour_sims[targets, slots] = sims[rest][better]
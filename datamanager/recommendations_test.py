@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from datamanager.recommendations import ItemSimilarityModel, implicit_rating
+from datamanager.sqlite_data_manager import SQliteDataManager
+from data_models import User, Movie
+
+# Users 1 and 2 both have movies 10 and 20; 30 is only liked by user 4 with 40.
+RATINGS = [(1, 10, 1.0), (1, 20, 1.0), (2, 10, 1.0), (2, 20, 1.0), (3, 10, 1.0),
+           (4, 30, 1.0), (4, 40, 1.0)]
+
+
+def test_recommends_co_rated_movies():
+    """Test that a user gets the movies rated together with theirs, minus their own."""
+    model = ItemSimilarityModel().fit(RATINGS)
+    assert [movie_id for movie_id, _ in model.recommend(3)] == [20]
+    assert model.recommend(99) == []
+
+
+def test_own_ratings_apply_immediately():
+    """Test that a new rating is excluded from the user's recommendations before any refresh."""
+    model = ItemSimilarityModel(max_staleness=3600).fit(RATINGS)
+    model.update(3, 20, 1.0)
+    assert model.recommend(3) == []
+
+
+def test_incremental_updates_match_full_fit():
+    """Test that updating the model write by write ends up where a fit from scratch does."""
+    rng = random.Random(7)
+    ratings = {(rng.randrange(30), rng.randrange(40)): float(rng.randint(1, 5))
+               for _ in range(300)}
+    items = list(ratings.items())
+    # Large enough neighbour lists that nothing is pruned, so the two must agree exactly.
+    incremental = ItemSimilarityModel(neighbours=40, merge_threshold=25)
+    incremental.fit((u, m, r) for (u, m), r in items[:150])
+    for (u, m), r in items[150:]:
+        incremental.update(u, m, r)
+    for (u, m), r in items[:20]:  # re-rate some existing entries in place
+        ratings[(u, m)] = r + 1
+        incremental.update(u, m, r + 1)
+    incremental.refresh()
+    full = ItemSimilarityModel(neighbours=40).fit((u, m, r) for (u, m), r in ratings.items())
+    for user_id in range(30):
+        expected = full.recommend(user_id, 5)
+        actual = incremental.recommend(user_id, 5)
+        assert [m for m, _ in actual] == [m for m, _ in expected]
+        assert [s for _, s in actual] == pytest.approx([s for _, s in expected], rel=1e-4)
+
+
+def test_memory_is_bounded_by_neighbours():
+    """Test that only the top-k neighbours of each movie are kept."""
+    ratings = [(u, m, 1.0) for u in range(20) for m in range(50)]
+    model = ItemSimilarityModel(neighbours=5).fit(ratings)
+    assert model._neighbour_ids.shape == (50, 5)
+    assert len(model.recommend(0)) == 0
+    assert len(model.recommend(99)) == 0
+
+
+def test_stale_neighbours_refresh_after_max_staleness():
+    """Test that dirty movies are recomputed lazily once max_staleness has passed."""
+    now = [0.0]
+    model = ItemSimilarityModel(max_staleness=10, clock=lambda: now[0]).fit(RATINGS)
+    model.update(5, 10, 1.0)
+    model.update(5, 50, 1.0)
+    assert 50 not in dict(model.recommend(3))
+    now[0] = 11
+    assert 50 in dict(model.recommend(3))
+
+
+def test_data_manager_recommendations():
+    """Test recommendations through the data manager, including updates and deletes."""
+    data_manager = SQliteDataManager("sqlite:///:memory:")
+    with data_manager.SessionFactory() as session:
+        session.add_all([User(name=name) for name in ("Ann", "Bob", "Cy")])
+        session.add_all([Movie(name=name) for name in ("Heat", "Thief", "Collateral")])
+        session.commit()
+    data_manager.set_user_movies_many([(1, 1, 8.0), (1, 2, 7.0), (2, 1, 8.0)])
+    assert [movie.name for movie in data_manager.recommend_movies(2)] == ["Thief"]
+    data_manager.set_user_movies_many([(1, 3, 9.0)])
+    data_manager._recommender.refresh()
+    assert {movie.name for movie in data_manager.recommend_movies(2)} == {"Thief", "Collateral"}
+    data_manager.delete_movie(2)
+    assert [movie.name for movie in data_manager.recommend_movies(2)] == ["Collateral"]
+    assert implicit_rating(0.0) == 1.0 and implicit_rating(4.0) == 4.0
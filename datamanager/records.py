@@ -0,0 +1,98 @@
+import re
+from dataclasses import dataclass, fields
+
+# Immutable rows for listings, built straight from Core select() results: no session,
+# identity map or attribute instrumentation, nothing lazy to load after the fact, and
+# safe to share between threads through the query cache. Fields can also be read
+# like dict keys (record["name"]), as get_user_movies() returned dicts before.
+
+
+class _Record:
+    __slots__ = ()
+
+    def __getitem__(self, name: str):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name)
+
+    def asdict(self) -> dict:
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+
+@dataclass(frozen=True, slots=True)
+class UserRecord(_Record):
+    id: int
+    name: str | None
+
+
+@dataclass(frozen=True, slots=True)
+class MovieStatsRecord(_Record):
+    """
+    A movie_stats row (see data_models.MovieStats).
+    """
+    user_count: int
+    rating_count: int
+    rating_sum: float
+
+    @property
+    def average_rating(self) -> float | None:
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+
+@dataclass(frozen=True, slots=True)
+class MovieRecord(_Record):
+    id: int
+    name: str | None
+    director: str | None
+    year: int | None
+    poster: str | None
+    rating: float | None
+    # None when no user has the movie, like Movie.stats.
+    stats: MovieStatsRecord | None = None
+
+    @classmethod
+    def from_row(cls, row) -> "MovieRecord":
+        """
+        From a row of the movie's columns, then its movie_stats columns (see
+        sqlite_data_manager.MOVIE_COLUMNS).
+        """
+        user_count = row[6]
+        stats = MovieStatsRecord(user_count, row[7], row[8]) if user_count is not None else None
+        return cls(row[0], row[1], row[2], row[3], row[4], row[5], stats)
+
+
+def _number(value, kind):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f"Not a number: {value!r}")
+    # OMDb's "1999", "8.7", "2005–2013" (a series) or "N/A".
+    match = re.match(r"\s*\d+(\.\d+)?", value)
+    return kind(float(match.group())) if match else None
+
+
+def movie_fields(values: dict) -> dict:
+    """
+    Movie fields with year and rating as the movies columns hold them: OMDb's strings
+    become numbers, "N/A" becomes None. Raises ValueError for a value of another type.
+    """
+    values = dict(values)
+    if "year" in values:
+        values["year"] = _number(values["year"], int)
+    if "rating" in values:
+        values["rating"] = _number(values["rating"], float)
+    return values
+
+
+@dataclass(frozen=True, slots=True)
+class UserMovieRecord(_Record):
+    """
+    A movie on a user's list, with the rating stored for it there.
+    """
+    id: int
+    name: str | None
+    director: str | None
+    year: int | None
+    poster: str | None
+    rating: float | None
@@ -1,11 +1,30 @@
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, joinedload, Session
+import contextvars
+import difflib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
 from contextlib import contextmanager
-from typing import List, Dict, Any
-from data_models import Base, User, Movie, UserMovie
+from typing import List, Dict, Any, Iterable
+from data_models import (User, Movie, UserMovie, MovieStats, UserStats, UserDirectorCount,
+                         MovieDeletion, Change)
 from movie_api import OMDBClient
 from datamanager.data_manager_interface import DataManagerInterface
+from datamanager import bulk_import, migrations, stats, transfer
+from datamanager.engine_profiles import (EngineProfile, create_tuned_engine, reader_profile,
+                                         DEFAULT_PROFILE)
+from datamanager.cache import ResultCache, ALL
+from datamanager.records import UserRecord, MovieRecord, UserMovieRecord, movie_fields
+from datamanager.pagination import (Page, encode_cursor, decode_cursor, parse_sort, keyset_filter,
+                                    clamp_limit, DEFAULT_PAGE_SIZE)
 
 
 # Define the database connection string.
@@ -13,15 +32,246 @@ TEST_DB_URL = "sqlite:///:memory:"
 
 
 
+# How often start_request() looks for other processes' writes (see sync_changes), and
+# how long the change log keeps them (pruned on every CHANGE_LOG_PRUNE_EVERY-th write).
+CHANGE_SYNC_INTERVAL = float(os.getenv("CHANGE_SYNC_INTERVAL", 0.5))
+CHANGE_LOG_TTL = 24 * 3600
+CHANGE_LOG_PRUNE_EVERY = 1000
+
+# Columns the listings can be sorted by
+MOVIE_SORTS = {"name": Movie.name, "year": Movie.year, "rating": Movie.rating}
+USER_SORTS = {"name": User.name}
+
+# What the listings read, in the field order of their records (see datamanager.records).
+USER_COLUMNS = (User.id, User.name)
+MOVIE_COLUMNS = (Movie.id, Movie.name, Movie.director, Movie.year, Movie.poster, Movie.rating,
+                 MovieStats.user_count, MovieStats.rating_count, MovieStats.rating_sum)
+USER_MOVIE_COLUMNS = (Movie.id, Movie.name, Movie.director, Movie.year, Movie.poster,
+                      UserMovie.rating)
+
+
 # Data manager class to handle database operations
 class SQliteDataManager(DataManagerInterface):
-    def __init__(self, db_url: str):
+    def __init__(self, db_url: str, profile: str | EngineProfile = DEFAULT_PROFILE,
+                 cache_size: int = 1024, reader_url: str | None = None,
+                 reader_pool_size: int | None = None):
         """
         Initialize the data manager with a database URL.
+        profile: name of an engine profile in datamanager.engine_profiles.PROFILES
+        (journal mode, synchronous, mmap/cache size, busy timeout, pool size), or an EngineProfile.
+        cache_size: how many read results to keep in the query cache.
+        reader_url: where reads go, e.g. engine_profiles.read_only_url(db_url) for a pool
+        of read-only connections to the same file (reader_pool_size of them, default two
+        per core). Writes, and reads following a write in the same request (see
+        start_request), always use db_url. Without it everything uses db_url.
         """
-        self.engine = create_engine(db_url)
+        self.engine = create_tuned_engine(db_url, profile)
         self.SessionFactory = sessionmaker(bind=self.engine)
-        Base.metadata.create_all(self.engine)
+        migrations.ensure_schema(self.engine)
+        if reader_url is not None:
+            self.read_engine = create_tuned_engine(reader_url,
+                                                   reader_profile(profile, reader_pool_size))
+            self.ReadSessionFactory = sessionmaker(bind=self.read_engine)
+        else:
+            self.read_engine = self.engine
+            self.ReadSessionFactory = self.SessionFactory
+        self._wrote = contextvars.ContextVar(f"wrote_{id(self)}", default=False)
+        self.cache = ResultCache(max_entries=cache_size)
+        self._listeners = []
+        self._movie_listeners = []
+        self._recommender = None
+        self._recommender_lock = threading.Lock()
+        # Position in the change log of other processes' writes (see sync_changes).
+        self._origin = uuid.uuid4().hex
+        self.sync_interval = CHANGE_SYNC_INTERVAL
+        self._synced_at = float("-inf")
+        self._sync_lock = threading.Lock()
+        with self.engine.connect() as conn:
+            self._change_seq = conn.scalar(select(func.coalesce(func.max(Change.seq), 0)))
+        # The seq of the last change seen per tag, for data_version(). Whatever came
+        # before this process counts as changed at the seq it started from.
+        self._tag_seqs = {ALL: self._change_seq}
+        self._tag_seqs_lock = threading.Lock()
+
+    def add_listener(self, callback) -> None:
+        """
+        Call callback(tags) after every write, with the tags of the data that changed:
+        "users", "user:<id>", "movies" and "user_movies:<user id>".
+        Read results are cached until a write touches their tags: at once for writes
+        through this data manager, within sync_interval seconds for those of data
+        managers in other processes (see sync_changes). Writes made behind every data
+        manager's back (e.g. a raw session) are not seen until invalidate() is called.
+        """
+        self._listeners.append(callback)
+
+    def add_movie_listener(self, callback) -> None:
+        """
+        Call callback(fields) with the OMDb fields (name, director, year, poster, rating)
+        of every movie added or re-fetched, e.g. to prefetch its poster.
+        """
+        self._movie_listeners.append(callback)
+
+    def _movies_stored(self, movies: Iterable[dict]) -> None:
+        for movie in movies:
+            for callback in self._movie_listeners:
+                callback(movie)
+
+    def notify_written(self, tags, movies: Iterable[dict] = (),
+                       ratings: Iterable[tuple] = ()) -> None:
+        """
+        Report writes made on this data manager's engine around its write methods,
+        as datamanager.bulk_import and datamanager.transfer do: tags go to the change
+        log and the listeners, movies (OMDb fields) to the movie listeners and
+        (user_id, movie_id, user_rating)s to the recommendation model.
+        """
+        self._changed(tags)
+        self._movies_stored(movies)
+        self._rated(list(ratings))
+
+    def start_request(self) -> None:
+        """
+        Mark the start of a unit of work (e.g. a web request) in the current thread or
+        task: reads go to the readers again until the next write, and cached reads of
+        data other processes changed are dropped (see sync_changes).
+        """
+        self._wrote.set(False)
+        self.sync_changes()
+
+    def _reader(self) -> sessionmaker:
+        """
+        Sessions for reads: the readers, or the writer once this request wrote
+        something, so that it reads its own writes even from a lagging replica.
+        """
+        return self.SessionFactory if self._wrote.get() else self.ReadSessionFactory
+
+    def engine_for_reads(self):
+        """
+        The engine this unit of work (see start_request) reads from: the writer once it
+        wrote, so it reads its own writes, else the readers.
+        """
+        return self.engine if self._wrote.get() else self.read_engine
+
+    def _changed(self, tags) -> None:
+        self._wrote.set(True)
+        tags = set(tags)
+        self._seen(self._log_changes(tags), tags)
+        self._invalidate(tags)
+
+    def _seen(self, seq: int, tags) -> None:
+        with self._tag_seqs_lock:
+            for tag in tags:
+                self._tag_seqs[tag] = max(self._tag_seqs.get(tag, 0), seq)
+
+    def _log_changes(self, tags: set) -> int:
+        """
+        Append the tags of a write to the change log, for the other processes' caches.
+        Returns its seq.
+        """
+        now = time.time()
+        with self.engine.begin() as conn:
+            seq = conn.execute(insert(Change).values(
+                origin=self._origin, tags=json.dumps(sorted(tags)), created_at=now)
+            ).inserted_primary_key[0]
+            if seq % CHANGE_LOG_PRUNE_EVERY == 0:
+                conn.execute(delete(Change).where(Change.created_at < now - CHANGE_LOG_TTL))
+        return seq
+
+    def sync_changes(self, force: bool = False) -> None:
+        """
+        Drop cached reads of data written by data managers in other processes (other
+        app workers, job workers), as recorded in the change log. Reads the log at most
+        every sync_interval seconds unless forced, so that is how stale a cached read
+        can be in a multi-process deployment. A process that fell behind the pruned
+        log drops everything.
+        """
+        now = time.monotonic()
+        if not force and now - self._synced_at < self.sync_interval:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._synced_at = now
+            # From the readers: a lagging replica lags in the data and the log alike.
+            with self.read_engine.connect() as conn:
+                rows = conn.execute(select(Change.seq, Change.origin, Change.tags)
+                                    .where(Change.seq > self._change_seq)
+                                    .order_by(Change.seq)).all()
+            if not rows:
+                return
+            tags = {ALL} if rows[0].seq != self._change_seq + 1 else set()
+            if tags:
+                self._seen(rows[-1].seq, tags)
+            for row in rows:
+                if row.origin != self._origin:
+                    row_tags = json.loads(row.tags)
+                    self._seen(row.seq, row_tags)
+                    tags.update(row_tags)
+            self._change_seq = rows[-1].seq
+        finally:
+            self._sync_lock.release()
+        if tags:
+            self._synced(tags)
+
+    def _invalidate(self, tags: set) -> None:
+        self.cache.invalidate(tags)
+        for callback in self._listeners:
+            callback(tags)
+
+    def invalidate(self, tags) -> None:
+        """
+        Drop cached reads of the data behind tags (see add_listener) and tell the
+        listeners. Writes through any data manager on the same database are picked up
+        by sync_changes(); call it for writes made behind their back. They go to the
+        change log too, for the other processes.
+        """
+        tags = set(tags)
+        self._seen(self._log_changes(tags), tags)
+        self._synced(tags)
+
+    def _synced(self, tags: set) -> None:
+        """
+        Catch up with writes to tags that didn't go through this data manager.
+        """
+        if ALL in tags:
+            # Anything may have changed behind the recommendation model's back: rebuild
+            # it on next use.
+            self._recommender = None
+        else:
+            self._resync_ratings({int(tag.split(":", 1)[1]) for tag in tags
+                                  if tag.startswith("user_movies:")})
+        self._invalidate(tags)
+
+    def _resync_ratings(self, user_ids: set) -> None:
+        """
+        Bring the recommendation model, if built, up to date with the lists of
+        user_ids as stored: their rows go through _rated(), and movies the model still
+        has on a list that no longer holds them were deleted (lists only ever lose
+        deleted movies).
+        """
+        model = self._recommender
+        if model is None or not user_ids:
+            return
+        query = (select(UserMovie.user_id, UserMovie.movie_id, UserMovie.user_rating)
+                 .where(UserMovie.user_id.in_(user_ids)))
+        with self.engine.connect() as conn:
+            entries = [tuple(row) for row in conn.execute(query)]
+        self._rated(entries, model)
+        listed = {(user_id, movie_id) for user_id, movie_id, _ in entries}
+        for user_id in user_ids:
+            for movie_id in model.rated_movies(user_id):
+                if (user_id, movie_id) not in listed:
+                    model.remove_movie(movie_id)
+
+    def data_version(self, tags) -> str:
+        """
+        A version of the data behind tags (see add_listener): the seq in the change log
+        of the last write to it this data manager knows of, its own or found by
+        sync_changes(). Processes that have synced up to the same point agree on it.
+        Cheap enough to answer conditional requests without reading the data itself.
+        """
+        with self._tag_seqs_lock:
+            seq = max(self._tag_seqs.get(tag, 0) for tag in {*tags, ALL})
+        return f"{seq:x}"
 
     @contextmanager
     def get_db(self):
@@ -44,7 +294,7 @@ class SQliteDataManager(DataManagerInterface):
         Getter for users.
         Returns: a list of User objects.
         """
-        with self.SessionFactory() as session:
+        with self._reader()() as session:
             users = session.query(User).all()
             return users
 
@@ -55,17 +305,34 @@ class SQliteDataManager(DataManagerInterface):
         :param user_id:
         :return: User
         """
-        with self.SessionFactory() as session:
-            user = session.query(User).filter_by(id=user_id).first()
-            return user
+        def load():
+            with self._reader()() as session:
+                return session.query(User).filter_by(id=user_id).first()
+
+        return self.cache.get_or_load(("get_user", str(user_id)), [f"user:{user_id}"], load)
 
     def add_user(self, user: User) -> None:
         """
-        Add a user to the database.
+        Add a user to the database; its id is set on it.
         """
         with self.get_db() as db:
             db.add(user)
-            db.commit()
+            db.flush()
+            # Out of the session, the commit does not expire the id the flush set.
+            db.expunge(user)
+        # user:<id> too: a lookup of the id before the user existed may be cached as None.
+        self._changed(["users", f"user:{user.id}"])
+
+    def list_users(self, limit: int = DEFAULT_PAGE_SIZE, after: str | None = None,
+                   sort: str = "name") -> Page:
+        """
+        Get one page of users (UserRecord), sorted by name ("-name" for descending).
+        Pass the previous page's next_cursor as `after` to get the next page.
+        """
+        query = select(*USER_COLUMNS)
+        key = ("list_users", limit, after, sort)
+        return self.cache.get_or_load(key, ["users"], lambda: self._paginate(
+            query, User.id, USER_SORTS, sort, limit, after, lambda row: UserRecord(*row)))
 
     @property
     def movies(self) -> List[Movie]:
@@ -73,82 +340,281 @@ class SQliteDataManager(DataManagerInterface):
         Getter for movies.
         Returns: a list of Movie objects
         """
-        with self.SessionFactory() as db:
-            return db.query(Movie).options(joinedload(Movie.users)).all()
+        with self._reader()() as db:
+            return db.query(Movie).all()
+
+    def list_movies(self, limit: int = DEFAULT_PAGE_SIZE, after: str | None = None,
+                    sort: str = "name", director: str | None = None,
+                    year_min: int | None = None, year_max: int | None = None) -> Page:
+        """
+        Get one page of movies (MovieRecord, with their stats).
+        sort: "name", "year" or "rating", prefixed with "-" for descending.
+        director: case-insensitive substring of the director.
+        year_min, year_max: inclusive release year range.
+        Pass the previous page's next_cursor as `after` to get the next page.
+        """
+        query = select(*MOVIE_COLUMNS).outerjoin(MovieStats, MovieStats.movie_id == Movie.id)
+        if director:
+            query = query.where(Movie.director.icontains(director, autoescape=True))
+        if year_min is not None:
+            query = query.where(Movie.year >= year_min)
+        if year_max is not None:
+            query = query.where(Movie.year <= year_max)
+        key = ("list_movies", limit, after, sort, director, year_min, year_max)
+        return self.cache.get_or_load(key, ["movies"], lambda: self._paginate(
+            query, Movie.id, MOVIE_SORTS, sort, limit, after, MovieRecord.from_row))
+
+    def get_movie(self, movie_id: int) -> Movie | None:
+        """
+        Get a movie by ID.
+        """
+        def load():
+            with self._reader()() as db:
+                return db.get(Movie, movie_id)
+
+        return self.cache.get_or_load(("get_movie", str(movie_id)), ["movies"], load)
+
+    def search_movies(self, query: str, limit: int = 20, fuzzy: bool = True) -> List[Movie]:
+        """
+        Full-text search over movie names and directors, best matches first.
+        Every word of the query matches as a prefix ("matr" finds "The Matrix"). If that
+        finds fewer than `limit` movies and fuzzy is on, words are also matched against
+        similar indexed words, so typos such as "Matirx" still find the movie.
+        """
+        words = re.findall(r"\w+", query.casefold())
+        if not words:
+            return []
+        limit = clamp_limit(limit)
+        key = ("search_movies", " ".join(words), limit, fuzzy)
+        return self.cache.get_or_load(key, ["movies"],
+                                      lambda: self._search_movies(words, limit, fuzzy))
+
+    def _search_movies(self, words: List[str], limit: int, fuzzy: bool) -> List[Movie]:
+        with self._reader()() as db:
+            ids = self._match_movie_ids(db, [[f'"{word}"*'] for word in words], limit)
+            if fuzzy and len(ids) < limit:
+                similar = [self._similar_terms(db, word) for word in words]
+                if any(similar):
+                    groups = [[f'"{word}"*'] + [f'"{term}"' for term in terms]
+                              for word, terms in zip(words, similar)]
+                    ids += [movie_id for movie_id in self._match_movie_ids(db, groups, limit)
+                            if movie_id not in ids][:limit - len(ids)]
+            if not ids:
+                return []
+            movies = {movie.id: movie for movie in
+                      db.scalars(select(Movie).where(Movie.id.in_(ids)))}
+            return [movies[movie_id] for movie_id in ids if movie_id in movies]
+
+    @staticmethod
+    def _match_movie_ids(db, groups: List[List[str]], limit: int) -> List[int]:
+        """
+        Ids of the best movies matching every group of alternative FTS5 terms.
+        bm25 weights: a hit in the name counts ten times a hit in the director.
+        """
+        match = " AND ".join(f"({' OR '.join(group)})" for group in groups)
+        return db.execute(text(
+            "SELECT rowid FROM movies_fts WHERE movies_fts MATCH :match "
+            "ORDER BY bm25(movies_fts, 10.0, 1.0) LIMIT :limit"),
+            {"match": match, "limit": limit}).scalars().all()
+
+    @staticmethod
+    def _similar_terms(db, word: str, cutoff: float = 0.75) -> List[str]:
+        """
+        Indexed words that look like `word` (a likely typo). Candidates share its first
+        two letters, in either order, so only a small range of the vocabulary is read.
+        """
+        if len(word) < 3:
+            return []
+        candidates = []
+        for prefix in {word[:2], word[1] + word[0]}:
+            upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            candidates += db.execute(text(
+                "SELECT term FROM movies_fts_terms WHERE term >= :lower AND term < :upper"),
+                {"lower": prefix, "upper": upper}).scalars().all()
+        return difflib.get_close_matches(word, candidates, n=3, cutoff=cutoff)
+
+    def find_movie(self, title: str) -> Movie | None:
+        """
+        The movie called exactly `title`, or else the best search match for it.
+        """
+        with self._reader()() as db:
+            movie = db.scalars(select(Movie).where(Movie.name == title)).first()
+        if movie is None:
+            matches = self.search_movies(title, limit=1)
+            movie = matches[0] if matches else None
+        return movie
+
+    def _paginate(self, query, id_column, sorts: dict, sort: str, limit: int | None,
+                  after: str | None, record) -> Page:
+        """
+        Apply keyset pagination on (sort column, id) to a Core select() and turn the
+        rows into record(row)s. Only limit + 1 rows are read, however deep the page is.
+        """
+        name, descending = parse_sort(sort, sorts)
+        column = sorts[name]
+        limit = clamp_limit(limit)
+        if after:
+            sort_value, row_id = decode_cursor(after)
+            query = query.where(keyset_filter(column, id_column, sort_value, row_id, descending))
+        if descending:
+            query = query.order_by(column.desc(), id_column.desc())
+        else:
+            query = query.order_by(column, id_column)
+        with self.engine_for_reads().connect() as conn:
+            items = [record(row) for row in conn.execute(query.limit(limit + 1))]
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_cursor = encode_cursor(getattr(last, name), last.id)
+        return Page(items=items, next_cursor=next_cursor)
 
     def set_user_movies(self, user_id: int, movie_id: int, rating: float, user_rating: float = 0.0)\
             -> None:
         """
-        Set (add) a movie to a user's list with a rating, or update the rating if it exists (self-contained session).
-        """
-        engine = self.engine
-        with Session(engine) as db:
-            user = db.query(User).filter_by(id=user_id).first()
-            movie = db.query(Movie).filter_by(id=movie_id).first()
-
-            if user and movie:
-                existing_associations = db.query(UserMovie).filter_by(
-                    user_id=user_id, movie_id=movie_id
-                ).all()  #check if the association already exists
-
-                if existing_associations:
-                    #  existing association update
-                    db.execute(
-                        UserMovie.update().
-                        where(UserMovie.user_id == user_id).
-                        where(UserMovie.movie_id == movie_id).
-                        values(rating=rating, user_rating=user_rating)
-                    )
-                    if user_rating:
-                        print(f"Updated rating for user {user_id} and movie {movie_id} to "
-                              f"{rating} and also updated user rating to {user_rating}")
-                    else:
-                        print(f"Updated rating for user {user_id} and movie {movie_id} to {rating}")
-                else:
-                    # create new association
-                    association = UserMovie(user_id=user_id, movie_id=movie_id, rating=rating,
-                                            user_rating=user_rating)
-                    db.add(association)
-                    print(f"Added movie {movie_id} to user {user_id} with rating {rating}")
-
-                db.commit()  # Commit within the function
-
-            elif user and not movie:
-                try:
-                    self.set_movie(movie_title=movie.name)
-                    self.set_user_movies(user_id=user_id, movie_id=movie_id, rating=rating,
-                                         user_rating=user_rating)
-                except ValueError as e:
-                    print(f"Failed to add movie: {e}")
-
-            else:
-                print("User or movie not found.")
-
-    def get_user_movies(self, user_id: int) -> List[Dict[str, Any]]:
+        Set (add) a movie to a user's list with a rating, or update the rating if it exists.
+        This is a single INSERT ... ON CONFLICT DO UPDATE statement; the foreign keys
+        check that the user and the movie exist.
+        Raises ValueError if either of them is missing.
         """
-        Get movies for a specific user with their ratings.
-        Returns: A list of dictionaries, where each dictionary contains movie details
-        (name, director, year, poster) and the user's rating.
+        self.set_user_movies_many([(user_id, movie_id, rating, user_rating)])
+
+    def set_user_movies_many(self, entries: Iterable[tuple]) -> int:
         """
-        with self.SessionFactory() as db:
-            user = db.query(User).options(joinedload(User.movies)).filter_by(id=user_id).first()
-            if user:
-                movies_with_ratings = []
-                for movie in user.movies:
-                    association = db.query(UserMovie).filter_by(user_id=user.id,
-                                                          movie_id=movie.id).first()
-                    if association:
-                        movies_with_ratings.append({
-                            "id": movie.id,
-                            "name": movie.name,
-                            "director": movie.director,
-                            "year": movie.year,
-                            "poster": movie.poster,
-                            "rating": association.rating,
-                        })
-                return movies_with_ratings
+        Set many ratings in one transaction, e.g. for a bulk rating import.
+        entries: (user_id, movie_id, rating) or (user_id, movie_id, rating, user_rating) tuples.
+        Returns the number of rows written. Raises ValueError, and writes nothing,
+        if any user or movie is missing.
+        """
+        rows = [{"user_id": entry[0], "movie_id": entry[1], "rating": entry[2],
+                 "user_rating": entry[3] if len(entry) > 3 else 0.0} for entry in entries]
+        if not rows:
+            return 0
+        statement = sqlite_insert(UserMovie)
+        statement = statement.on_conflict_do_update(
+            index_elements=[UserMovie.user_id, UserMovie.movie_id],
+            set_={"rating": statement.excluded.rating,
+                  "user_rating": statement.excluded.user_rating},
+        )
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(statement, rows)
+        except IntegrityError:
+            raise ValueError("User or movie not found")
+        # The movies' aggregate stats (see datamanager.stats) changed with them.
+        self._changed(["movies", *(f"user_movies:{row['user_id']}" for row in rows)])
+        self._rated([(row["user_id"], row["movie_id"], row["user_rating"]) for row in rows])
+        return len(rows)
+
+    def _rated(self, entries: List[tuple], model=None) -> None:
+        """
+        Update the recommendation model (the current one unless given), if built, with
+        (user_id, movie_id, user_rating)s just written.
+        """
+        # Read once: another thread may drop the model between a check and its use.
+        model = model or self._recommender
+        if model is not None:
+            from datamanager.recommendations import implicit_rating
+            for user_id, movie_id, user_rating in entries:
+                model.update(user_id, movie_id, implicit_rating(user_rating))
+
+    def _get_recommender(self):
+        """
+        The item similarity model, built from user_movies on first use and kept
+        up to date by set_user_movies_many() and synced changes afterwards.
+        """
+        with self._recommender_lock:
+            if self._recommender is None:
+                from datamanager.recommendations import ItemSimilarityModel, implicit_rating
+                query = select(UserMovie.user_id, UserMovie.movie_id, UserMovie.user_rating)
+                # From the writer: the model must not miss writes a replica hasn't seen yet.
+                with self.engine.connect() as conn:
+                    ratings = ((user_id, movie_id, implicit_rating(user_rating))
+                               for user_id, movie_id, user_rating in conn.execute(query))
+                    self._recommender = ItemSimilarityModel().fit(ratings)
+            return self._recommender
+
+    def recommend_movies(self, user_id: int, limit: int = 10) -> List[Movie]:
+        """
+        Movies the user doesn't have yet, most similar to the ones they have first
+        (item-item collaborative filtering over all users' lists, see
+        datamanager.recommendations).
+        """
+        scores = dict(self._get_recommender().recommend(user_id, limit))
+        if not scores:
             return []
+        with self._reader()() as db:
+            movies = db.scalars(select(Movie).where(Movie.id.in_(scores))).all()
+        return sorted(movies, key=lambda movie: -scores[movie.id])
+
+    def get_user_movies(self, user_id: int) -> List[UserMovieRecord]:
+        """
+        Get movies for a specific user with their ratings.
+        Returns: A list of UserMovieRecords with the movie details (id, name, director,
+        year, poster) and the rating on the user's list.
+        """
+        query = (
+            select(*USER_MOVIE_COLUMNS)
+            .join_from(UserMovie, Movie, UserMovie.movie_id == Movie.id)
+            .where(UserMovie.user_id == user_id)
+            .order_by(UserMovie.id)
+        )
+        def load():
+            with self.engine_for_reads().connect() as conn:
+                return [UserMovieRecord(*row) for row in conn.execute(query)]
+
+        return self.cache.get_or_load(("get_user_movies", str(user_id)),
+                                      [f"user_movies:{user_id}"], load)
+
+
+    def get_movie_stats(self, movie_id: int) -> Dict[str, Any]:
+        """
+        How many users have a movie and their average rating (None if nobody rated it),
+        read from the maintained movie_stats row.
+        """
+        def load():
+            with self._reader()() as db:
+                row = db.get(MovieStats, movie_id)
+            if row is None:
+                return {"user_count": 0, "rating_count": 0, "average_rating": None}
+            return {"user_count": row.user_count, "rating_count": row.rating_count,
+                    "average_rating": row.average_rating}
 
+        return self.cache.get_or_load(("get_movie_stats", str(movie_id)), ["movies"], load)
+
+    def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        """
+        A user's movie count, average rating (None if they rated nothing) and the
+        director they have the most movies of, read from the maintained stats tables.
+        """
+        def load():
+            with self._reader()() as db:
+                row = db.get(UserStats, user_id)
+                top_director = db.scalar(
+                    select(UserDirectorCount.director)
+                    .where(UserDirectorCount.user_id == user_id)
+                    .order_by(UserDirectorCount.movie_count.desc(), UserDirectorCount.director)
+                    .limit(1))
+            if row is None:
+                return {"movie_count": 0, "rating_count": 0, "average_rating": None,
+                        "top_director": None}
+            return {"movie_count": row.movie_count, "rating_count": row.rating_count,
+                    "average_rating": row.average_rating, "top_director": top_director}
+
+        return self.cache.get_or_load(("get_user_stats", str(user_id)),
+                                      [f"user_movies:{user_id}"], load)
+
+    def rebuild_stats(self) -> Dict[str, int]:
+        """
+        Recompute the aggregate stats from user_movies. Returns how many rows per
+        table were out of date before.
+        """
+        with self.engine.begin() as conn:
+            drift = stats.drift(conn)
+            stats.rebuild(conn)
+            user_ids = conn.scalars(select(User.id)).all()
+        self._changed(["movies", *(f"user_movies:{user_id}" for user_id in user_ids)])
+        return drift
 
     def set_movie(self, movie_title: str) -> Movie:
         """
@@ -157,20 +623,92 @@ class SQliteDataManager(DataManagerInterface):
         new_movie = OMDBClient().get_movie(title=movie_title)
         if new_movie is None:
             raise ValueError("Movie not found")
-        movie = Movie(**new_movie)
+        movie = Movie(**movie_fields(new_movie))
         with self.SessionFactory() as db:
             db.add(movie)
             db.commit()
+        self._changed(["movies"])
+        self._movies_stored([new_movie])
         return movie
 
+    def add_pending_movie(self, movie_title: str) -> Movie:
+        """
+        Add a movie that only has a title yet; its details are filled in later
+        (see the enrich_movie job in datamanager.jobs).
+        """
+        movie = Movie(name=movie_title)
+        with self.SessionFactory(expire_on_commit=False) as db:
+            db.add(movie)
+            db.commit()
+        self._changed(["movies"])
+        return movie
+
+    def bulk_import_movies(self, titles: Iterable[str], workers: int = bulk_import.DEFAULT_WORKERS,
+                           rate_limit: float = bulk_import.DEFAULT_RATE_LIMIT,
+                           batch_size: int = bulk_import.DEFAULT_BATCH_SIZE,
+                           client: OMDBClient | None = None) -> bulk_import.ImportReport:
+        """
+        Add many movies at once. Titles may be any iterable (e.g. a file being read);
+        metadata is fetched concurrently and rows are inserted in batched transactions.
+        Returns an ImportReport with counts, failures and throughput.
+        """
+        return bulk_import.bulk_import_movies(self, titles, workers=workers, rate_limit=rate_limit,
+                                              batch_size=batch_size, client=client)
+
+    def add_user_movies(self, user_id: int, titles: Iterable[str] = (),
+                        movie_ids: Iterable[int] = (), fetch: bool = True,
+                        workers: int = bulk_import.DEFAULT_WORKERS,
+                        client: OMDBClient | None = None) -> bulk_import.UserMoviesDiff:
+        """
+        Add many movies to a user's list at once, by title or id: one query resolves
+        them, titles not stored yet are fetched from OMDb concurrently (with fetch),
+        and everything is written in one transaction. Returns a UserMoviesDiff of what
+        changed. Raises ValueError if the user does not exist.
+        """
+        return bulk_import.add_user_movies(self, user_id, titles, movie_ids, fetch=fetch,
+                                           workers=workers, client=client)
+
+    def export_data(self, tables: Iterable[str] | None = None, fmt: str = "jsonl",
+                    yield_per: int = transfer.DEFAULT_YIELD_PER) -> Iterable[str]:
+        """
+        Stream movies, users and user_movies (or just `tables`) as JSONL, or one table
+        as CSV, in text chunks; see datamanager.transfer. Rows are read yield_per at a
+        time, so memory stays flat however large the tables are.
+        Raises ValueError for an unknown table or format.
+        """
+        return transfer.export(self.engine_for_reads(), tables, fmt, yield_per)
+
+    def import_data(self, stream, fmt: str = "jsonl", table: str | None = None,
+                    on_conflict: str = "skip",
+                    batch_size: int = transfer.DEFAULT_BATCH_SIZE) -> transfer.TransferReport:
+        """
+        Read an export_data() stream (a CSV needs its table) in transactions of
+        batch_size rows. on_conflict: "skip" or "update" rows whose key exists, or
+        "error" (ValueError). Returns a TransferReport with counts per table.
+        """
+        if fmt == "csv":
+            if table is None:
+                raise ValueError("Importing CSV needs the table")
+            records = transfer.read_csv(stream, table)
+        elif fmt == "jsonl":
+            records = transfer.read_jsonl(stream)
+        else:
+            raise ValueError(f"Unknown format {fmt!r}")
+        return transfer.import_records(self, records, on_conflict, batch_size)
+
     def update_movie(self, movie_id: int, update_data: dict) -> Movie | None:
         session = self.SessionFactory()
         try:
             movie = session.query(Movie).filter_by(id=movie_id).first()
             if movie:
-                for key, value in update_data.items():
+                for key, value in movie_fields(update_data).items():
                     setattr(movie, key, value)
+                holders = session.scalars(
+                    select(UserMovie.user_id).where(UserMovie.movie_id == movie_id)).all()
                 session.commit()
+                self._changed(["movies", *(f"user_movies:{user_id}" for user_id in holders)])
+                if "poster" in update_data:
+                    self._movies_stored([update_data])
                 return movie
             return None
         finally:
@@ -186,17 +724,40 @@ class SQliteDataManager(DataManagerInterface):
         Returns:
             True if the movie was successfully deleted, False otherwise.
         """
+        return self.delete_movies([movie_id]) == 1
+
+    def delete_movies(self, movie_ids: Iterable[int]) -> int:
+        """
+        Delete movies and take them off every user's list, in one transaction of
+        set-based statements: the aggregate stats are adjusted by one grouped UPDATE
+        per table (see stats.remove_movies), then the user_movies rows and the movies
+        go with one DELETE each. Only the ids of the users who held them are read,
+        to invalidate their lists. Returns how many of the movies existed.
+        Raises ValueError, deleting nothing, if an id isn't an integer.
+        """
+        try:
+            rows = [{"movie_id": movie_id}
+                    for movie_id in dict.fromkeys(int(movie_id) for movie_id in movie_ids)]
+        except (TypeError, ValueError):
+            raise ValueError("Movie ids must be integers")
+        if not rows:
+            return 0
+        deleting = select(MovieDeletion.movie_id)
+        with self.engine.begin() as conn:
+            conn.execute(insert(MovieDeletion), rows)
+            stats.remove_movies(conn)
+            holders = set(conn.scalars(delete(UserMovie).where(UserMovie.movie_id.in_(deleting))
+                                       .returning(UserMovie.user_id)))
+            deleted = conn.execute(delete(Movie).where(Movie.id.in_(deleting))).rowcount
+            conn.execute(delete(MovieDeletion))
+        if deleted:
+            self._changed(["movies", *(f"user_movies:{user_id}" for user_id in holders)])
+            model = self._recommender
+            if model is not None:
+                for row in rows:
+                    model.remove_movie(row["movie_id"])
+        return deleted
 
-        with self.SessionFactory() as db:
-            movie = db.query(Movie).options(joinedload(Movie.users)).filter_by(id=movie_id).first()
-            if movie:
-                # Remove the movie from all associated users' movie lists
-                for user in movie.users:
-                    user.movies.remove(movie)
-                db.delete(movie)
-                db.commit()
-                return True
-            return False
 
 def main():
     data_manager = SQliteDataManager("sqlite:///movie_app.db")
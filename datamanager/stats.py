@@ -0,0 +1,190 @@
+import argparse
+import sys
+from typing import Dict
+
+from sqlalchemy.engine import Connection
+
+# movie_stats, user_stats and user_director_counts hold aggregates over
+# user_movies. Triggers apply every insert, update and delete of a user_movies
+# row (and every change of a movie's director) as a +1/-1 delta inside the
+# writing statement, so the numbers commit or roll back together with it.
+# rebuild() recomputes everything from user_movies, should they ever drift.
+
+_RATED = "CASE WHEN {row}.user_rating > 0 THEN 1 ELSE 0 END"
+_RATING = "CASE WHEN {row}.user_rating > 0 THEN {row}.user_rating ELSE 0 END"
+
+
+def _apply(row: str, sign: str) -> str:
+    """
+    Statements adding (sign "") or removing (sign "-") the user_movies row `row`
+    (new or old) to or from the aggregates.
+    """
+    rated, rating = _RATED.format(row=row), _RATING.format(row=row)
+    statements = [
+        f"INSERT INTO movie_stats (movie_id, user_count, rating_count, rating_sum) "
+        f"VALUES ({row}.movie_id, {sign}1, {sign}{rated}, {sign}{rating}) "
+        f"ON CONFLICT (movie_id) DO UPDATE SET "
+        f"user_count = user_count + excluded.user_count, "
+        f"rating_count = rating_count + excluded.rating_count, "
+        f"rating_sum = rating_sum + excluded.rating_sum;",
+        f"INSERT INTO user_stats (user_id, movie_count, rating_count, rating_sum) "
+        f"VALUES ({row}.user_id, {sign}1, {sign}{rated}, {sign}{rating}) "
+        f"ON CONFLICT (user_id) DO UPDATE SET "
+        f"movie_count = movie_count + excluded.movie_count, "
+        f"rating_count = rating_count + excluded.rating_count, "
+        f"rating_sum = rating_sum + excluded.rating_sum;",
+        f"INSERT INTO user_director_counts (user_id, director, movie_count) "
+        f"SELECT {row}.user_id, director, {sign}1 FROM movies "
+        f"WHERE id = {row}.movie_id AND director IS NOT NULL AND director <> '' "
+        f"ON CONFLICT (user_id, director) DO UPDATE SET "
+        f"movie_count = movie_count + excluded.movie_count;",
+    ]
+    if sign:
+        # Rows that no longer count anything go, as if they had never been inserted.
+        statements += [
+            f"DELETE FROM movie_stats WHERE movie_id = {row}.movie_id AND user_count <= 0;",
+            f"DELETE FROM user_stats WHERE user_id = {row}.user_id AND movie_count <= 0;",
+            f"DELETE FROM user_director_counts "
+            f"WHERE user_id = {row}.user_id AND movie_count <= 0;",
+        ]
+    return " ".join(statements)
+
+
+def _move_director(row: str, sign: str) -> str:
+    """
+    Statement adding or removing movie `row`'s director for every user holding it.
+    """
+    return (f"INSERT INTO user_director_counts (user_id, director, movie_count) "
+            f"SELECT user_id, {row}.director, {sign}1 FROM user_movies "
+            f"WHERE movie_id = {row}.id AND {row}.director IS NOT NULL AND {row}.director <> '' "
+            f"ON CONFLICT (user_id, director) DO UPDATE SET "
+            f"movie_count = movie_count + excluded.movie_count;")
+
+
+TRIGGERS = {
+    "user_movies_stats_insert": f"AFTER INSERT ON user_movies BEGIN {_apply('new', '')} END",
+    # Rows of movies in movie_deletions are taken out in bulk by remove_movies().
+    "user_movies_stats_delete": (
+        f"AFTER DELETE ON user_movies WHEN NOT EXISTS "
+        f"(SELECT 1 FROM movie_deletions WHERE movie_id = old.movie_id) "
+        f"BEGIN {_apply('old', '-')} END"),
+    "user_movies_stats_update": (
+        f"AFTER UPDATE OF user_id, movie_id, user_rating ON user_movies BEGIN "
+        f"{_apply('old', '-')} {_apply('new', '')} END"),
+    "movies_stats_director": (
+        f"AFTER UPDATE OF director ON movies WHEN old.director IS NOT new.director BEGIN "
+        f"{_move_director('old', '-')} {_move_director('new', '')} "
+        f"DELETE FROM user_director_counts WHERE director = old.director AND movie_count <= 0; "
+        f"END"),
+}
+
+# What each table should contain, computed from user_movies.
+_RATING_COLUMNS = ("COUNT(CASE WHEN user_rating > 0 THEN 1 END) AS rating_count, "
+                   "TOTAL(CASE WHEN user_rating > 0 THEN user_rating END) AS rating_sum")
+EXPECTED = {
+    "movie_stats": (
+        f"SELECT movie_id, COUNT(*) AS user_count, {_RATING_COLUMNS} "
+        f"FROM user_movies GROUP BY movie_id"),
+    "user_stats": (
+        f"SELECT user_id, COUNT(*) AS movie_count, {_RATING_COLUMNS} "
+        f"FROM user_movies GROUP BY user_id"),
+    "user_director_counts": (
+        "SELECT user_movies.user_id AS user_id, movies.director AS director, "
+        "COUNT(*) AS movie_count FROM user_movies "
+        "JOIN movies ON movies.id = user_movies.movie_id "
+        "WHERE movies.director IS NOT NULL AND movies.director <> '' "
+        "GROUP BY user_movies.user_id, movies.director"),
+}
+_COLUMNS = {
+    "movie_stats": "movie_id, user_count, rating_count, rating_sum",
+    "user_stats": "user_id, movie_count, rating_count, rating_sum",
+    "user_director_counts": "user_id, director, movie_count",
+}
+
+
+def create_triggers(conn: Connection) -> None:
+    for name, body in TRIGGERS.items():
+        conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+# The user_movies rows of the movies in movie_deletions.
+_DELETED_ROWS = "movie_id IN (SELECT movie_id FROM movie_deletions)"
+_REMOVE_MOVIES = [
+    f"UPDATE user_stats SET movie_count = user_stats.movie_count - removed.movie_count, "
+    f"rating_count = user_stats.rating_count - removed.rating_count, "
+    f"rating_sum = user_stats.rating_sum - removed.rating_sum "
+    f"FROM (SELECT user_id, COUNT(*) AS movie_count, {_RATING_COLUMNS} FROM user_movies "
+    f"WHERE {_DELETED_ROWS} GROUP BY user_id) AS removed "
+    f"WHERE user_stats.user_id = removed.user_id",
+    f"UPDATE user_director_counts "
+    f"SET movie_count = user_director_counts.movie_count - removed.movie_count "
+    f"FROM (SELECT user_movies.user_id AS user_id, movies.director AS director, "
+    f"COUNT(*) AS movie_count FROM user_movies JOIN movies ON movies.id = user_movies.movie_id "
+    f"WHERE user_movies.{_DELETED_ROWS} "
+    f"AND movies.director IS NOT NULL AND movies.director <> '' "
+    f"GROUP BY user_movies.user_id, movies.director) AS removed "
+    f"WHERE user_director_counts.user_id = removed.user_id "
+    f"AND user_director_counts.director = removed.director",
+    # Only the updates above leave rows at zero (the triggers delete them at once).
+    "DELETE FROM user_stats WHERE movie_count <= 0",
+    "DELETE FROM user_director_counts WHERE movie_count <= 0",
+    f"DELETE FROM movie_stats WHERE {_DELETED_ROWS}",
+]
+
+
+def remove_movies(conn: Connection) -> None:
+    """
+    Take the user_movies rows of the movies in movie_deletions out of the
+    aggregates, one grouped statement per table instead of a trigger run per row.
+    Call before deleting those rows; the delete trigger skips them.
+    """
+    for statement in _REMOVE_MOVIES:
+        conn.exec_driver_sql(statement)
+
+
+def drift(conn: Connection) -> Dict[str, int]:
+    """
+    Per table, how many rows are missing, extra or wrong compared to user_movies.
+    """
+    counts = {}
+    for table, expected in EXPECTED.items():
+        # Sums built up from deltas may differ from a fresh sum in the last bits.
+        columns = _COLUMNS[table].replace("rating_sum", "ROUND(rating_sum, 6)")
+        expected = f"SELECT {columns} FROM ({expected})"
+        actual = f"SELECT {columns} FROM {table}"
+        counts[table] = conn.exec_driver_sql(
+            f"SELECT (SELECT COUNT(*) FROM ({expected} EXCEPT {actual})) + "
+            f"(SELECT COUNT(*) FROM ({actual} EXCEPT {expected}))").scalar()
+    return counts
+
+
+def rebuild(conn: Connection) -> None:
+    """
+    Recompute all aggregates from user_movies.
+    """
+    for table, expected in EXPECTED.items():
+        conn.exec_driver_sql(f"DELETE FROM {table}")
+        conn.exec_driver_sql(f"INSERT INTO {table} ({_COLUMNS[table]}) {expected}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check the aggregate statistics tables and rebuild them from user_movies.")
+    parser.add_argument("--db", default="sqlite:///movie_app.db", help="database URL")
+    parser.add_argument("--check", action="store_true", help="only report drift, don't repair")
+    args = parser.parse_args(argv)
+
+    from datamanager.sqlite_data_manager import SQliteDataManager
+    data_manager = SQliteDataManager(args.db)  # also brings the schema up to date
+    with data_manager.engine.connect() as conn:
+        counts = drift(conn)
+    for table, count in counts.items():
+        print(f"{table}: {count} row(s) out of date")
+    if not args.check and any(counts.values()):
+        data_manager.rebuild_stats()
+        print("rebuilt")
+    return 1 if args.check and any(counts.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import pytest
+from sqlalchemy import event
+
+from datamanager import stats
+from datamanager.sqlite_data_manager import SQliteDataManager
+from data_models import User, Movie
+
+
+@pytest.fixture
+def data_manager():
+    """
+    Fixture for a data manager with two users and three movies, two by the same director.
+    """
+    data_manager = SQliteDataManager("sqlite:///:memory:")
+    with data_manager.SessionFactory() as session:
+        session.add_all([User(name="Ann"), User(name="Bob")])
+        session.add_all([Movie(name="Heat", director="Michael Mann"),
+                         Movie(name="Thief", director="Michael Mann"),
+                         Movie(name="Alien", director="Ridley Scott")])
+        session.commit()
+    return data_manager
+
+
+def _drift(data_manager):
+    with data_manager.engine.connect() as conn:
+        return stats.drift(conn)
+
+
+def test_stats_follow_writes(data_manager):
+    """Test that inserts, upserts and deletes keep movie and user stats exact."""
+    data_manager.set_user_movies_many([(1, 1, 8.0, 9.0), (1, 2, 7.0, 0.0), (1, 3, 6.0, 5.0),
+                                       (2, 1, 8.0, 7.0)])
+    assert data_manager.get_movie_stats(1) == {"user_count": 2, "rating_count": 2,
+                                               "average_rating": 8.0}
+    assert data_manager.get_user_stats(1) == {"movie_count": 3, "rating_count": 2,
+                                              "average_rating": 7.0,
+                                              "top_director": "Michael Mann"}
+    data_manager.set_user_movies(2, 1, 8.0, 3.0)
+    assert data_manager.get_movie_stats(1)["average_rating"] == 6.0
+    data_manager.delete_movie(1)
+    assert data_manager.get_movie_stats(1)["user_count"] == 0
+    assert data_manager.get_user_stats(1)["movie_count"] == 2
+    assert data_manager.get_user_stats(2) == {"movie_count": 0, "rating_count": 0,
+                                              "average_rating": None, "top_director": None}
+    assert not any(_drift(data_manager).values())
+
+
+def test_bulk_delete_keeps_stats_exact(data_manager):
+    """Test that deleting several movies at once leaves the same stats as one by one."""
+    data_manager.set_user_movies_many([(1, 1, 8.0, 9.0), (1, 2, 7.0, 4.0), (1, 3, 6.0, 5.0),
+                                       (2, 1, 8.0, 7.0), (2, 2, 7.0, 0.0)])
+    assert data_manager.delete_movies([1, 2, 2, 99]) == 2
+    assert data_manager.get_user_stats(1) == {"movie_count": 1, "rating_count": 1,
+                                              "average_rating": 5.0,
+                                              "top_director": "Ridley Scott"}
+    assert data_manager.get_user_stats(2)["movie_count"] == 0
+    assert not any(_drift(data_manager).values())
+    with data_manager.engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM movie_deletions").scalar() == 0
+
+
+def test_director_change_moves_counts(data_manager):
+    """Test that enriching a movie with its director updates its holders' top director."""
+    data_manager.set_user_movies_many([(1, 1, 8.0), (1, 3, 6.0)])
+    data_manager.update_movie(3, {"director": "Ridley Scott, Jr."})
+    data_manager.update_movie(1, {"director": "Ridley Scott, Jr."})
+    assert data_manager.get_user_stats(1)["top_director"] == "Ridley Scott, Jr."
+    assert not any(_drift(data_manager).values())
+
+
+def test_failed_write_leaves_stats_alone(data_manager):
+    """Test that the stats roll back with a rejected write."""
+    with pytest.raises(ValueError):
+        data_manager.set_user_movies_many([(1, 1, 8.0), (1, 99, 8.0)])
+    assert data_manager.get_movie_stats(1)["user_count"] == 0
+
+
+def test_rebuild_repairs_drift(data_manager):
+    """Test that rebuild_stats() finds and fixes tampered aggregates."""
+    data_manager.set_user_movies_many([(1, 1, 8.0, 9.0), (2, 1, 8.0, 7.0)])
+    with data_manager.engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE movie_stats SET user_count = 40")
+        conn.exec_driver_sql("DELETE FROM user_stats WHERE user_id = 2")
+    assert _drift(data_manager) == {"movie_stats": 2, "user_stats": 1,
+                                    "user_director_counts": 0}
+    assert data_manager.rebuild_stats()["movie_stats"] == 2
+    assert data_manager.get_movie_stats(1)["user_count"] == 2
+    assert not any(_drift(data_manager).values())
+
+
+def test_listing_does_not_touch_user_movies(data_manager):
+    """Test that the movie listing loads stats without reading the association table."""
+    data_manager.set_user_movies_many([(1, 1, 8.0, 9.0)])
+    statements = []
+    event.listen(data_manager.engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    movies = data_manager.list_movies().items
+    assert {movie.name: movie.stats.user_count for movie in movies if movie.stats} == {"Heat": 1}
+    assert len(statements) == 1
+    assert "user_movies" not in statements[0]
@@ -0,0 +1,279 @@
+import argparse
+import csv
+import io
+import json
+import sys
+from dataclasses import dataclass, field
+from itertools import groupby, islice
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from sqlalchemy import Float, Integer, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from data_models import Movie, User, UserMovie
+
+# Export and import of the catalog and ratings, for backups and moving data between
+# databases. Rows are streamed in both directions, so memory use does not depend on
+# table size: exports read with yield_per, imports write batched transactions.
+#
+# JSONL holds any number of tables, one {"table": ..., "row": {...}} object per line.
+# CSV holds a single table, with a header line of column names.
+
+# Exported tables and columns, in an order that satisfies the foreign keys on import.
+# user_movies rows are keyed by (user_id, movie_id); their own id is not kept.
+TABLES = {
+    "movies": (Movie, ["id", "name", "director", "year", "poster", "rating"], ["id"]),
+    "users": (User, ["id", "name"], ["id"]),
+    "user_movies": (UserMovie, ["user_id", "movie_id", "rating", "user_rating"],
+                    ["user_id", "movie_id"]),
+}
+FORMATS = ("jsonl", "csv")
+CONFLICTS = ("skip", "update", "error")
+DEFAULT_YIELD_PER = 1000
+DEFAULT_BATCH_SIZE = 1000
+
+
+@dataclass
+class TransferReport:
+    """
+    Outcome of an import, per table.
+    """
+    written: Dict[str, int] = field(default_factory=dict)
+    skipped: Dict[str, int] = field(default_factory=dict)
+
+    def __str__(self):
+        return " ".join(f"{table}: written={self.written.get(table, 0)} "
+                        f"skipped={self.skipped.get(table, 0)}"
+                        for table in TABLES if table in self.written or table in self.skipped)
+
+
+def _check_tables(tables: Iterable[str] | None, fmt: str) -> List[str]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, choose one of {list(FORMATS)}")
+    tables = list(tables) if tables else list(TABLES)
+    unknown = [table for table in tables if table not in TABLES]
+    if unknown:
+        raise ValueError(f"Unknown table {unknown[0]!r}, choose from {list(TABLES)}")
+    if fmt == "csv" and len(tables) != 1:
+        raise ValueError("CSV holds exactly one table")
+    return sorted(tables, key=list(TABLES).index)
+
+
+def export_rows(engine, tables: Iterable[str] | None = None,
+                yield_per: int = DEFAULT_YIELD_PER) -> Iterator[Tuple[str, List[dict]]]:
+    """
+    (table, rows) pairs for `tables` (default: all, in TABLES order), each table's
+    rows in primary key order and in lists of up to yield_per. Every table is read
+    on one connection in one read transaction, so in WAL mode the export is a
+    consistent snapshot while writers carry on.
+    """
+    with engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            # pysqlite only opens transactions for writes: without this, each
+            # table's SELECT would see the database as of its own start.
+            conn.exec_driver_sql("BEGIN")
+        for table in tables if tables is not None else TABLES:
+            model, columns, key = TABLES[table]
+            query = select(*(getattr(model, column) for column in columns)).order_by(
+                *(getattr(model, column) for column in key))
+            result = conn.execution_options(stream_results=True,
+                                            yield_per=yield_per).execute(query)
+            for partition in result.mappings().partitions():
+                yield table, [dict(row) for row in partition]
+
+
+def export(engine, tables: Iterable[str] | None = None, fmt: str = "jsonl",
+           yield_per: int = DEFAULT_YIELD_PER) -> Iterator[str]:
+    """
+    The export of `tables` (default: all) as text chunks of up to yield_per lines.
+    Raises ValueError for an unknown table or format, or several tables as CSV,
+    before anything is read.
+    """
+    tables = _check_tables(tables, fmt)
+
+    def generate():
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator="\n")
+            writer.writerow(TABLES[tables[0]][1])
+            for _, rows in export_rows(engine, tables, yield_per):
+                writer.writerows(row.values() for row in rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        else:
+            for table, rows in export_rows(engine, tables, yield_per):
+                yield "".join(json.dumps({"table": table, "row": row}) + "\n" for row in rows)
+
+    return generate()
+
+
+def _converters(table: str) -> dict:
+    model, columns, _ = TABLES[table]
+    converters = {}
+    for column in columns:
+        kind = type(model.__table__.c[column].type)
+        converters[column] = int if issubclass(kind, Integer) else \
+            float if issubclass(kind, Float) else str
+    return converters
+
+
+def read_jsonl(stream) -> Iterator[Tuple[str, dict]]:
+    """
+    (table, row) pairs from a JSONL export. Raises ValueError on a malformed line.
+    """
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            table, row = record["table"], record["row"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"line {number}: not an export record ({e})")
+        if table not in TABLES:
+            raise ValueError(f"line {number}: unknown table {table!r}")
+        yield table, row
+
+
+def read_csv(stream, table: str) -> Iterator[Tuple[str, dict]]:
+    """
+    (table, row) pairs from a CSV export of table. Empty fields are NULL.
+    """
+    _check_tables([table], "csv")
+    converters = _converters(table)
+    reader = csv.DictReader(stream)
+    unknown = set(reader.fieldnames or ()) - converters.keys()
+    if unknown:
+        raise ValueError(f"Unknown {table} column(s): {sorted(unknown)}")
+    for number, row in enumerate(reader, 2):
+        try:
+            yield table, {column: converters[column](value) if value != "" else None
+                          for column, value in row.items()}
+        except ValueError as e:
+            raise ValueError(f"line {number}: {e}")
+
+
+def _insert_statement(table: str, on_conflict: str):
+    model, columns, key = TABLES[table]
+    statement = sqlite_insert(model)
+    if on_conflict == "skip":
+        return statement.on_conflict_do_nothing(index_elements=key)
+    if on_conflict == "update":
+        # Computed columns (Movie.name_key) follow the columns they are computed from.
+        updated = [column.name for column in model.__table__.columns if column.name not in key]
+        return statement.on_conflict_do_update(
+            index_elements=key, set_={column: statement.excluded[column] for column in updated})
+    return statement
+
+
+def _missing_references(conn, rows: List[dict]) -> List[dict]:
+    """
+    The user_movies rows whose user or movie does not exist.
+    """
+    movie_ids = set(conn.scalars(select(Movie.id).where(
+        Movie.id.in_({row["movie_id"] for row in rows}))))
+    user_ids = set(conn.scalars(select(User.id).where(
+        User.id.in_({row["user_id"] for row in rows}))))
+    return [row for row in rows
+            if row["movie_id"] not in movie_ids or row["user_id"] not in user_ids]
+
+
+def _changed_tags(conn, table: str, rows: List[dict], on_conflict: str) -> List[str]:
+    """
+    The cache tags (see SQliteDataManager.add_listener) of a written batch.
+    """
+    if table == "users":
+        return ["users", *(f"user:{row['id']}" for row in rows if row["id"] is not None)]
+    if table == "user_movies":
+        # The movies' aggregate stats changed with them.
+        return ["movies", *{f"user_movies:{row['user_id']}" for row in rows}]
+    if on_conflict != "update":
+        return ["movies"]
+    # Overwritten movies show up in their holders' lists.
+    holders = conn.scalars(select(UserMovie.user_id).distinct().where(
+        UserMovie.movie_id.in_({row["id"] for row in rows})))
+    return ["movies", *(f"user_movies:{user_id}" for user_id in holders)]
+
+
+def import_records(data_manager, records: Iterable[Tuple[str, dict]], on_conflict: str = "skip",
+                   batch_size: int = DEFAULT_BATCH_SIZE) -> TransferReport:
+    """
+    Write (table, row) pairs in transactions of up to batch_size rows, reporting each
+    batch's movies and ratings to data_manager.notify_written().
+
+    on_conflict decides what happens to a row whose key exists already: "skip" keeps
+    the stored row, "update" overwrites it, "error" raises ValueError. With "skip",
+    ratings of missing users or movies are skipped too; otherwise they raise ValueError.
+    Batches written before an error stay written.
+    """
+    if on_conflict not in CONFLICTS:
+        raise ValueError(f"Unknown conflict handling {on_conflict!r}, "
+                         f"choose one of {list(CONFLICTS)}")
+    report = TransferReport()
+    for table, group in groupby(records, key=lambda record: record[0]):
+        model, columns, _ = TABLES[table]
+        # What was actually written, skipped conflicts left out.
+        statement = _insert_statement(table, on_conflict).returning(
+            *(getattr(model, column) for column in columns))
+        rows_iter = ({column: row.get(column) for column in columns} for _, row in group)
+        while batch := list(islice(rows_iter, batch_size)):
+            rows = batch
+            try:
+                with data_manager.engine.begin() as conn:
+                    if table == "user_movies" and on_conflict == "skip":
+                        missing = {id(row) for row in _missing_references(conn, rows)}
+                        rows = [row for row in rows if id(row) not in missing]
+                    written = [dict(row) for row in conn.execute(statement, rows).mappings()] \
+                        if rows else []
+                    tags = _changed_tags(conn, table, rows, on_conflict) if written else []
+            except IntegrityError as e:
+                raise ValueError(f"{table}: {e.orig}")
+            report.written[table] = report.written.get(table, 0) + len(written)
+            report.skipped[table] = report.skipped.get(table, 0) + len(batch) - len(written)
+            if tags:
+                data_manager.notify_written(
+                    tags, movies=written if table == "movies" else (),
+                    ratings=[(row["user_id"], row["movie_id"], row["user_rating"])
+                             for row in written] if table == "user_movies" else ())
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import movies, users and ratings.")
+    parser.add_argument("--db", default="sqlite:///movie_app.db", help="database URL")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write an export to stdout")
+    export_parser.add_argument("--table", action="append", choices=list(TABLES),
+                               help="table to export (repeatable, default all)")
+    export_parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    import_parser = commands.add_parser("import", help="read an export")
+    import_parser.add_argument("file", nargs="?", default="-", help="'-' for stdin (default)")
+    import_parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    import_parser.add_argument("--table", choices=list(TABLES), help="the table of a CSV file")
+    import_parser.add_argument("--on-conflict", choices=CONFLICTS, default="skip")
+    import_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    from datamanager.sqlite_data_manager import SQliteDataManager
+    data_manager = SQliteDataManager(args.db)
+    if args.command == "export":
+        for chunk in data_manager.export_data(args.table, args.format):
+            sys.stdout.write(chunk)
+        return 0
+    stream = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8", newline="")
+    try:
+        report = data_manager.import_data(stream, args.format, table=args.table,
+                                          on_conflict=args.on_conflict,
+                                          batch_size=args.batch_size)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    print(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
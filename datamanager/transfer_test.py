@@ -0,0 +1,105 @@
+import io
+import json
+
+import pytest
+
+from datamanager.sqlite_data_manager import SQliteDataManager
+from data_models import Movie, User
+
+TEST_DB_URL = "sqlite:///:memory:"
+
+
+@pytest.fixture
+def source():
+    data_manager = SQliteDataManager(TEST_DB_URL)
+    with data_manager.get_db() as db:
+        db.add_all([Movie(id=1, name="Heat", director="Michael Mann", year=1995, rating=8.3),
+                    Movie(id=2, name="Alien", director="Ridley Scott", year=1979, rating=None),
+                    User(id=1, name="Ann"), User(id=2, name="Bob")])
+    data_manager.set_user_movies_many([(1, 1, 8.3, 9.0), (2, 1, 8.3), (2, 2, 8.5, 7.0)])
+    return data_manager
+
+
+def _export(data_manager, *args, **kwargs) -> str:
+    return "".join(data_manager.export_data(*args, **kwargs))
+
+
+def test_jsonl_round_trip(source):
+    """Test that a JSONL export restores every table, including ratings and stats."""
+    dump = _export(source, yield_per=2)
+    lines = [json.loads(line) for line in dump.splitlines()]
+    assert [line["table"] for line in lines] == ["movies"] * 2 + ["users"] * 2 + ["user_movies"] * 3
+    assert lines[1]["row"] == {"id": 2, "name": "Alien", "director": "Ridley Scott",
+                               "year": 1979, "poster": None, "rating": None}
+
+    target = SQliteDataManager(TEST_DB_URL)
+    report = target.import_data(io.StringIO(dump), batch_size=2)
+    assert report.written == {"movies": 2, "users": 2, "user_movies": 3}
+    assert _export(target) == dump
+    assert target.get_user_stats(2)["average_rating"] == 7.0
+    assert [movie.name for movie in target.search_movies("alien")] == ["Alien"]
+
+
+def test_import_reaches_listeners_and_recommendations(source):
+    """Test that imported movies reach the movie listeners and ratings the live model."""
+    target = SQliteDataManager(TEST_DB_URL)
+    stored = []
+    target.add_movie_listener(stored.append)
+    target.import_data(io.StringIO(_export(source, ["movies", "users"])))
+    model = target._get_recommender()
+    report = target.import_data(io.StringIO(_export(source)))
+    assert report.written == {"movies": 0, "users": 0, "user_movies": 3}
+    assert [movie["name"] for movie in stored] == ["Heat", "Alien"]
+    assert target._recommender is model
+    assert model.rated_movies(2) == {1, 2}
+
+
+def test_csv_round_trip(source):
+    """Test one table as CSV, with NULLs as empty fields."""
+    dump = _export(source, ["movies"], "csv")
+    assert dump.splitlines()[0] == "id,name,director,year,poster,rating"
+    assert dump.splitlines()[2] == "2,Alien,Ridley Scott,1979,,"
+    target = SQliteDataManager(TEST_DB_URL)
+    target.import_data(io.StringIO(dump), "csv", table="movies")
+    assert _export(target, ["movies"], "csv") == dump
+    with pytest.raises(ValueError):
+        _export(source, fmt="csv")
+    with pytest.raises(ValueError):
+        target.import_data(io.StringIO(dump), "csv")
+
+
+def test_conflicts(source):
+    """Test skip, update and error on rows that exist, and ratings of missing movies."""
+    dump = _export(source, ["movies", "user_movies"])
+    changed = dump.replace('"Heat"', '"Heat (1995)"') + json.dumps(
+        {"table": "user_movies", "row": {"user_id": 1, "movie_id": 99, "rating": 1.0}}) + "\n"
+
+    report = source.import_data(io.StringIO(changed))
+    assert report.written == {"movies": 0, "user_movies": 0}
+    assert report.skipped == {"movies": 2, "user_movies": 4}
+    assert source.find_movie("Heat").id == 1
+
+    report = source.import_data(io.StringIO(dump.replace('"Heat"', '"Heat (1995)"')),
+                                on_conflict="update")
+    assert report.written["movies"] == 2
+    assert source.get_movie(1).name == "Heat (1995)"
+    assert source.get_user_movies(1)[0]["name"] == "Heat (1995)"
+
+    with pytest.raises(ValueError):
+        source.import_data(io.StringIO(dump), on_conflict="error")
+    with pytest.raises(ValueError):
+        source.import_data(io.StringIO('{"table": "secrets", "row": {}}\n'))
+
+
+def test_export_is_one_snapshot(tmp_path):
+    """Test that writes made while an export streams don't show up in any of its tables."""
+    data_manager = SQliteDataManager(f"sqlite:///{tmp_path / 'movies.db'}")
+    data_manager.add_pending_movie("Heat")
+    data_manager.add_user(User(name="Ann"))
+    chunks = data_manager.export_data(yield_per=1)
+    dump = next(chunks)
+    data_manager.add_pending_movie("Alien")
+    data_manager.add_user(User(name="Bob"))
+    dump += "".join(chunks)
+    assert [(line["table"], line["row"]["name"]) for line in map(json.loads, dump.splitlines())
+            if line["table"] != "user_movies"] == [("movies", "Heat"), ("users", "Ann")]
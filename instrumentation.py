@@ -0,0 +1,323 @@
+import bisect
+import collections
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import wraps
+
+from sqlalchemy import event
+
+logger = logging.getLogger("movieapp.metrics")
+
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_MS", "100")) / 1000
+# The same statement run this many times in one request is reported as a likely N+1.
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """
+    Prometheus counter with optional labels.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(name, "") for name in self.labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labels, key)} {value:g}"
+
+
+class Histogram:
+    """
+    Prometheus histogram with cumulative buckets and optional labels.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(labels.get(name, "") for name in self.labels))
+        return series[-1] if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labels + ("le",), key + (f"{bound:g}",))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels + ("le",), key + ("+Inf",))
+            yield f"{self.name}_bucket{labels} {series[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {series[-2]:g}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]}"
+
+
+class Registry:
+    """
+    A set of metrics rendered together in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+@dataclass
+class RequestMetrics:
+    """
+    Where the time of one request went.
+    """
+    started: float = field(default_factory=time.perf_counter)
+    statements: int = 0
+    db_time: float = 0.0
+    upstream_calls: int = 0
+    upstream_time: float = 0.0
+    render_time: float = 0.0
+    slow_queries: int = 0
+    statement_counts: collections.Counter = field(default_factory=collections.Counter)
+    # Upstream calls may run on several threads at once (see bulk_import._fetch_all).
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def repeated_statements(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> dict:
+        return {statement: count for statement, count in self.statement_counts.items()
+                if count >= threshold}
+
+
+# The metrics of the request being handled by the current thread (None outside requests,
+# e.g. in job workers and the poster prefetch threads). Threads doing work for a request
+# must run in a copy of its context (contextvars.copy_context) to be counted.
+# Flask is only imported by the hooks of Instrumentation: job worker processes import
+# this module for timed_upstream (through movie_api) and never serve a request.
+current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class Instrumentation:
+    """
+    Per-request performance data for a Flask app: SQL statement count and time
+    (through engine events), upstream OMDb time (through timed_upstream) and template
+    render time (through Flask's template signals).
+
+    Every response gets a Server-Timing header, every request a JSON log line on the
+    "movieapp.metrics" logger, and /metrics serves histograms in the Prometheus text
+    format. Slow statements and statements repeated within one request (N+1 query
+    patterns) are logged as warnings and counted.
+    """
+
+    def __init__(self, app=None, slow_query_seconds: float = SLOW_QUERY_SECONDS,
+                 n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.slow_query_seconds = slow_query_seconds
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.registry = Registry()
+        self.request_seconds = self.registry.histogram(
+            "http_request_duration_seconds", "Time to handle a request.",
+            labels=("method", "endpoint", "status"))
+        self.db_seconds = self.registry.histogram(
+            "http_request_db_seconds", "Time spent in SQL statements per request.",
+            labels=("endpoint",))
+        self.upstream_seconds = self.registry.histogram(
+            "http_request_upstream_seconds", "Time spent waiting for OMDb per request.",
+            labels=("endpoint",))
+        self.render_seconds = self.registry.histogram(
+            "http_request_render_seconds", "Time spent rendering templates per request.",
+            labels=("endpoint",))
+        self.request_statements = self.registry.histogram(
+            "http_request_sql_statements", "SQL statements executed per request.",
+            labels=("endpoint",), buckets=COUNT_BUCKETS)
+        self.query_seconds = self.registry.histogram(
+            "db_query_duration_seconds", "Duration of single SQL statements.")
+        self.slow_queries = self.registry.counter(
+            "db_slow_queries_total", "SQL statements slower than the slow query threshold.")
+        self.n_plus_one = self.registry.counter(
+            "db_n_plus_one_total", "Requests that ran the same statement repeatedly.",
+            labels=("endpoint",))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        from flask import before_render_template, template_rendered
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.add_url_rule("/metrics", "metrics", self.metrics_view)
+
+    def instrument_engine(self, engine) -> None:
+        """
+        Time every statement executed on engine.
+        """
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["query_started"].pop()
+            self.query_seconds.observe(elapsed)
+            metrics = current.get()
+            if metrics is not None:
+                metrics.statements += 1
+                metrics.db_time += elapsed
+                metrics.statement_counts[statement] += 1
+            if elapsed >= self.slow_query_seconds:
+                self.slow_queries.inc()
+                if metrics is not None:
+                    metrics.slow_queries += 1
+                logger.warning("slow query (%.1f ms): %s", elapsed * 1000, statement)
+
+        @event.listens_for(engine, "handle_error")
+        def handle_error(context):
+            if context.connection is not None:
+                started = context.connection.info.get("query_started")
+                if started:
+                    started.pop()
+
+    def metrics_view(self):
+        from flask import Response
+        return Response(self.registry.render(),
+                        mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+    def _before_request(self) -> None:
+        from flask import g
+        g.request_metrics = RequestMetrics()
+        g.request_metrics_token = current.set(g.request_metrics)
+
+    def _before_render(self, sender, template, context, **extra) -> None:
+        from flask import g
+        metrics = current.get()
+        if metrics is not None:
+            g.render_started = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra) -> None:
+        from flask import g
+        metrics = current.get()
+        started = g.pop("render_started", None)
+        if metrics is not None and started is not None:
+            metrics.render_time += time.perf_counter() - started
+
+    def _after_request(self, response):
+        from flask import g, request
+        metrics = g.get("request_metrics")
+        if metrics is None:
+            return response
+        total = time.perf_counter() - metrics.started
+        endpoint = request.endpoint or "unmatched"
+        response.headers["Server-Timing"] = ", ".join([
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.statements} queries"',
+            f'omdb;dur={metrics.upstream_time * 1000:.1f};desc="{metrics.upstream_calls} calls"',
+            f"render;dur={metrics.render_time * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+        self.request_seconds.observe(total, method=request.method, endpoint=endpoint,
+                                     status=response.status_code)
+        self.db_seconds.observe(metrics.db_time, endpoint=endpoint)
+        self.upstream_seconds.observe(metrics.upstream_time, endpoint=endpoint)
+        self.render_seconds.observe(metrics.render_time, endpoint=endpoint)
+        self.request_statements.observe(metrics.statements, endpoint=endpoint)
+        repeated = metrics.repeated_statements(self.n_plus_one_threshold)
+        if repeated:
+            self.n_plus_one.inc(endpoint=endpoint)
+            for statement, count in repeated.items():
+                logger.warning("possible N+1 in %s: %d x %s", endpoint, count, statement)
+        logger.info(json.dumps({
+            "method": request.method, "path": request.path, "endpoint": endpoint,
+            "status": response.status_code, "duration_ms": round(total * 1000, 2),
+            "sql_statements": metrics.statements, "db_ms": round(metrics.db_time * 1000, 2),
+            "upstream_calls": metrics.upstream_calls,
+            "upstream_ms": round(metrics.upstream_time * 1000, 2),
+            "render_ms": round(metrics.render_time * 1000, 2),
+            "slow_queries": metrics.slow_queries, "n_plus_one": len(repeated),
+        }))
+        return response
+
+    def _teardown_request(self, exc) -> None:
+        from flask import g
+        token = g.pop("request_metrics_token", None)
+        if token is not None:
+            current.reset(token)
+
+
+def timed_upstream(fn):
+    """
+    Decorator adding the duration of each call to the current request's upstream time.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        metrics = current.get()
+        if metrics is None:
+            return fn(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with metrics.lock:
+                metrics.upstream_calls += 1
+                metrics.upstream_time += elapsed
+    return wrapper
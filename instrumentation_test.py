@@ -0,0 +1,87 @@
+import json
+import logging
+
+import pytest
+from flask import Flask, render_template_string
+from sqlalchemy import create_engine, text
+
+from instrumentation import Instrumentation, Histogram, timed_upstream
+
+
+@pytest.fixture
+def app():
+    """
+    Fixture for a small instrumented app with an in-memory database.
+    """
+    app = Flask(__name__)
+    engine = create_engine("sqlite://")
+    instrumentation = Instrumentation(app, slow_query_seconds=10, n_plus_one_threshold=3)
+    instrumentation.instrument_engine(engine)
+
+    @timed_upstream
+    def fetch():
+        return "upstream"
+
+    @app.route("/queries/<int:n>")
+    def queries(n):
+        with engine.connect() as conn:
+            for i in range(n):
+                conn.execute(text("SELECT :i"), {"i": i})
+        fetch()
+        return render_template_string("{{ n }} queries", n=n)
+
+    app.instrumentation = instrumentation
+    return app
+
+
+def test_server_timing_and_log_line(app, caplog):
+    """Test that a request reports statements, DB, upstream and render time."""
+    with caplog.at_level(logging.INFO, logger="movieapp.metrics"):
+        response = app.test_client().get("/queries/2")
+    timing = response.headers["Server-Timing"]
+    assert 'desc="2 queries"' in timing and 'desc="1 calls"' in timing
+    assert "render;dur=" in timing and "total;dur=" in timing
+    line = json.loads(caplog.records[-1].getMessage())
+    assert line["endpoint"] == "queries"
+    assert line["sql_statements"] == 2
+    assert line["upstream_calls"] == 1
+    assert line["n_plus_one"] == 0
+
+
+def test_n_plus_one_is_flagged(app, caplog):
+    """Test that the same statement run repeatedly in one request is reported."""
+    with caplog.at_level(logging.WARNING, logger="movieapp.metrics"):
+        app.test_client().get("/queries/3")
+    assert any("possible N+1 in queries: 3 x SELECT ?" in record.getMessage()
+               for record in caplog.records)
+    assert app.instrumentation.n_plus_one.value(endpoint="queries") == 1
+
+
+def test_slow_queries_are_flagged(app, caplog):
+    """Test the slow query log and counter."""
+    app.instrumentation.slow_query_seconds = 0
+    with caplog.at_level(logging.WARNING, logger="movieapp.metrics"):
+        app.test_client().get("/queries/1")
+    assert any(record.getMessage().startswith("slow query") for record in caplog.records)
+    assert app.instrumentation.slow_queries.value() == 1
+
+
+def test_metrics_endpoint(app):
+    """Test the Prometheus text output."""
+    client = app.test_client()
+    client.get("/queries/1")
+    client.get("/queries/1")
+    body = client.get("/metrics").get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_request_duration_seconds_count{method="GET",endpoint="queries",status="200"} 2' \
+        in body
+    assert 'http_request_sql_statements_bucket{endpoint="queries",le="1"} 2' in body
+
+
+def test_histogram_buckets_are_cumulative():
+    """Test bucket boundaries (le is inclusive) and the +Inf bucket."""
+    histogram = Histogram("h", "help", buckets=(1, 2))
+    for value in (0.5, 1, 1.5, 3):
+        histogram.observe(value)
+    assert list(histogram.samples()) == ['h_bucket{le="1"} 2', 'h_bucket{le="2"} 3',
+                                         'h_bucket{le="+Inf"} 4', "h_sum 6", "h_count 4"]
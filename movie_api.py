@@ -1,24 +1,570 @@
-import dotenv
+import asyncio
+import json
 import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import timed_upstream
+
+# Imported by the first AsyncOMDBClient, it takes longer to import than this module.
+httpx = None
+
+
+# Cache settings, overridable through the environment.
+CACHE_PATH = os.getenv("OMDB_CACHE_PATH", "omdb_cache.db")
+CACHE_TTL = float(os.getenv("OMDB_CACHE_TTL", 7 * 24 * 3600))
+CACHE_NEGATIVE_TTL = float(os.getenv("OMDB_CACHE_NEGATIVE_TTL", 3600))
+CACHE_MAX_ENTRIES = int(os.getenv("OMDB_CACHE_MAX_ENTRIES", 1024))
+# The disk level drops expired entries, and beyond its cap the ones expiring first,
+# on opening and on every CACHE_SWEEP_EVERY-th write.
+CACHE_MAX_DISK_ENTRIES = int(os.getenv("OMDB_CACHE_MAX_DISK_ENTRIES", 100_000))
+CACHE_SWEEP_EVERY = 1000
+
+# HTTP settings: (connect, read) timeouts in seconds, retry budget with
+# jittered exponential backoff, connection pool size and circuit breaker.
+CONNECT_TIMEOUT = float(os.getenv("OMDB_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.getenv("OMDB_READ_TIMEOUT", 10))
+MAX_RETRIES = int(os.getenv("OMDB_MAX_RETRIES", 3))
+BACKOFF_BASE = float(os.getenv("OMDB_BACKOFF_BASE", 0.25))
+BACKOFF_MAX = float(os.getenv("OMDB_BACKOFF_MAX", 4.0))
+POOL_SIZE = int(os.getenv("OMDB_POOL_SIZE", 10))
+BREAKER_THRESHOLD = int(os.getenv("OMDB_BREAKER_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv("OMDB_BREAKER_RESET_TIMEOUT", 30))
+
+# Sentinel returned by OMDBCache.get when a title is not cached at all.
+MISS = object()
+
+_env_loaded = False
+
+
+def _load_env() -> None:
+    """
+    Add the variables of a .env file to the environment, once, when first needed.
+    """
+    global _env_loaded
+    if not _env_loaded:
+        import dotenv
+        dotenv.load_dotenv()
+        _env_loaded = True
+
+
+def default_base_url() -> str:
+    """
+    The OMDb URL clients use unless given one: OMDB_BASE_URL (e.g. a local stub for
+    load tests), else the OMDb API with OMDB_API_KEY. Either may come from a .env
+    file. Raises OMDBConfigError when neither is set.
+    """
+    _load_env()
+    base_url = os.getenv("OMDB_BASE_URL")
+    if base_url:
+        return base_url
+    api_key = os.getenv("OMDB_API_KEY")
+    if not api_key:
+        raise OMDBConfigError("Set OMDB_API_KEY (or OMDB_BASE_URL) to look movies up")
+    return "http://www.omdbapi.com/?apikey=" + api_key
+
+
+def _import_httpx():
+    global httpx
+    if httpx is None:
+        try:
+            import httpx as module
+        except ImportError:
+            raise RuntimeError("AsyncOMDBClient needs the httpx package")
+        httpx = module
+    return httpx
+
+
+def normalize_title(title: str) -> str:
+    """
+    Normalize a movie title into a cache key (case and whitespace insensitive).
+    """
+    return " ".join(title.split()).casefold()
+
+
+class OMDBCache:
+    """
+    Two-level cache for OMDb lookups: an in-process LRU in front of an
+    on-disk SQLite store. A cached value of None means "not found"
+    (negative caching) and expires after negative_ttl seconds.
+    """
+
+    def __init__(self, path: str | None = None, ttl: float = CACHE_TTL,
+                 negative_ttl: float = CACHE_NEGATIVE_TTL,
+                 max_entries: int = CACHE_MAX_ENTRIES,
+                 max_disk_entries: int = CACHE_MAX_DISK_ENTRIES, clock=time.time):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._writes = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._lru: OrderedDict[str, tuple[float, dict | None]] = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS omdb_cache ("
+                             "key TEXT PRIMARY KEY, payload TEXT, expires_at REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS omdb_cache_expires_at "
+                             "ON omdb_cache (expires_at)")
+            self._sweep()
+            self._db.commit()
+
+    def get(self, title: str):
+        """
+        Look up a title. Returns the cached movie dict, None for a cached
+        "not found", or MISS when nothing valid is cached.
+        """
+        key = normalize_title(title)
+        now = self._clock()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._lru.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._lru[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT payload, expires_at FROM omdb_cache WHERE key = ?",
+                                       (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0]) if row[0] is not None else None
+                    self._remember(key, row[1], value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return MISS
+
+    def set(self, title: str, movie: dict | None) -> None:
+        """
+        Store a lookup result. Pass None to cache a "not found" answer.
+        """
+        key = normalize_title(title)
+        ttl = self.ttl if movie is not None else self.negative_ttl
+        expires_at = self._clock() + ttl
+        with self._lock:
+            self._remember(key, expires_at, movie)
+            if self._db is not None:
+                payload = json.dumps(movie) if movie is not None else None
+                self._db.execute("INSERT OR REPLACE INTO omdb_cache (key, payload, expires_at) "
+                                 "VALUES (?, ?, ?)", (key, payload, expires_at))
+                self._writes += 1
+                if self._writes % CACHE_SWEEP_EVERY == 0:
+                    self._sweep()
+                self._db.commit()
+
+    def clear(self) -> None:
+        """
+        Drop every cached entry, in memory and on disk.
+        """
+        with self._lock:
+            self._lru.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM omdb_cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counters and the current in-memory size.
+        """
+        with self._lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "size": len(self._lru)}
+
+    def _sweep(self) -> None:
+        """
+        Delete the expired disk entries, then the ones expiring first beyond
+        max_disk_entries.
+        """
+        self._db.execute("DELETE FROM omdb_cache WHERE expires_at <= ?", (self._clock(),))
+        excess = self._db.execute("SELECT COUNT(*) FROM omdb_cache").fetchone()[0] \
+            - self.max_disk_entries
+        if excess > 0:
+            self._db.execute("DELETE FROM omdb_cache WHERE key IN (SELECT key FROM omdb_cache "
+                             "ORDER BY expires_at LIMIT ?)", (excess,))
+
+    def _remember(self, key: str, expires_at: float, value: dict | None) -> None:
+        self._lru[key] = (expires_at, value)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache() -> OMDBCache:
+    """
+    The process-wide cache shared by every OMDBClient, created on first use.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _load_env()
+            _default_cache = OMDBCache(os.getenv("OMDB_CACHE_PATH", CACHE_PATH))
+        return _default_cache
+
+
+def _parse_movie(data: dict) -> dict:
+    """
+    Turn an OMDb JSON answer into Movie fields, or {} when OMDb answered "not found".
+    """
+    if data.get("Response") == "False":
+        return {}
+    return {"name": data["Title"], "director": data["Director"], "year": data["Year"],
+            "poster": data["Poster"], "rating": data["imdbRating"]}
+
+
+def _read_answer(title: str, status: int, read_json) -> dict:
+    """
+    The movie fields of an OMDb answer, or {} for "not found".
+    Raises OMDBRequestError for a rejected request or an answer that isn't a movie.
+    """
+    if status != 200:
+        raise OMDBRequestError(f"OMDb rejected the request for {title!r} ({status})")
+    try:
+        return _parse_movie(read_json())
+    except (ValueError, KeyError) as e:
+        raise OMDBRequestError(f"Unexpected OMDb answer for {title!r}: {e!r}")
+
+
+def _backoff_delay(attempt: int, retry_after: str | None, base: float, cap: float) -> float:
+    """
+    Full-jitter exponential backoff, honouring a numeric Retry-After header.
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, min(float(retry_after), cap))
+    return delay
+
+
+class OMDBUnavailableError(Exception):
+    """
+    Raised when OMDb can't be reached: retries are exhausted or the circuit is open.
+    """
 
 
-dotenv.load_dotenv()
+class OMDBRequestError(ValueError):
+    """
+    Raised when OMDb rejects a request (e.g. a bad API key) or answers with something
+    that isn't a movie. Asking again won't help.
+    """
 
-API_KEY = os.getenv("OMDB_API_KEY")
 
-BASE_URL = "http://www.omdbapi.com/?apikey=" + API_KEY
+class OMDBConfigError(RuntimeError):
+    """
+    Raised when a client is built without an OMDb API key or URL to use.
+    """
+
+
+class CircuitBreaker:
+    """
+    Fail fast once the upstream is clearly down. After failure_threshold
+    consecutive failures the circuit opens and every call is refused until
+    reset_timeout seconds have passed; then a single probe is let through
+    (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = BREAKER_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go through right now.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` calls per second on average, with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def acquire(self) -> None:
+        """
+        Block until a call is allowed.
+        """
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+_session = None
+_session_lock = threading.Lock()
+_breaker = CircuitBreaker()
+
+
+def _after_fork_in_child() -> None:
+    """
+    Give a forked worker its own session, breaker and cache: the parent's sockets and
+    SQLite connection must not be shared, its breaker state is not the child's, and
+    a lock held by another parent thread at the fork would never be released.
+    """
+    global _session, _session_lock, _breaker, _default_cache, _default_cache_lock
+    _session, _session_lock = None, threading.Lock()
+    _breaker = CircuitBreaker()
+    _default_cache, _default_cache_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def shared_session() -> requests.Session:
+    """
+    The keep-alive session shared by every OMDBClient in this process
+    (see _after_fork_in_child).
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
 
 class OMDBClient:
-    def __init__(self):
-        self.BASE_URL = BASE_URL
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, cache: OMDBCache | None = None, session: requests.Session | None = None,
+                 base_url: str | None = None,
+                 timeout: tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT),
+                 max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE,
+                 backoff_max: float = BACKOFF_MAX, breaker: CircuitBreaker | None = None,
+                 rate_limiter: RateLimiter | None = None):
+        self._base_url = base_url
+        self.cache = cache if cache is not None else default_cache()
+        self.session = session if session is not None else shared_session()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker if breaker is not None else _breaker
+        self.rate_limiter = rate_limiter
+
+    @property
+    def BASE_URL(self) -> str:
+        # Resolved on the first request, so a client can be built without a key.
+        if self._base_url is None:
+            self._base_url = default_base_url()
+        return self._base_url
 
     def get_movie(self, title: str) -> dict | None:
-        url = self.BASE_URL + "&t=" + title
-        response = requests.get(url)
-        if response.status_code == 200:
-            new_movie = {"name": response.json()["Title"], "director": response.json()["Director"],
-                         "year": response.json()["Year"], "poster": response.json()["Poster"],
-                         "rating": response.json()["imdbRating"]}
-            return new_movie
-        return None
\ No newline at end of file
+        """
+        The movie dict for title, or None when OMDb doesn't know it (both are cached).
+        Raises OMDBRequestError or OMDBUnavailableError, which are not cached.
+        """
+        cached = self.cache.get(title)
+        if cached is not MISS:
+            return dict(cached) if cached is not None else None
+        new_movie = self._fetch(title) or None
+        self.cache.set(title, new_movie)
+        return dict(new_movie) if new_movie is not None else None
+
+    # Timed here rather than in get_movie(): cache hits are not upstream calls.
+    @timed_upstream
+    def _fetch(self, title: str) -> dict | None:
+        """
+        Query OMDb. Returns the movie dict, or an empty dict when OMDb answered
+        "not found". Raises OMDBRequestError when the request was rejected and
+        OMDBUnavailableError when the upstream is down.
+        """
+        if not self.breaker.allow():
+            raise OMDBUnavailableError("OMDb circuit is open")
+        try:
+            response = self._request(title)
+        except BaseException:
+            # Whatever failed, a half-open probe must re-open the circuit: one that
+            # recorded nothing would leave it refusing every call from then on.
+            self.breaker.record_failure()
+            raise
+        # OMDb answered: whatever it said about this title, it is up.
+        self.breaker.record_success()
+        return _read_answer(title, response.status_code, response.json)
+
+    def _request(self, title: str) -> requests.Response:
+        """
+        GET title, retrying connection errors, timeouts and RETRY_STATUSES.
+        Raises OMDBUnavailableError once the retries are exhausted.
+        """
+        response = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self._backoff(attempt, response))
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                response = self.session.get(self.BASE_URL, params={"t": title},
+                                            timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                response = None
+                continue
+            if response.status_code not in self.RETRY_STATUSES:
+                return response
+        status = response.status_code if response is not None else "no response"
+        raise OMDBUnavailableError(f"OMDb request for {title!r} failed ({status})")
+
+    def _backoff(self, attempt: int, response: requests.Response | None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        return _backoff_delay(attempt, retry_after, self.backoff_base, self.backoff_max)
+
+
+class AsyncOMDBClient:
+    """
+    asyncio counterpart of OMDBClient, built on httpx. Shares the same cache, circuit
+    breaker and retry policy; one pooled httpx.AsyncClient carries every request, so
+    many lookups can be pending at once without a thread each.
+    Use as `async with AsyncOMDBClient() as client:` or call aclose() when done.
+    """
+
+    RETRY_STATUSES = OMDBClient.RETRY_STATUSES
+
+    def __init__(self, cache: OMDBCache | None = None, base_url: str | None = None,
+                 timeout: tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT),
+                 max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE,
+                 backoff_max: float = BACKOFF_MAX, breaker: CircuitBreaker | None = None,
+                 max_concurrency: int = POOL_SIZE):
+        httpx = _import_httpx()
+        self._base_url = base_url
+        self.cache = cache if cache is not None else default_cache()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker if breaker is not None else _breaker
+        self.max_concurrency = max_concurrency
+        connect, read = timeout
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(max_connections=max_concurrency,
+                                max_keepalive_connections=max_concurrency))
+        self._semaphore = None
+
+    @property
+    def BASE_URL(self) -> str:
+        # Resolved on the first request, so a client can be built without a key.
+        if self._base_url is None:
+            self._base_url = default_base_url()
+        return self._base_url
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def get_movie(self, title: str) -> dict | None:
+        cached = self.cache.get(title)
+        if cached is not MISS:
+            return dict(cached) if cached is not None else None
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            new_movie = await self._fetch(title) or None
+        self.cache.set(title, new_movie)
+        return dict(new_movie) if new_movie is not None else None
+
+    async def get_movies(self, titles) -> dict:
+        """
+        Look up many titles concurrently (at most max_concurrency requests in flight).
+        Returns {title: movie dict, None when not found, or the OMDBRequestError or
+        OMDBUnavailableError raised}.
+        """
+        titles = list(dict.fromkeys(titles))
+        results = await asyncio.gather(*(self.get_movie(title) for title in titles),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, Exception):
+                raise result
+        return dict(zip(titles, results))
+
+    async def _fetch(self, title: str) -> dict | None:
+        if not self.breaker.allow():
+            raise OMDBUnavailableError("OMDb circuit is open")
+        try:
+            response = await self._request(title)
+        except BaseException:
+            # As in OMDBClient._fetch: every failed probe must re-open the circuit.
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return _read_answer(title, response.status_code, response.json)
+
+    async def _request(self, title: str):
+        response = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                retry_after = response.headers.get("Retry-After") if response is not None else None
+                await asyncio.sleep(_backoff_delay(attempt, retry_after, self.backoff_base,
+                                                   self.backoff_max))
+            try:
+                response = await self._client.get(self.BASE_URL, params={"t": title})
+            except httpx.TransportError:
+                response = None
+                continue
+            if response.status_code not in self.RETRY_STATUSES:
+                return response
+        status = response.status_code if response is not None else "no response"
+        raise OMDBUnavailableError(f"OMDb request for {title!r} failed ({status})")
@@ -0,0 +1,370 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+import instrumentation
+import movie_api
+from movie_api import (OMDBCache, OMDBClient, AsyncOMDBClient, OMDBRequestError,
+                       OMDBUnavailableError, CircuitBreaker, MISS, shared_session)
+
+
+MATRIX = {"name": "The Matrix", "director": "Lana Wachowski, Lilly Wachowski", "year": "1999",
+          "poster": "matrix.jpg", "rating": "8.7"}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    Fixture for an OMDBClient with a private in-memory cache and a fake upstream.
+    """
+    client = OMDBClient(cache=OMDBCache(path=None))
+    client.calls = []
+
+    def fake_fetch(title):
+        client.calls.append(title)
+        return dict(MATRIX) if title.lower().strip() == "the matrix" else {}
+
+    monkeypatch.setattr(client, "_fetch", fake_fetch)
+    return client
+
+
+def test_repeated_lookup_hits_cache(client):
+    """Test that a second lookup of the same title does not hit the network."""
+    assert client.get_movie("The Matrix") == MATRIX
+    assert client.get_movie("  the   MATRIX ") == MATRIX
+    assert client.calls == ["The Matrix"]
+    assert client.cache.stats()["hits"] == 1
+    assert client.cache.stats()["misses"] == 1
+
+
+def test_not_found_is_cached(client):
+    """Test negative caching of titles OMDb does not know."""
+    assert client.get_movie("No Such Movie") is None
+    assert client.get_movie("no such movie") is None
+    assert client.calls == ["No Such Movie"]
+
+
+def test_upstream_error_is_not_cached(client, monkeypatch):
+    """Test that failed requests are retried on the next lookup."""
+    def reject(title):
+        raise OMDBRequestError("rejected")
+
+    monkeypatch.setattr(client, "_fetch", reject)
+    with pytest.raises(OMDBRequestError):
+        client.get_movie("The Matrix")
+    assert client.cache.get("The Matrix") is MISS
+
+
+def test_entries_expire():
+    """Test that positive and negative entries expire after their TTL."""
+    clock = FakeClock()
+    cache = OMDBCache(path=None, ttl=60, negative_ttl=10, clock=clock)
+    cache.set("The Matrix", MATRIX)
+    cache.set("Unknown", None)
+    clock.now += 11
+    assert cache.get("The Matrix") == MATRIX
+    assert cache.get("Unknown") is MISS
+    clock.now += 50
+    assert cache.get("The Matrix") is MISS
+
+
+def test_lru_eviction():
+    """Test that the in-memory level is bounded."""
+    cache = OMDBCache(path=None, max_entries=2)
+    cache.set("A", {"name": "A"})
+    cache.set("B", {"name": "B"})
+    cache.get("A")
+    cache.set("C", {"name": "C"})
+    assert cache.get("B") is MISS
+    assert cache.get("A") == {"name": "A"}
+    assert cache.get("C") == {"name": "C"}
+
+
+def test_disk_cache_survives_restart(tmp_path):
+    """Test that entries are served from disk by a fresh cache instance."""
+    path = str(tmp_path / "omdb_cache.db")
+    OMDBCache(path=path).set("The Matrix", MATRIX)
+    OMDBCache(path=path).set("Unknown", None)
+    cache = OMDBCache(path=path)
+    assert cache.get("the matrix") == MATRIX
+    assert cache.get("unknown") is None
+    assert cache.stats()["disk_hits"] == 2
+
+
+def test_disk_cache_is_swept(tmp_path, monkeypatch):
+    """Test that the disk level drops expired entries, then the soonest to expire."""
+    monkeypatch.setattr(movie_api, "CACHE_SWEEP_EVERY", 3)
+    clock = FakeClock()
+    path = str(tmp_path / "omdb_cache.db")
+    cache = OMDBCache(path=path, ttl=60, negative_ttl=10, max_disk_entries=2, clock=clock)
+    cache.set("Unknown", None)
+    clock.now += 20
+    cache.set("A", {"name": "A"})
+    clock.now += 1
+    cache.set("B", {"name": "B"})
+    assert [key for (key,) in cache._db.execute("SELECT key FROM omdb_cache")] == ["a", "b"]
+    clock.now += 1
+    cache.set("C", {"name": "C"})
+    OMDBCache(path=path, max_disk_entries=2, clock=clock)
+    assert sorted(key for (key,) in cache._db.execute("SELECT key FROM omdb_cache")) == ["b", "c"]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_gets_its_own_client_state():
+    """Test that a forked worker doesn't inherit the session, breaker or cache."""
+    parent = (shared_session(), movie_api._breaker, movie_api.default_cache())
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        child = (shared_session(), movie_api._breaker, movie_api.default_cache())
+        os.write(write, bytes(a is not b for a, b in zip(parent, child)))
+        os._exit(0)
+    os.close(write)
+    os.waitpid(pid, 0)
+    assert os.read(read, 3) == b"\x01\x01\x01"
+    os.close(read)
+
+
+class StubOMDb(ThreadingHTTPServer):
+    """
+    Local stand-in for the OMDb API. Queue (status, delay) pairs in
+    `responses` to script failures; once drained it answers 200.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.responses = []
+        self.requests = []
+        self.connections = set()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/?apikey=test"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.connections.add(self.client_address)
+        title = parse_qs(urlparse(self.path).query)["t"][0]
+        server.requests.append(title)
+        if title == "Redirect loop":
+            self.send_response(302)
+            self.send_header("Location", self.path)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        status, delay = server.responses.pop(0) if server.responses else (200, 0)
+        time.sleep(delay)
+        if status == 200 and title == "The Matrix":
+            body = {"Response": "True", "Title": "The Matrix", "Director": "The Wachowskis",
+                    "Year": "1999", "Poster": "matrix.jpg", "imdbRating": "8.7"}
+        elif status == 200:
+            body = {"Response": "False", "Error": "Movie not found!"}
+        else:
+            body = {"Response": "False", "Error": "Server error"}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    """
+    Fixture running a stub OMDb server on a free local port.
+    """
+    server = StubOMDb()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def http_client(stub):
+    """
+    Fixture for an uncached client pointed at the stub, with fast retries.
+    """
+    return OMDBClient(cache=OMDBCache(path=None), session=requests.Session(),
+                      base_url=stub.base_url, timeout=(1, 0.5), max_retries=2,
+                      backoff_base=0.01, breaker=CircuitBreaker(failure_threshold=2))
+
+
+def test_fetch_from_stub(http_client, stub):
+    """Test parsing a real HTTP response and caching a 'not found' answer."""
+    assert http_client.get_movie("The Matrix")["director"] == "The Wachowskis"
+    assert http_client.get_movie("Nope & Nothing") is None
+    assert stub.requests == ["The Matrix", "Nope & Nothing"]
+
+
+def test_only_cache_misses_count_as_upstream_calls(http_client, stub):
+    """Test that a request's upstream calls and time leave out OMDb cache hits."""
+    metrics = instrumentation.RequestMetrics()
+    token = instrumentation.current.set(metrics)
+    try:
+        http_client.get_movie("The Matrix")
+        http_client.get_movie("The Matrix")
+    finally:
+        instrumentation.current.reset(token)
+    assert metrics.upstream_calls == 1
+    assert metrics.upstream_time > 0
+
+
+def test_connections_are_reused(http_client, stub):
+    """Test that consecutive requests share one keep-alive connection."""
+    for title in ["A", "B", "C"]:
+        http_client.get_movie(title)
+    assert len(stub.connections) == 1
+
+
+def test_retries_on_server_errors(http_client, stub):
+    """Test that 5xx and 429 answers are retried with backoff."""
+    stub.responses = [(503, 0), (429, 0)]
+    assert http_client.get_movie("The Matrix")["name"] == "The Matrix"
+    assert len(stub.requests) == 3
+
+
+def test_gives_up_after_retry_budget(http_client, stub):
+    """Test that a persistently failing upstream raises after max_retries."""
+    stub.responses = [(500, 0)] * 3
+    with pytest.raises(OMDBUnavailableError):
+        http_client.get_movie("The Matrix")
+    assert len(stub.requests) == 3
+    assert http_client.cache.get("The Matrix") is MISS
+
+
+def test_rejected_request_is_not_retried(http_client, stub):
+    """Test that a rejected request (e.g. a bad API key) raises at once and isn't cached."""
+    stub.responses = [(401, 0)]
+    with pytest.raises(OMDBRequestError):
+        http_client.get_movie("The Matrix")
+    assert len(stub.requests) == 1
+    assert http_client.cache.get("The Matrix") is MISS
+    assert http_client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_read_timeout(http_client, stub):
+    """Test that a stuck upstream call is abandoned after the read timeout."""
+    stub.responses = [(200, 2)] * 3
+    started = time.monotonic()
+    with pytest.raises(OMDBUnavailableError):
+        http_client.get_movie("The Matrix")
+    assert time.monotonic() - started < 3
+
+
+def test_circuit_breaker_fails_fast(http_client, stub):
+    """Test that an open circuit refuses calls without touching the network."""
+    stub.responses = [(500, 0)] * 6
+    for title in ["A", "B"]:
+        with pytest.raises(OMDBUnavailableError):
+            http_client.get_movie(title)
+    assert http_client.breaker.state == CircuitBreaker.OPEN
+    sent = len(stub.requests)
+    with pytest.raises(OMDBUnavailableError):
+        http_client.get_movie("C")
+    assert len(stub.requests) == sent
+
+
+def test_circuit_breaker_half_open_probe():
+    """Test that the breaker lets one probe through after the reset timeout."""
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] = 10
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_of_any_kind_reopens_circuit(http_client, stub):
+    """Test that a half-open probe failing with an unexpected error re-opens the circuit."""
+    http_client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    stub.responses = [(500, 0)] * 3
+    with pytest.raises(OMDBUnavailableError):
+        http_client.get_movie("A")
+    assert http_client.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(requests.TooManyRedirects):
+        http_client.get_movie("Redirect loop")
+    assert http_client.breaker.state == CircuitBreaker.OPEN
+    assert http_client.get_movie("The Matrix")["name"] == "The Matrix"
+    assert http_client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_shared_session_is_per_process():
+    """Test that clients share one pooled session."""
+    assert shared_session() is shared_session()
+    assert OMDBClient(cache=OMDBCache(path=None)).session is shared_session()
+
+
+@pytest.fixture
+def async_client_factory(stub):
+    """
+    Fixture building uncached AsyncOMDBClients pointed at the stub.
+    """
+    def factory(**kwargs):
+        options = dict(cache=OMDBCache(path=None), base_url=stub.base_url, timeout=(1, 1),
+                       max_retries=2, backoff_base=0.01, breaker=CircuitBreaker())
+        options.update(kwargs)
+        return AsyncOMDBClient(**options)
+    return factory
+
+
+def test_async_get_movies_runs_concurrently(async_client_factory, stub):
+    """Test that many slow lookups overlap instead of running one after another."""
+    stub.responses = [(200, 0.3)] * 10
+    titles = ["The Matrix"] + [f"Movie {i}" for i in range(9)]
+
+    async def run():
+        async with async_client_factory(max_concurrency=10) as client:
+            return await client.get_movies(titles)
+
+    started = time.monotonic()
+    results = asyncio.run(run())
+    assert time.monotonic() - started < 1.5
+    assert results["The Matrix"]["director"] == "The Wachowskis"
+    assert results["Movie 3"] is None
+    assert sorted(stub.requests) == sorted(titles)
+
+
+def test_async_retries_and_failures(async_client_factory, stub):
+    """Test that the async client retries server errors and reports exhausted retries."""
+    stub.responses = [(503, 0), (200, 0), (500, 0), (500, 0), (500, 0), (401, 0)]
+
+    async def run():
+        async with async_client_factory() as client:
+            first = await client.get_movie("The Matrix")
+            second = await client.get_movies(["Gone"])
+            third = await client.get_movies(["Rejected"])
+            return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first["name"] == "The Matrix"
+    assert isinstance(second["Gone"], OMDBUnavailableError)
+    assert isinstance(third["Rejected"], OMDBRequestError)
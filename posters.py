@@ -0,0 +1,190 @@
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Pillow, imported with the first thumbnail: False until then, None without it.
+Image = False
+
+
+logger = logging.getLogger("movieapp.posters")
+
+POSTER_CACHE_DIR = os.getenv("POSTER_CACHE_DIR", "poster_cache")
+POSTER_TIMEOUT = (3.05, 10)
+MAX_POSTER_BYTES = 5 * 1024 * 1024
+# Downloads and thumbnails of the same key are serialized on one of this many locks.
+LOCK_STRIPES = 64
+# Served for originals stored without a Content-Type (OMDb's posters are JPEGs).
+DEFAULT_CONTENT_TYPE = "image/jpeg"
+
+# Fixed thumbnail sizes (width, height); posters keep their aspect ratio within the box.
+SIZES = {"thumb": (100, 148), "medium": (200, 296), "large": (400, 592)}
+DEFAULT_SIZE = "medium"
+
+
+def _import_pillow():
+    global Image
+    if Image is False:
+        try:
+            from PIL import Image
+        except ImportError:  # without Pillow the original images are served
+            Image = None
+    return Image
+
+
+class PosterError(Exception):
+    """
+    Raised when a poster can't be downloaded or decoded.
+    """
+
+
+class PosterInvalidError(PosterError):
+    """
+    Raised when the poster URL answers with something a retry won't fix: a client
+    error, an oversized or an undecodable image.
+    """
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class PosterCache:
+    """
+    Local, content-addressed store of poster images and their thumbnails.
+
+    originals/<ab>/<sha256>        downloaded bytes, named by their hash
+    types/<ab>/<sha256>            the Content-Type an original was downloaded with
+    thumbs/<size>/<ab>/<sha256>    JPEG thumbnails
+    urls/<ab>/<sha256 of url>      which original a poster URL resolved to
+
+    Each URL is downloaded once; identical images behind different URLs are stored once.
+    """
+
+    def __init__(self, root: str = POSTER_CACHE_DIR, session: requests.Session | None = None,
+                 prefetch_workers: int = 2):
+        self.root = root
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=prefetch_workers * 2))
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=prefetch_workers * 2))
+        self.session = session
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._executor = ThreadPoolExecutor(max_workers=prefetch_workers,
+                                            thread_name_prefix="poster-prefetch")
+
+    def _path(self, kind: str, digest: str) -> str:
+        return os.path.join(self.root, kind, digest[:2], digest)
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        # A fixed set of locks, however many keys: unrelated keys sharing one only wait.
+        return self._locks[hash(key) % len(self._locks)]
+
+    def original(self, url: str) -> str:
+        """
+        The content hash of the image at url, downloading it on first use.
+        """
+        url_key = hashlib.sha256(url.encode()).hexdigest()
+        url_path = self._path("urls", url_key)
+        with self._lock_for(url_key):
+            if os.path.exists(url_path):
+                with open(url_path) as f:
+                    return f.read().strip()
+            try:
+                response = self.session.get(url, timeout=POSTER_TIMEOUT)
+            except requests.RequestException as e:
+                raise PosterError(f"Failed to download {url}: {e}")
+            if 400 <= response.status_code < 500 or len(response.content) > MAX_POSTER_BYTES:
+                raise PosterInvalidError(
+                    f"Failed to download {url}: status {response.status_code}, "
+                    f"{len(response.content)} bytes")
+            if response.status_code != 200:
+                raise PosterError(f"Failed to download {url}: status {response.status_code}")
+            digest = hashlib.sha256(response.content).hexdigest()
+            original_path = self._path("originals", digest)
+            if not os.path.exists(original_path):
+                content_type = response.headers.get("Content-Type", DEFAULT_CONTENT_TYPE)
+                _write_atomic(self._path("types", digest), content_type.encode())
+                _write_atomic(original_path, response.content)
+            _write_atomic(url_path, digest.encode())
+            return digest
+
+    def thumbnail(self, digest: str, size: str = DEFAULT_SIZE) -> str:
+        """
+        Path of the `size` thumbnail of an original, generated on first use.
+        Without Pillow this is the original itself.
+        """
+        if size not in SIZES:
+            raise ValueError(f"Unknown poster size {size!r}, choose one of {sorted(SIZES)}")
+        original_path = self._path("originals", digest)
+        if _import_pillow() is None:
+            return original_path
+        thumb_path = self._path(os.path.join("thumbs", size), digest)
+        with self._lock_for(f"{size}/{digest}"):
+            if not os.path.exists(thumb_path):
+                try:
+                    with Image.open(original_path) as image:
+                        image = image.convert("RGB")
+                        image.thumbnail(SIZES[size])
+                        buffer = io.BytesIO()
+                        image.save(buffer, "JPEG", quality=85, optimize=True)
+                except OSError as e:
+                    raise PosterInvalidError(f"Cannot decode poster {digest}: {e}")
+                _write_atomic(thumb_path, buffer.getvalue())
+        return thumb_path
+
+    def content_type(self, digest: str) -> str:
+        """
+        The Content-Type of what thumbnail(digest) returns: JPEG, or without Pillow
+        the type the original was downloaded with.
+        """
+        if _import_pillow() is not None:
+            return "image/jpeg"
+        try:
+            with open(self._path("types", digest)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return DEFAULT_CONTENT_TYPE
+
+    def get(self, url: str, size: str = DEFAULT_SIZE) -> tuple[str, str]:
+        """
+        (path, content hash) of the `size` thumbnail of the poster at url.
+        """
+        digest = self.original(url)
+        return self.thumbnail(digest, size), digest
+
+    def prefetch(self, url: str | None) -> None:
+        """
+        Download a poster and render its default thumbnail in the background.
+        """
+        if not is_poster_url(url):
+            return
+
+        def work():
+            try:
+                self.get(url)
+            except PosterError as e:
+                logger.warning("poster prefetch failed: %s", e)
+
+        self._executor.submit(work)
+
+
+def is_poster_url(url: str | None) -> bool:
+    """
+    OMDb uses "N/A" for movies without a poster.
+    """
+    return bool(url) and url.startswith(("http://", "https://"))
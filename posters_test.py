@@ -0,0 +1,129 @@
+import io
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from posters import PosterCache, PosterInvalidError, SIZES, is_poster_url
+
+
+def make_image(color="red", size=(300, 450)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class ImageServer(ThreadingHTTPServer):
+    """
+    Serves self.images[path] and records every request path.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        self.images = {}
+        self.requests = []
+        super().__init__(("127.0.0.1", 0), ImageHandler)
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        body = self.server.images.get(self.path)
+        self.send_response(200 if body is not None else 404)
+        if body is not None:
+            self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body or b"")))
+        self.end_headers()
+        self.wfile.write(body or b"")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ImageServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def posters(tmp_path):
+    return PosterCache(str(tmp_path))
+
+
+def test_poster_is_downloaded_once(server, posters):
+    """Test that repeated requests for a poster are served from disk."""
+    server.images["/a.png"] = make_image()
+    first = posters.get(server.url("/a.png"))
+    second = posters.get(server.url("/a.png"))
+    assert first == second
+    assert server.requests == ["/a.png"]
+
+
+def test_identical_images_are_stored_once(server, posters, tmp_path):
+    """Test content addressing: the same bytes under two URLs share one file."""
+    server.images["/a.png"] = server.images["/b.png"] = make_image()
+    _, digest_a = posters.get(server.url("/a.png"))
+    _, digest_b = posters.get(server.url("/b.png"))
+    assert digest_a == digest_b
+    assert len(os.listdir(tmp_path / "originals" / digest_a[:2])) == 1
+
+
+def test_thumbnail_fits_size(server, posters):
+    """Test that thumbnails are JPEGs within the requested box, keeping the aspect ratio."""
+    server.images["/a.png"] = make_image(size=(300, 450))
+    path, _ = posters.get(server.url("/a.png"), "thumb")
+    with Image.open(path) as image:
+        assert image.format == "JPEG"
+        assert image.size[0] <= SIZES["thumb"][0] and image.size[1] <= SIZES["thumb"][1]
+        assert image.size == (99, 148)
+
+
+def test_unknown_size_and_missing_image(server, posters):
+    """Test the errors for a bad size and an unreachable image."""
+    server.images["/a.png"] = make_image()
+    with pytest.raises(ValueError):
+        posters.get(server.url("/a.png"), "huge")
+    with pytest.raises(PosterInvalidError):
+        posters.get(server.url("/missing.png"))
+
+
+def test_prefetch(server, posters):
+    """Test that prefetching downloads in the background and skips OMDb's "N/A"."""
+    server.images["/a.png"] = make_image()
+    posters.prefetch("N/A")
+    posters.prefetch(server.url("/a.png"))
+    deadline = time.monotonic() + 5
+    while not server.requests and time.monotonic() < deadline:
+        time.sleep(0.01)
+    posters._executor.shutdown(wait=True)
+    assert server.requests == ["/a.png"]
+    assert not is_poster_url("N/A")
+
+
+def test_original_keeps_its_content_type(server, posters, monkeypatch):
+    """Test that without Pillow the original is served with the type it came with."""
+    import posters as module
+    server.images["/a.png"] = make_image()
+    path, digest = posters.get(server.url("/a.png"))
+    assert posters.content_type(digest) == "image/jpeg"
+    monkeypatch.setattr(module, "Image", None)
+    assert posters.content_type(digest) == "image/png"
+    assert posters.content_type("0" * 64) == module.DEFAULT_CONTENT_TYPE
+
+
+def test_prefetch_failures_are_logged(server, posters, caplog):
+    """Test that a failed prefetch goes to the log."""
+    posters.prefetch(server.url("/missing.png"))
+    posters._executor.shutdown(wait=True)
+    assert "poster prefetch failed" in caplog.text